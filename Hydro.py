@@ -8,16 +8,22 @@ Mapa de Colombia - Filtros selectivos
 - CALCULA: Distancia a la capital MÁS CERCANA (puede ser de otro departamento)
 """
 import os
+import sys
 import geopandas as gpd
-import folium
-from folium import plugins
 import requests
 import pandas as pd
+import numpy as np
 import json
 import math
+import time
+import contextlib
+import functools
 import warnings
 import urllib3
 import zipfile
+import posixpath
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
 
 # Suprimir warnings
 warnings.filterwarnings('ignore')
@@ -32,6 +38,70 @@ RUTA_SHAPEFILE_PUNTOS = r"vss_2024.zip"
 # Control de capas
 DESCARGAR_CAPAS = True  # Cambiar a False si el servidor sig.cicolombiaenaccion.org tiene problemas
 
+# Tipos de las columnas de los puntos al cargarlos (float32/int32 y categorías)
+OPTIMIZAR_TIPOS_PUNTOS = True
+MAX_DECIMALES_FLOAT32 = 6  # Solo se pasa a float32 si los valores tienen como mucho estos decimales
+
+# Capas de áreas como teselas vectoriales (requiere mapbox_vector_tile; si no, GeoJSON en el HTML).
+# Por defecto solo en el modo --servidor: con teselas, mapa_final.html deja de ser un archivo único
+# y las capas no cargan al abrirlo con doble clic (file://)
+USAR_TESELAS_VECTORIALES = False
+CARPETA_TESELAS = "teselas"   # Junto al HTML; el mapa debe abrirse por HTTP (python -m http.server)
+ZOOM_TESELAS_MIN = 4
+ZOOM_TESELAS_MAX = 12         # Por encima, Leaflet amplía las teselas de este nivel
+TOLERANCIA_TESELAS_PX = 1.0   # Simplificación por zoom, en píxeles de pantalla
+BORDE_TESELAS_PX = 8          # Margen de recorte alrededor de cada tesela, en píxeles
+
+# Puntos del mapa en bloques por quadkey: el mapa solo lee y dibuja los bloques visibles
+CARGA_POR_BLOQUES = True
+ZOOM_BLOQUES = 8        # Nivel de las teselas quadkey de cada bloque (z8 ≈ 1.4°)
+MARGEN_BLOQUES = 0.25   # Margen alrededor de la vista (fracción de su tamaño)
+
+# Agregados por celda a escala nacional: por debajo de este zoom el mapa dibuja celdas, no puntos
+ZOOM_PUNTOS_INDIVIDUALES = 8
+TAMAÑO_CELDA_AGREGADOS_PX = 64   # Lado de cada celda en píxeles de pantalla
+FILAS_PANEL_TERRITORIO = 50      # Departamentos/municipios listados en el resumen por territorio
+
+# Caché de puntos entre ejecuciones: con una nueva versión del shapefile solo se
+# recalculan los puntos nuevos o modificados (python Hydro.py --recalcular la ignora)
+USAR_CACHE_PUNTOS = True
+RUTA_CACHE_PUNTOS = "cache_puntos.pkl"
+RUTA_CACHE_DISTANCIAS = "cache_distancias.pkl"   # Distancias a las capas, por punto (misma clave)
+COLUMNA_ID_PUNTO = None   # Columna con un identificador estable; None = coordenadas (1e-6°)
+
+# Pipeline por etapas con puntos de control: cada etapa guarda su resultado según
+# la huella de sus entradas y una nueva ejecución solo repite las etapas invalidadas
+USAR_CACHE_PIPELINE = True
+CARPETA_CACHE_PIPELINE = "cache_pipeline"
+VIGENCIA_CAPAS_HORAS = 24   # Las capas descargadas se reutilizan dentro de cada periodo (0 = descargar siempre)
+
+# Manifiesto de cada ejecución (etapas, memoria y contadores)
+CARPETA_MANIFIESTOS = "manifiestos"
+
+# Análisis sin mapa (python Hydro.py --analisis ...)
+RUTA_RESULTADOS_ANALISIS = "resultados_analisis.parquet"  # .parquet o .csv
+RUTA_AGREGADOS_TERRITORIO = "agregados_territorio.csv"     # Resumen por departamento y municipio
+
+# Barrido de escenarios (python Hydro.py --barrido escenarios.json ...)
+RUTA_RESULTADOS_BARRIDO = "resultados_barrido.parquet"  # Se añade _resumen para las métricas por escenario
+
+# Monte Carlo de costes (python Hydro.py --montecarlo N ...)
+RUTA_RESULTADOS_MONTECARLO = "resultados_montecarlo.parquet"
+TOP_N_MONTECARLO = 20                # Top N para la probabilidad de entrar en el ranking
+LIMITE_CELDAS_MONTECARLO = 2000000   # Muestras × puntos por bloque (acota la memoria)
+
+# Servidor local de datos del mapa (python Hydro.py --servidor ...)
+PUERTO_SERVIDOR = 8765
+NOMBRE_MAPA_SERVIDOR = "mapa_servidor.html"  # Mapa sin puntos embebidos: los pide al servidor
+TAMAÑO_CELDA_INDICE = 0.25        # Grados de cada celda del índice espacial
+TAMAÑO_CACHE_CONSULTAS = 256      # Respuestas recientes que se guardan (LRU)
+LIMITE_PUNTOS_CONSULTA = 20000    # Puntos máximos por respuesta
+
+# Informes por lotes (python Hydro.py --informes ...)
+CARPETA_INFORMES = "informes"
+TASA_CAMBIO_INFORMES = 3711.71  # COP por USD (mismo valor por defecto que el mapa)
+TURBINAS_PRIORIZABLES = ('PAT', 'Cross Flow')  # Turbinas que entran en la priorización
+
 # Valores iniciales
 CAUDAL_MIN_INICIAL = 0.15
 CAUDAL_MAX_INICIAL = 0.50
@@ -108,6 +178,20 @@ COLUMNA_POTENCIA_K = "Potencia_k"
 COLUMNA_REGION = "Region"
 COLUMNA_ZONA_CLIMA = "Zona_clima"
 
+# SOLO estas capas son restrictivas (excluyen puntos); las demás solo se muestran
+CAPAS_RESTRICTIVAS = ['parque_arqueologico', 'limite_pnn']
+
+# Distancia de cada punto al elemento más cercano de capas de líneas o polígonos
+# (red eléctrica, vías, ríos...); se añaden como columnas dist_<capa>_m e id_<capa>
+CAPAS_DISTANCIA = {}                     # {nombre: ruta de un archivo local (shp, gpkg, geojson...)}
+BORDES_DISTANCIA = []                    # Capas de áreas (p. ej. CAPAS_RESTRICTIVAS): distancia a su borde (borde_<clave>)
+CRS_DISTANCIAS = "EPSG:9377"             # MAGNA-SIRGAS 2018 / Origen-Nacional (metros)
+PUNTOS_POR_BLOQUE_DISTANCIAS = 100000    # Puntos por tarea al repartir entre procesos
+COLUMNAS_ID_ELEMENTO = ('OBJECTID', 'objectid', 'id', 'ID')  # Id del elemento (si no hay, su índice)
+
+# Columnas de texto que se guardan como categorías (pocos valores distintos)
+COLUMNAS_CATEGORICAS = [COLUMNA_MUNICIPIO, 'Departamen', COLUMNA_REGION, COLUMNA_ZONA_CLIMA]
+
 # ====================================================================
 
 # Eficiencias de cada tipo de turbina
@@ -201,6 +285,298 @@ DIFICULTAD_TURBINA = {
     'Low Head': 3
 }
 
+# Parámetros de las fórmulas de costes detallados
+PARAMETROS_COSTES = {
+    'factor_equipos': 0.8,          # Equipos sin turbina (× coste turbina)
+    'obra_civil_kw': 2200,          # Cbase obra civil (USD/kW)
+    'linea_base_menor_50': 15000,   # Línea: coste base (USD), potencia < 50 kW
+    'linea_base_mayor_50': 20000,   # Línea: coste base (USD), potencia >= 50 kW
+    'linea_kw_menor_50': 400,       # Línea: USD/kW, potencia < 50 kW
+    'linea_kw_mayor_50': 500,       # Línea: USD/kW, potencia >= 50 kW
+    'ambiental_base': 8000,         # Ambiental: coste base (USD)
+    'ambiental_kw': 100,            # Ambiental: USD/kW
+    'factor_topografia': 1.8,       # Distancia real / distancia en línea recta
+    'peso_t_kw_menor_50': 0.150,    # Peso (t/kW), potencia < 50 kW
+    'peso_t_kw_mayor_50': 0.120,    # Peso (t/kW), potencia >= 50 kW
+    'transporte_usd_t_km': 8.0,     # Transporte (USD por t·km)
+    'movilizacion': 3000,           # Movilización (USD × dificultad)
+    'logistica_kw': 100,            # Logística (USD/kW)
+    'otros_costes': 0.05,           # Otros costes (× suma de partidas)
+    'opex': 0.03                    # OPEX anual (× CAPEX)
+}
+
+# Monte Carlo: distribuciones de los parámetros inciertos ('TABLA.clave': distribución):
+#   ('uniforme', min, max) | ('triangular', min, moda, max)
+#   ('normal', media, desv) | ('lognormal', mediana, sigma)
+DISTRIBUCIONES_MONTECARLO = {
+    'PARAMETROS_COSTES.obra_civil_kw': ('triangular', 1800, 2200, 2800),
+    'PARAMETROS_COSTES.linea_base_menor_50': ('triangular', 12000, 15000, 20000),
+    'PARAMETROS_COSTES.linea_base_mayor_50': ('triangular', 16000, 20000, 26000),
+    'PARAMETROS_COSTES.linea_kw_menor_50': ('triangular', 300, 400, 550),
+    'PARAMETROS_COSTES.linea_kw_mayor_50': ('triangular', 400, 500, 650),
+    'PARAMETROS_COSTES.transporte_usd_t_km': ('triangular', 6.0, 8.0, 12.0),
+    'PARAMETROS_COSTES.factor_topografia': ('triangular', 1.4, 1.8, 2.4),
+    **{f'MULTIPLICADOR_REGION.{region}': ('triangular', m * 0.85, m, m * 1.15)
+       for region, m in MULTIPLICADOR_REGION.items()}
+}
+
+# Polígonos de selección de turbina de determinar_tipo_turbina() como
+# rectángulos abiertos (qmin, qmax, hmin, hmax) en cfs y ft. Francis es
+# en L y se describe con dos rectángulos. Mismo orden que la función.
+RECTANGULOS_TURBINAS = {
+    'Pelton': [(1, 200, 300, 5000)],
+    'Turgo': [(1, 500, 100, 1000)],
+    'Francis': [(10, 3000, 50, 300), (10, 200, 50, 3000)],
+    'Cross Flow': [(1, 200, 10, 400)],
+    'Kaplan': [(100, 10000, 10, 150)],
+    'PAT': [(1, 30, 30, 300)],
+    'Low Head': [(1, 10000, 1, 20)]
+}
+
+# ====================================================================
+# INSTRUMENTACIÓN (ETAPAS, CONTADORES Y MANIFIESTO)
+# ====================================================================
+
+# Estado de la ejecución actual (se escribe en el manifiesto al terminar)
+EJECUCION = {'inicio': time.time(), 'etapas': [], 'contadores': {}, 'nivel': 0}
+
+def memoria_pico_mb():
+    """
+    Pico de RSS del proceso en MB (None si la plataforma no lo ofrece)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (1024**2 if sys.platform == 'darwin' else 1024), 1)
+
+def memoria_rss_mb():
+    """
+    RSS actual del proceso en MB (en sistemas sin /proc, el pico)
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024**2, 1)
+    except (OSError, ValueError, AttributeError):
+        return memoria_pico_mb()
+
+def contar(nombre, cantidad=1):
+    """
+    Suma una cantidad a un contador de la ejecución (puntos, capas, bytes...)
+    """
+    EJECUCION['contadores'][nombre] = EJECUCION['contadores'].get(nombre, 0) + cantidad
+
+@contextlib.contextmanager
+def etapa(nombre, titulo=None):
+    """
+    Etapa instrumentada: muestra el título (si lo hay) y registra duración,
+    memoria y errores en el manifiesto. Se usa con `with etapa(...)` o como
+    decorador de una función
+    
+    Args:
+        nombre: Identificador de la etapa en el manifiesto
+        titulo: Título que se muestra como cabecera
+    """
+    if titulo:
+        print("\n" + "="*70)
+        print(titulo)
+        print("="*70)
+    
+    registro = {'etapa': nombre, 'nivel': EJECUCION['nivel'], 'rss_inicio_mb': memoria_rss_mb()}
+    EJECUCION['etapas'].append(registro)
+    EJECUCION['nivel'] += 1
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    except BaseException as e:
+        registro['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        EJECUCION['nivel'] -= 1
+        registro['segundos'] = round(time.perf_counter() - inicio, 4)
+        registro['rss_fin_mb'] = memoria_rss_mb()
+        if registro['rss_inicio_mb'] is not None and registro['rss_fin_mb'] is not None:
+            registro['rss_delta_mb'] = round(registro['rss_fin_mb'] - registro['rss_inicio_mb'], 1)
+        registro['rss_pico_mb'] = memoria_pico_mb()
+
+def iniciar_ejecucion(modo, argumentos):
+    """
+    Reinicia el estado de la ejecución (etapas y contadores)
+    """
+    EJECUCION.update({'inicio': time.time(), 'modo': modo, 'argumentos': argumentos,
+                      'estado': 'incompleta', 'etapas': [], 'contadores': {}, 'nivel': 0})
+
+def guardar_manifiesto(ruta=None, perfil=None):
+    """
+    Escribe el manifiesto JSON de la ejecución y muestra el resumen de etapas
+    
+    Args:
+        ruta: Archivo del manifiesto (None = CARPETA_MANIFIESTOS/ejecucion_<fecha>.json)
+        perfil: cProfile.Profile opcional; se guarda junto al manifiesto (.prof)
+    
+    Returns:
+        Ruta del manifiesto
+    """
+    import platform
+    from datetime import datetime
+    
+    inicio = datetime.fromtimestamp(EJECUCION['inicio'])
+    if ruta is None:
+        os.makedirs(CARPETA_MANIFIESTOS, exist_ok=True)
+        ruta = os.path.join(CARPETA_MANIFIESTOS, f"ejecucion_{inicio.strftime('%Y%m%d_%H%M%S')}.json")
+    
+    manifiesto = {
+        'inicio': inicio.isoformat(timespec='seconds'),
+        'segundos_total': round(time.time() - EJECUCION['inicio'], 3),
+        'modo': EJECUCION.get('modo'),
+        'estado': EJECUCION.get('estado'),
+        'error': EJECUCION.get('error'),
+        'argumentos': EJECUCION.get('argumentos'),
+        'entorno': {
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'argv': sys.argv
+        },
+        'rss_pico_mb': memoria_pico_mb(),
+        'etapas': EJECUCION['etapas'],
+        'contadores': EJECUCION['contadores']
+    }
+    
+    if perfil is not None:
+        import pstats
+        ruta_perfil = os.path.splitext(ruta)[0] + '.prof'
+        perfil.dump_stats(ruta_perfil)
+        manifiesto['perfil'] = ruta_perfil
+        print("\n🔬 PERFIL (20 funciones con más tiempo acumulado)")
+        pstats.Stats(perfil).sort_stats('cumulative').print_stats(20)
+    
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2, ensure_ascii=False, default=str)
+    
+    print("\n⏱️  ETAPAS")
+    for registro in EJECUCION['etapas']:
+        nombre = '  ' * registro['nivel'] + registro['etapa']
+        print(f"   {nombre:<28} {registro.get('segundos', 0):>9.2f} s   Δ RSS {registro.get('rss_delta_mb', '-')} MB")
+    if EJECUCION['contadores']:
+        print("   " + " | ".join(f"{c}: {v:,}" for c, v in EJECUCION['contadores'].items()))
+    print(f"📝 Manifiesto: {ruta}" + (f" | Perfil: {manifiesto['perfil']}" if perfil is not None else ""))
+    return ruta
+
+# ====================================================================
+# PIPELINE POR ETAPAS CON PUNTOS DE CONTROL
+# ====================================================================
+
+def huella_archivo(ruta):
+    """
+    SHA-256 del contenido de un archivo (None si no existe)
+    """
+    import hashlib
+    if not os.path.exists(ruta):
+        return None
+    huella = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            huella.update(bloque)
+    return huella.hexdigest()
+
+def huella_capas(capas_areas):
+    """
+    Huella del contenido de las capas de áreas (configuración, atributos y
+    geometrías): las etapas siguientes no se invalidan si una nueva descarga
+    trae las mismas capas
+    """
+    import hashlib
+    import shapely
+    huella = hashlib.sha256()
+    for key, datos in sorted(capas_areas.items()):
+        huella.update(repr((key, datos['config'] if datos is not None else None)).encode())
+        if datos is None:
+            continue
+        gdf = datos['geodataframe']
+        atributos = gdf.drop(columns=gdf.geometry.name)
+        huella.update(repr(list(atributos.columns)).encode())
+        huella.update(pd.util.hash_pandas_object(atributos.astype(str), index=True).to_numpy().tobytes())
+        for wkb in shapely.to_wkb(gdf.geometry.to_numpy()):
+            huella.update(wkb or b'')
+    return huella.hexdigest()[:16]
+
+def periodo_vigencia_capas():
+    """
+    Periodo de VIGENCIA_CAPAS_HORAS horas en curso (entra en la clave de la
+    etapa de descarga, así que las capas remotas se vuelven a pedir en cada
+    periodo); None si no se descargan capas
+    """
+    if not DESCARGAR_CAPAS or VIGENCIA_CAPAS_HORAS <= 0:
+        return None
+    return int(time.time() // (VIGENCIA_CAPAS_HORAS * 3600))
+
+def etapa_pipeline(nombre, funcion, entradas, codigo=(), recalcular=False, guardar_si=None, vigente=None,
+                   carpeta=CARPETA_CACHE_PIPELINE):
+    """
+    Etapa del pipeline con punto de control. El resultado se guarda en
+    carpeta/<nombre>_<clave>.pkl, con la clave calculada a partir de sus
+    entradas (parámetros y claves de las etapas de las que depende) y del
+    código que la ejecuta; si ese archivo ya existe la etapa no se repite,
+    así que una ejecución interrumpida se reanuda en la primera etapa sin
+    punto de control
+    
+    Args:
+        nombre: Nombre de la etapa
+        funcion: Función sin argumentos que calcula el resultado
+        entradas: Valores de los que depende el resultado (con repr estable)
+        codigo: Funciones cuyo código fuente entra en la clave
+        recalcular: True para ejecutarla aunque haya punto de control
+        guardar_si: Función resultado -> bool; si devuelve False no se guarda
+            el punto de control (p. ej. descargas incompletas)
+        vigente: Función resultado -> bool que valida un punto de control leído
+        carpeta: Carpeta de los puntos de control
+    
+    Returns:
+        (resultado, clave): la clave se pasa como entrada a las etapas siguientes
+    """
+    import glob
+    import pickle
+    import hashlib
+    import inspect
+    
+    huella = hashlib.sha256(repr((nombre, entradas)).encode())
+    for f in codigo:
+        huella.update(inspect.getsource(f).encode())
+    clave = huella.hexdigest()[:16]
+    ruta = os.path.join(carpeta, f"{nombre}_{clave}.pkl")
+    
+    with etapa(f"pipeline_{nombre}") as registro:
+        registro['clave'] = clave
+        if USAR_CACHE_PIPELINE and not recalcular and os.path.exists(ruta):
+            try:
+                with open(ruta, 'rb') as f:
+                    resultado = pickle.load(f)['resultado']
+                if vigente is None or vigente(resultado):
+                    print(f"\n♻️  Etapa '{nombre}' desde el punto de control ({ruta})")
+                    registro['punto_control'] = 'reutilizado'
+                    contar('etapas_reutilizadas')
+                    return resultado, clave
+            except Exception as e:
+                print(f"\n⚠️  Punto de control ilegible ({ruta}): {e}")
+        
+        resultado = funcion()
+        registro['punto_control'] = 'calculado'
+        contar('etapas_calculadas')
+        if USAR_CACHE_PIPELINE and resultado is not None and (guardar_si is None or guardar_si(resultado)):
+            os.makedirs(carpeta, exist_ok=True)
+            temporal = ruta + '.tmp'
+            with open(temporal, 'wb') as f:
+                pickle.dump({'etapa': nombre, 'clave': clave, 'resultado': resultado}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporal, ruta)
+            # Solo se conserva el último punto de control de cada etapa
+            for anterior in glob.glob(os.path.join(carpeta, f"{nombre}_*.pkl")):
+                if anterior != ruta:
+                    os.remove(anterior)
+        return resultado, clave
+
 def calcular_costes_detallados(tipo_turbina, potencia_kw, caida_m, dist_capital_m, region):
     """
     Calcula CAPEX detallado por partidas y OPEX para una turbina
@@ -216,17 +592,18 @@ def calcular_costes_detallados(tipo_turbina, potencia_kw, caida_m, dist_capital_
         Diccionario con todos los costes detallados
     """
     costes = {}
+    P = PARAMETROS_COSTES
     
     # 1. Coste turbina (ya calculado previamente)
     coste_turbina = potencia_kw * COSTOS_CAPEX[tipo_turbina]
     costes['coste_turbina'] = coste_turbina
     
     # 2. Coste equipos sin turbina
-    coste_equipos = coste_turbina * 0.8
+    coste_equipos = coste_turbina * P['factor_equipos']
     costes['coste_equipos'] = coste_equipos
     
     # 3. Coste obra civil
-    Cbase = 2200
+    Cbase = P['obra_civil_kw']
     coste_obra_civil = Cbase * potencia_kw
     costes['coste_obra_civil'] = coste_obra_civil
     
@@ -237,38 +614,38 @@ def calcular_costes_detallados(tipo_turbina, potencia_kw, caida_m, dist_capital_
     
     # 5. Coste línea de conexión eléctrica
     if potencia_kw < 50:
-        Cbase_linea = 15000
-        F = 400
+        Cbase_linea = P['linea_base_menor_50']
+        F = P['linea_kw_menor_50']
     else:
-        Cbase_linea = 20000
-        F = 500
+        Cbase_linea = P['linea_base_mayor_50']
+        F = P['linea_kw_mayor_50']
     coste_linea = Cbase_linea + (potencia_kw * F)
     costes['coste_linea'] = coste_linea
     
     # 6. Costes ambientales
     M_impacto = MULTIPLICADOR_IMPACTO[tipo_turbina]
-    coste_ambiental = (8000 + 100 * potencia_kw) * M_impacto
+    coste_ambiental = (P['ambiental_base'] + P['ambiental_kw'] * potencia_kw) * M_impacto
     costes['coste_ambiental'] = coste_ambiental
     
     # 7. Coste transporte
     dist_capital_km = dist_capital_m / 1000
-    D_real = dist_capital_km * 1.8  # Factor topografía
+    D_real = dist_capital_km * P['factor_topografia']  # Factor topografía
     
     # Peso estimado
     if potencia_kw < 50:
-        W = potencia_kw * 0.150  # 150 kg/kW en toneladas
+        W = potencia_kw * P['peso_t_kw_menor_50']  # 150 kg/kW en toneladas
     else:
-        W = potencia_kw * 0.120  # 120 kg/kW en toneladas
+        W = potencia_kw * P['peso_t_kw_mayor_50']  # 120 kg/kW en toneladas
     
     M_turb = MULTIPLICADOR_TRANSPORTE[tipo_turbina]
     M_region = MULTIPLICADOR_REGION.get(region, 1.2)
     
-    coste_transporte_base = 8.0 * D_real * W * M_turb * M_region
+    coste_transporte_base = P['transporte_usd_t_km'] * D_real * W * M_turb * M_region
     
     # Costes adicionales de transporte
     dificultad_turb = DIFICULTAD_TURBINA[tipo_turbina]
-    C_movilizacion = 3000 * dificultad_turb * M_region
-    C_logistica = 100 * potencia_kw * M_region
+    C_movilizacion = P['movilizacion'] * dificultad_turb * M_region
+    C_logistica = P['logistica_kw'] * potencia_kw * M_region
     
     coste_transporte = coste_transporte_base + C_movilizacion + C_logistica
     costes['coste_transporte'] = coste_transporte
@@ -276,7 +653,7 @@ def calcular_costes_detallados(tipo_turbina, potencia_kw, caida_m, dist_capital_
     # 8. Otros costes
     suma_parcial = (coste_turbina + coste_equipos + coste_obra_civil + 
                     coste_instalacion + coste_linea + coste_ambiental + coste_transporte)
-    otros_costes = suma_parcial * 0.05
+    otros_costes = suma_parcial * P['otros_costes']
     costes['otros_costes'] = otros_costes
     
     # CAPEX Total
@@ -284,7 +661,7 @@ def calcular_costes_detallados(tipo_turbina, potencia_kw, caida_m, dist_capital_
     costes['capex_total'] = capex_total
     
     # OPEX
-    opex = capex_total * 0.03
+    opex = capex_total * P['opex']
     costes['opex'] = opex
     
     return costes
@@ -413,6 +790,36 @@ def calcular_distancia_haversine(lat1, lon1, lat2, lon2):
     distancia = R * c
     return distancia
 
+def leer_capa_geojson(geojson_data):
+    """
+    Convierte la respuesta GeoJSON del servidor en un GeoDataFrame EPSG:4326
+    
+    Returns:
+        GeoDataFrame, o None si no hay entidades
+    """
+    if 'features' in geojson_data and len(geojson_data['features']) > 0:
+        gdf = gpd.GeoDataFrame.from_features(geojson_data['features'])
+        if gdf.crs is None:
+            gdf.set_crs("EPSG:4326", inplace=True)
+        elif gdf.crs != "EPSG:4326":
+            gdf = gdf.to_crs("EPSG:4326")
+        return gdf
+    return None
+
+def calcular_distancia_haversine_vectorizada(lat1, lon1, lat2, lon2):
+    """
+    Versión con arrays de calcular_distancia_haversine() (metros)
+    """
+    R = 6371000  # Radio de la Tierra en metros
+    
+    delta_lat = np.radians(lat2 - lat1)
+    delta_lon = np.radians(lon2 - lon1)
+    
+    a = np.sin(delta_lat/2)**2 + np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * np.sin(delta_lon/2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+    
+    return R * c
+
 def descargar_capa_desde_api(layer_id, nombre_capa):
     url = f"{BASE_URL}/{layer_id}/query"
     params = {'where': '1=1', 'outFields': '*', 'f': 'geojson', 'returnGeometry': 'true'}
@@ -438,6 +845,7 @@ def descargar_capa_desde_api(layer_id, nombre_capa):
             try:
                 response = session.get(url, params=params, headers=headers, timeout=60)
                 response.raise_for_status()
+                contar('bytes_descargados', len(response.content))
                 geojson_data = response.json()
                 break
             except Exception as e:
@@ -447,12 +855,8 @@ def descargar_capa_desde_api(layer_id, nombre_capa):
                 else:
                     raise e
         
-        if 'features' in geojson_data and len(geojson_data['features']) > 0:
-            gdf = gpd.GeoDataFrame.from_features(geojson_data['features'])
-            if gdf.crs is None:
-                gdf.set_crs("EPSG:4326", inplace=True)
-            elif gdf.crs != "EPSG:4326":
-                gdf = gdf.to_crs("EPSG:4326")
+        gdf = leer_capa_geojson(geojson_data)
+        if gdf is not None:
             print(f"✓ {len(gdf)}")
             return gdf
         print(f"⚠ Sin datos")
@@ -461,11 +865,37 @@ def descargar_capa_desde_api(layer_id, nombre_capa):
         print(f"✗ Error: {str(e)[:100]}")
         return None
 
-def cargar_shapefile_puntos(ruta):
-    print("\n" + "="*70)
-    print("CARGANDO SHAPEFILE")
-    print("="*70)
+def descargar_capas():
+    """
+    Descarga todas las capas de CAPAS_CONFIG (si DESCARGAR_CAPAS está activo)
+    
+    Returns:
+        Diccionario {clave: {'geodataframe': gdf, 'config': cfg}} con las capas descargadas
+    """
+    capas = {}
+    if not DESCARGAR_CAPAS:
+        print("\n⚠️  DESCARGA DE CAPAS DESHABILITADA")
+        print("   Para habilitar, cambia DESCARGAR_CAPAS = True en la configuración\n")
+        return capas
     
+    capas_exitosas = 0
+    capas_fallidas = 0
+    with etapa('descarga_capas', "DESCARGANDO CAPAS"):
+        for key, cfg in CAPAS_CONFIG.items():
+            gdf = descargar_capa_desde_api(cfg['id'], cfg['nombre'])
+            if gdf is not None:
+                capas[key] = {'geodataframe': gdf, 'config': cfg}
+                capas_exitosas += 1
+            else:
+                capas_fallidas += 1
+        
+        contar('capas_ok', capas_exitosas)
+        contar('capas_fallidas', capas_fallidas)
+        print(f"\n📊 Resumen de capas: {capas_exitosas} exitosas, {capas_fallidas} fallidas")
+    return capas
+
+@etapa('carga', "CARGANDO SHAPEFILE")
+def cargar_shapefile_puntos(ruta):
     try:
         if ruta.lower().endswith(".zip"):
             # Crear carpeta temporal
@@ -494,22 +924,131 @@ def cargar_shapefile_puntos(ruta):
             puntos = puntos.to_crs("EPSG:4326")
         
         print(f"✓ {len(puntos)} puntos cargados")
+        contar('puntos_cargados', len(puntos))
+        
+        if OPTIMIZAR_TIPOS_PUNTOS:
+            puntos = optimizar_tipos_puntos(puntos)
         return puntos
     
     except Exception as e:
         print(f"✗ Error: {e}")
         return None
 
-def filtrar_puntos_fuera_de_areas(puntos, capas_areas):
-    print("\n" + "="*70)
-    print("FILTRO ESPACIAL - SOLO PARQUES ARQUEOLÓGICOS Y PNN")
-    print("="*70 + "\n")
+def decimales_float32(valores):
+    """
+    Número de decimales con el que una columna float64 cabe en float32 sin
+    perder nada: al volver a float64 y redondear a esos decimales se recuperan
+    exactamente los valores originales
+    
+    Args:
+        valores: Array float64
+    
+    Returns:
+        Número de decimales (0 a MAX_DECIMALES_FLOAT32), o None si la columna
+        necesita float64
+    """
+    finitos = valores[np.isfinite(valores)]
+    for decimales in range(MAX_DECIMALES_FLOAT32 + 1):
+        if np.array_equal(np.round(finitos, decimales), finitos):
+            recuperados = np.round(finitos.astype(np.float32).astype(np.float64), decimales)
+            return decimales if np.array_equal(recuperados, finitos) else None
+    return None
+
+def optimizar_tipos_puntos(puntos):
+    """
+    Reduce la memoria de los puntos: float64 → float32 cuando los valores
+    tienen pocos decimales, enteros → int32 si caben y las columnas de texto
+    de COLUMNAS_CATEGORICAS → category. Muestra la memoria por columna
+    
+    Los decimales de cada columna float32 se guardan en puntos.attrs para que
+    valores_float64() devuelva exactamente los valores del shapefile
+    
+    Args:
+        puntos: GeoDataFrame recién cargado
+    
+    Returns:
+        GeoDataFrame con los nuevos tipos
+    """
+    antes = puntos.memory_usage(deep=True, index=False)
+    tipos_antes = puntos.dtypes.astype(str)
+    decimales = {}
+    cambios = {}
+    
+    for col in puntos.columns:
+        if col == puntos.geometry.name:
+            continue
+        serie = puntos[col]
+        if col in COLUMNAS_CATEGORICAS and not isinstance(serie.dtype, pd.CategoricalDtype):
+            cambios[col] = serie.astype('category')
+        elif pd.api.types.is_float_dtype(serie.dtype) and serie.dtype != np.float32:
+            d = decimales_float32(serie.to_numpy(dtype=np.float64))
+            if d is not None:
+                cambios[col] = serie.astype(np.float32)
+                decimales[col] = d
+        elif pd.api.types.is_signed_integer_dtype(serie.dtype) and serie.dtype.itemsize > 4:
+            limites = np.iinfo(np.int32)
+            if len(serie) == 0 or (serie.min() >= limites.min and serie.max() <= limites.max):
+                cambios[col] = serie.astype(np.int32)
     
-    puntos_filtrados = puntos.copy()
-    total = len(puntos_filtrados)
+    if cambios:
+        puntos = puntos.assign(**cambios)
+    puntos.attrs['decimales'] = {**puntos.attrs.get('decimales', {}), **decimales}
     
-    # SOLO estas capas son restrictivas (excluyen puntos)
-    CAPAS_RESTRICTIVAS = ['parque_arqueologico', 'limite_pnn']
+    informe_memoria_puntos(antes, tipos_antes, puntos)
+    return puntos
+
+def informe_memoria_puntos(antes, tipos_antes, puntos):
+    """
+    Imprime la memoria de cada columna antes y después de optimizar_tipos_puntos()
+    
+    Args:
+        antes: memory_usage(deep=True, index=False) antes de optimizar
+        tipos_antes: dtypes (como texto) antes de optimizar
+        puntos: GeoDataFrame optimizado
+    """
+    despues = puntos.memory_usage(deep=True, index=False)
+    tipos_despues = puntos.dtypes.astype(str)
+    mb = 1024 * 1024
+    
+    print("\n📦 MEMORIA DE LOS PUNTOS POR COLUMNA")
+    for col in despues.index:
+        tipo = tipos_antes[col] if tipos_antes[col] == tipos_despues[col] else f"{tipos_antes[col]} → {tipos_despues[col]}"
+        print(f"   {col:<14} {tipo:<22} {antes[col] / mb:>9.2f} MB → {despues[col] / mb:>8.2f} MB")
+    
+    total_antes, total_despues = int(antes.sum()), int(despues.sum())
+    ahorro = 1 - total_despues / total_antes if total_antes else 0
+    print(f"   {'Total':<37} {total_antes / mb:>9.2f} MB → {total_despues / mb:>8.2f} MB ({ahorro:.0%} menos)\n")
+    contar('bytes_puntos_antes', total_antes)
+    contar('bytes_puntos_despues', total_despues)
+
+def valores_float64(puntos, columna):
+    """
+    Columna numérica en float64 con los mismos valores que en el shapefile
+    (deshace el paso a float32 de optimizar_tipos_puntos())
+    """
+    serie = puntos[columna]
+    if serie.dtype != np.float32:
+        return serie
+    decimales = puntos.attrs.get('decimales', {}).get(columna)
+    valores = serie.astype(np.float64)
+    return valores.round(decimales) if decimales is not None else valores
+
+def restaurar_tipos_puntos(puntos):
+    """
+    Puntos con las columnas float32 de nuevo en float64 (valores exactos) para
+    los cálculos que leen punto a punto
+    """
+    columnas = [col for col in puntos.columns if puntos[col].dtype == np.float32]
+    if not columnas:
+        return puntos
+    return puntos.assign(**{col: valores_float64(puntos, col) for col in columnas})
+
+@etapa('filtro_espacial', "FILTRO ESPACIAL - SOLO PARQUES ARQUEOLÓGICOS Y PNN")
+def filtrar_puntos_fuera_de_areas(puntos, capas_areas):
+    # Solo se marcan los puntos excluidos; la tabla se copia una vez al final
+    total = len(puntos)
+    excluido = np.zeros(total, dtype=bool)
+    geometrias = puntos[[puntos.geometry.name]]
     
     print("⚠️  CAPAS RESTRICTIVAS (excluyen puntos):")
     print("   • Parques Arqueológicos")
@@ -535,68 +1074,43 @@ def filtrar_puntos_fuera_de_areas(puntos, capas_areas):
         print(f"  Filtrando contra {config['nombre']}...", end=" ")
         
         try:
-            puntos_dentro = gpd.sjoin(puntos_filtrados, gdf_area, how='inner', predicate='within')
-            indices = puntos_dentro.index.unique()
-            puntos_filtrados = puntos_filtrados.drop(indices)
-            eliminados = len(indices)
-            print(f"✓ -{eliminados:,}, quedan {len(puntos_filtrados):,}")
+            puntos_dentro = gpd.sjoin(geometrias[~excluido], gdf_area[[gdf_area.geometry.name]],
+                                      how='inner', predicate='within')
+            dentro = geometrias.index.isin(puntos_dentro.index)
+            eliminados = int(dentro.sum())
+            excluido |= dentro
+            print(f"✓ -{eliminados:,}, quedan {total - int(excluido.sum()):,}")
         except Exception as e:
             print(f"⚠ Error: {e}")
     
+    puntos_filtrados = puntos[~excluido] if excluido.any() else puntos
+    
     print(f"\n{'='*70}")
     print(f"✓ FILTRO ESPACIAL COMPLETADO")
     print(f"  Inicial: {total:,} | Fuera áreas restrictivas: {len(puntos_filtrados):,} ({len(puntos_filtrados)/total*100:.1f}%)")
     print(f"  Capas filtradas aplicadas: {len(capas_disponibles)}/{len(CAPAS_RESTRICTIVAS)}")
     print(f"{'='*70}\n")
     
+    contar('puntos_entrada_filtro', total)
+    contar('puntos_salida_filtro', len(puntos_filtrados))
     return puntos_filtrados
 
-def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
-    print("Creando mapa interactivo...\n")
-    
-    centro_lat = puntos_filtrados.geometry.y.mean()
-    centro_lon = puntos_filtrados.geometry.x.mean()
-    
-    mapa = folium.Map(location=[centro_lat, centro_lon], zoom_start=6, tiles='cartodbdark_matter')
-    
-    folium.TileLayer('OpenStreetMap', name='Mapa Claro').add_to(mapa)
-    folium.TileLayer('cartodbdark_matter', name='Mapa Oscuro ⚫').add_to(mapa)
-    folium.TileLayer('cartodbpositron', name='Mapa Minimalista').add_to(mapa)
+@etapa('preparacion_puntos')
+def preparar_puntos(puntos_filtrados):
+    """
+    Prepara los datos de cada punto para el mapa y los informes: capital más
+    cercana, turbinas aplicables y costes detallados de cada turbina
     
-    for key, datos in capas_areas.items():
-        if datos is None:
-            continue
-        gdf = datos['geodataframe']
-        config = datos['config']
-        grupo = folium.FeatureGroup(name=config['nombre'], show=True)
-        style_function = lambda x, color=config['color'], opacity=config['fill_opacity']: {
-            'fillColor': color, 'fillOpacity': opacity, 'color': color, 'weight': 2, 'opacity': 0.8
-        }
-        folium.GeoJson(gdf, style_function=style_function).add_to(grupo)
-        grupo.add_to(mapa)
+    Args:
+        puntos_filtrados: GeoDataFrame de puntos (EPSG:4326)
     
+    Returns:
+        Lista de diccionarios, uno por punto
+    """
     puntos_data = []
+    puntos_filtrados = restaurar_tipos_puntos(puntos_filtrados)
     columnas = [col for col in puntos_filtrados.columns if col != 'geometry']
     
-    print(f"Preparando {len(puntos_filtrados):,} puntos...")
-    
-    # Calcular máximos reales y redondear
-    if COLUMNA_VSS in puntos_filtrados.columns:
-        vss_valores = puntos_filtrados[COLUMNA_VSS].dropna()
-        vss_max_real = math.ceil(vss_valores.max()) if len(vss_valores) > 0 else 10
-        vss_min_inicial = 0
-        print(f"  VSS: mín=0, máx={vss_max_real} (redondeado)")
-    else:
-        vss_max_real = 10
-        vss_min_inicial = 0
-    
-    if COLUMNA_DISTANCIA in puntos_filtrados.columns:
-        dist_valores = puntos_filtrados[COLUMNA_DISTANCIA].dropna()
-        dist_max_real = math.ceil(dist_valores.max()) if len(dist_valores) > 0 else 100
-        print(f"  Distancia: máx={dist_max_real} (redondeado)")
-    else:
-        dist_max_real = 100
-    
     for idx, row in puntos_filtrados.iterrows():
         # Obtener departamento del punto
         departamento = str(row['Departamen']) if 'Departamen' in row and pd.notna(row['Departamen']) else ''
@@ -734,79 +1248,1067 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
         puntos_data.append(punto)
     
     print("✓ Puntos preparados")
+    contar('puntos_preparados', len(puntos_data))
+    contar('turbinas_calculadas', sum(len(p['turbinas']) for p in puntos_data))
     
-    # Panel de controles
-    controles_html = f'''
-    <div id="control-panel" style="position: fixed; top: 80px; left: 10px; width: 380px; 
-         background: white; z-index: 9999; padding: 18px; border-radius: 10px; 
-         box-shadow: 0 6px 12px rgba(0,0,0,0.4); font-family: 'Segoe UI', Arial, sans-serif; 
-         max-height: 85vh; overflow-y: auto;">
-        
-        <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 20px; border-bottom: 3px solid #E54D9A; padding-bottom: 10px;">
-            <h3 style="margin: 0; color: #5D0E41; font-size: 18px;">
-                🎛️ Filtros Interactivos
-            </h3>
-            <button id="btn-minimizar" onclick="toggleMinimizar()" style="background: #E54D9A; color: white; border: none; border-radius: 50%; width: 30px; height: 30px; cursor: pointer; font-size: 16px; font-weight: bold; display: flex; align-items: center; justify-content: center; box-shadow: 0 2px 4px rgba(0,0,0,0.2);" title="Minimizar/Maximizar">
-                −
-            </button>
-        </div>
-        
-        <div id="panel-contenido">
-        
-        <div style="border: 2px solid #E54D9A; padding: 15px; border-radius: 8px; margin-bottom: 18px; background: #F5F3F0;">
-            <h4 style="margin: 0 0 15px 0; color: #E54D9A; font-size: 15px;">Filtros</h4>
-            
-            <!-- Caudal -->
-            <div style="margin-bottom: 20px; background: white; padding: 12px; border-radius: 6px; border: 1px solid #e0e0e0;">
-                <div style="display: flex; align-items: center; margin-bottom: 8px;">
-                    <span style="font-size: 20px; margin-right: 8px;">💧</span>
-                    <label style="font-weight: 600; font-size: 13px; color: #5D0E41; flex: 1;">Caudal</label>
-                </div>
-                <div style="display: flex; gap: 10px; align-items: center; margin-bottom: 6px;">
-                    <div style="flex: 1;">
-                        <div style="font-size: 11px; color: #8B8B6E; margin-bottom: 3px;">Mínimo</div>
-                        <div style="font-size: 16px; font-weight: bold; color: #E54D9A;">
-                            <span id="cmin">{CAUDAL_MIN_INICIAL}</span>
-                        </div>
-                    </div>
-                    <div style="color: #C0C0B0; font-size: 18px;">-</div>
-                    <div style="flex: 1; text-align: right;">
-                        <div style="font-size: 11px; color: #8B8B6E; margin-bottom: 3px;">Máximo</div>
-                        <div style="font-size: 16px; font-weight: bold; color: #E54D9A;">
-                            <span id="cmax">{CAUDAL_MAX_INICIAL}</span>
-                        </div>
-                    </div>
-                </div>
-                <input type="range" id="caudal-min" min="0" max="1" step="0.01" value="{CAUDAL_MIN_INICIAL}" 
-                       style="width: 100%; margin-bottom: 5px; height: 6px;" oninput="actualizarValores()">
-                <input type="range" id="caudal-max" min="0" max="1" step="0.01" value="{CAUDAL_MAX_INICIAL}" 
-                       style="width: 100%; height: 6px;" oninput="actualizarValores()">
-            </div>
-            
-            <!-- Pendiente -->
-            <div style="margin-bottom: 20px; background: white; padding: 12px; border-radius: 6px; border: 1px solid #e0e0e0;">
-                <div style="display: flex; align-items: center; margin-bottom: 8px;">
-                    <span style="font-size: 20px; margin-right: 8px;">📐</span>
-                    <label style="font-weight: 600; font-size: 13px; color: #5D0E41; flex: 1;">Pendiente Mínima</label>
-                    <span style="font-size: 16px; font-weight: bold; color: #E54D9A;" id="pmin">{PENDIENTE_MIN_INICIAL}</span>
-                </div>
-                <input type="range" id="pend-min" min="0" max="0.5" step="0.01" value="{PENDIENTE_MIN_INICIAL}" 
-                       style="width: 100%; height: 6px;" oninput="actualizarValores()">
-            </div>
-            
-            <!-- VSS MÍNIMO - ICONO 🏠 -->
-            <div style="margin-bottom: 20px; background: white; padding: 12px; border-radius: 6px; border: 1px solid #e0e0e0;">
-                <div style="display: flex; align-items: center; margin-bottom: 8px;">
-                    <span style="font-size: 20px; margin-right: 8px;">🏠</span>
-                    <label style="font-weight: 600; font-size: 13px; color: #5D0E41; flex: 1;">VSS Mínimo</label>
-                    <span style="font-size: 16px; font-weight: bold; color: #FF0066;" id="vss-min-val">{vss_min_inicial}</span>
-                </div>
-                <div style="font-size: 10px; color: #A8A890; margin-bottom: 4px;">
-                    Viviendas Sin Servicio | Rango: 0 - {vss_max_real}
-                </div>
-                <input type="range" id="vss-min" min="0" max="{vss_max_real}" step="1" 
-                       value="{vss_min_inicial}" style="width: 100%; height: 6px;" oninput="actualizarValores()">
-            </div>
+    return puntos_data
+
+# ====================================================================
+# DISTANCIAS AL ELEMENTO MÁS CERCANO DE CAPAS
+# ====================================================================
+
+# Árboles STRtree de las capas de distancia (se asignan en cada proceso)
+ARBOLES_DISTANCIA = None
+
+def capas_para_distancias(capas_areas):
+    """
+    Capas de CAPAS_DISTANCIA y bordes de las capas de BORDES_DISTANCIA, en
+    CRS_DISTANCIAS y como WKB para enviarlas a los procesos
+    
+    Returns:
+        Diccionario {nombre: (wkb, ids)} con las geometrías y el id de cada elemento
+    """
+    import shapely
+    
+    capas = {}
+    for nombre, ruta in CAPAS_DISTANCIA.items():
+        if not os.path.exists(ruta):
+            print(f"  ⚠️  No existe {ruta}: se omite '{nombre}'")
+            continue
+        capas[nombre] = gpd.read_file(ruta)
+    for key in BORDES_DISTANCIA:
+        datos = capas_areas.get(key)
+        if datos is not None:
+            gdf = datos['geodataframe']
+            capas[f"borde_{key}"] = gdf.set_geometry(gdf.geometry.boundary)
+    
+    resultado = {}
+    for nombre, gdf in capas.items():
+        gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+        if gdf.crs is None:
+            gdf = gdf.set_crs("EPSG:4326")
+        gdf = gdf.to_crs(CRS_DISTANCIAS)
+        columna_id = next((c for c in COLUMNAS_ID_ELEMENTO if c in gdf.columns), None)
+        ids = gdf[columna_id].to_numpy(dtype=object) if columna_id else gdf.index.to_numpy(dtype=object)
+        resultado[nombre] = (shapely.to_wkb(gdf.geometry.to_numpy()), ids)
+    return resultado
+
+def construir_arboles_distancia(capas_wkb):
+    """
+    Inicializador de cada proceso: un STRtree por capa de distancia
+    """
+    import shapely
+    global ARBOLES_DISTANCIA
+    ARBOLES_DISTANCIA = {nombre: shapely.STRtree(shapely.from_wkb(wkb)) for nombre, (wkb, _) in capas_wkb.items()}
+
+def distancias_bloque(coordenadas):
+    """
+    Distancia al elemento más cercano de cada capa para un bloque de puntos
+    (se ejecuta en un proceso hijo)
+    
+    Args:
+        coordenadas: Tupla (x, y) de arrays en CRS_DISTANCIAS
+    
+    Returns:
+        Diccionario {nombre: (distancia_m, posición del elemento)}; NaN y -1
+        si la capa no tiene elementos
+    """
+    import shapely
+    puntos = shapely.points(*coordenadas)
+    resultado = {}
+    for nombre, arbol in ARBOLES_DISTANCIA.items():
+        distancia = np.full(len(puntos), np.nan)
+        elemento = np.full(len(puntos), -1, dtype=np.int64)
+        if len(arbol.geometries) > 0:
+            (entrada, posicion), valores = arbol.query_nearest(puntos, return_distance=True, all_matches=False)
+            distancia[entrada] = valores
+            elemento[entrada] = posicion
+        resultado[nombre] = (distancia, elemento)
+    return resultado
+
+@etapa('distancias', "DISTANCIAS AL ELEMENTO MÁS CERCANO DE CAPAS")
+def calcular_distancias_capas(puntos, capas_areas, procesos=None, bloque=PUNTOS_POR_BLOQUE_DISTANCIAS):
+    """
+    Distancia de cada punto al elemento más cercano de cada capa de
+    distancia (consulta STRtree en CRS_DISTANCIAS, por bloques de puntos
+    repartidos entre procesos) y el id de ese elemento
+    
+    Args:
+        puntos: GeoDataFrame de puntos
+        capas_areas: Capas descargadas (para BORDES_DISTANCIA)
+        procesos: Número de procesos (None = todos los núcleos)
+        bloque: Puntos por tarea
+    
+    Returns:
+        DataFrame con el índice de los puntos y las columnas dist_<capa>_m e
+        id_<capa>, o None si no hay capas de distancia
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    
+    capas_wkb = capas_para_distancias(capas_areas)
+    if not capas_wkb:
+        print("  Sin capas de distancia (CAPAS_DISTANCIA / BORDES_DISTANCIA)")
+        return None
+    
+    proyectados = puntos.geometry.to_crs(CRS_DISTANCIAS)
+    x, y = proyectados.x.to_numpy(), proyectados.y.to_numpy()
+    tramos = [(x[i:i + bloque], y[i:i + bloque]) for i in range(0, len(x), bloque)]
+    procesos = max(1, min(procesos or os.cpu_count() or 1, len(tramos)))
+    print(f"  Capas: {len(capas_wkb)} | Puntos: {len(x):,} | Bloques: {len(tramos)} | Procesos: {procesos}")
+    
+    if procesos == 1:
+        construir_arboles_distancia(capas_wkb)
+        partes = [distancias_bloque(tramo) for tramo in tramos]
+    else:
+        with ProcessPoolExecutor(max_workers=procesos, initializer=construir_arboles_distancia,
+                                 initargs=(capas_wkb,)) as pool:
+            partes = list(pool.map(distancias_bloque, tramos))
+    
+    columnas = {}
+    for nombre, (_, ids) in capas_wkb.items():
+        distancia = np.concatenate([p[nombre][0] for p in partes]) if partes else np.empty(0)
+        elemento = np.concatenate([p[nombre][1] for p in partes]) if partes else np.empty(0, dtype=np.int64)
+        ids_elemento = np.full(len(elemento), None, dtype=object)
+        ids_elemento[elemento >= 0] = ids[elemento[elemento >= 0]]
+        columnas[f"dist_{nombre}_m"] = np.round(distancia, 1)
+        columnas[f"id_{nombre}"] = ids_elemento
+        mediana = np.nanmedian(distancia) if np.isfinite(distancia).any() else float('nan')
+        print(f"  ✓ {nombre}: {len(ids):,} elementos | mediana {mediana:,.0f} m")
+    
+    contar('distancias_calculadas', len(x) * len(capas_wkb))
+    return pd.DataFrame(columnas, index=puntos.index)
+
+def unir_distancias(puntos, distancias):
+    """
+    Añade las columnas de calcular_distancias_capas() a los puntos; quedan
+    registradas en puntos.attrs['columnas_distancia']
+    """
+    if distancias is None:
+        return puntos
+    resultado = puntos.join(distancias)
+    resultado.attrs = dict(puntos.attrs, columnas_distancia=list(distancias.columns))
+    return resultado
+
+# ====================================================================
+# ACTUALIZACIÓN INCREMENTAL (CACHÉ DE PUNTOS)
+# ====================================================================
+
+VERSION_CACHE_PUNTOS = 1
+
+def claves_puntos(puntos):
+    """
+    Clave estable de cada punto: COLUMNA_ID_PUNTO o, si no hay, las
+    coordenadas redondeadas a 1e-6° (y el orden de aparición entre puntos
+    con la misma clave)
+    
+    Returns:
+        DataFrame con las columnas clave y ocurrencia, en el orden de los puntos
+    """
+    if COLUMNA_ID_PUNTO and COLUMNA_ID_PUNTO in puntos.columns:
+        clave = puntos[COLUMNA_ID_PUNTO].astype(str).to_numpy()
+    else:
+        lon = np.round(puntos.geometry.x.to_numpy() * 1e6).astype(np.int64) + 180000000
+        lat = np.round(puntos.geometry.y.to_numpy() * 1e6).astype(np.int64) + 90000000
+        clave = (lon << 29) | lat
+    claves = pd.DataFrame({'clave': clave})
+    claves['ocurrencia'] = claves.groupby('clave', sort=False).cumcount()
+    return claves
+
+def huellas_puntos(puntos):
+    """
+    Huella del contenido de cada punto (todos los atributos y la geometría)
+    """
+    import shapely
+    atributos = puntos.drop(columns=puntos.geometry.name)
+    atributos['_geometria_wkb'] = shapely.to_wkb(puntos.geometry.to_numpy())
+    return pd.util.hash_pandas_object(atributos, index=False).to_numpy()
+
+def huella_capas_restrictivas(capas_areas):
+    """
+    Huella de las geometrías de las capas que excluyen puntos y del código
+    del filtro espacial
+    """
+    import hashlib
+    import inspect
+    import shapely
+    huella = hashlib.sha256()
+    for funcion in (filtrar_puntos_fuera_de_areas, filtrar_puntos_incremental):
+        huella.update(inspect.getsource(funcion).encode())
+    for key in CAPAS_RESTRICTIVAS:
+        datos = capas_areas.get(key)
+        if datos is None:
+            continue
+        huella.update(key.encode())
+        for wkb in shapely.to_wkb(datos['geodataframe'].geometry.to_numpy()):
+            huella.update(wkb or b'')
+    return huella.hexdigest()
+
+def huella_parametros_puntos():
+    """
+    Huella de lo que determina los datos de cada punto en preparar_puntos():
+    capitales, turbinas, parámetros de costes y el código que los aplica y
+    combina con la caché
+    """
+    import hashlib
+    import inspect
+    huella = hashlib.sha256(repr((
+        CAPITALES_DEPARTAMENTOS, RECTANGULOS_TURBINAS, EFICIENCIAS_TURBINAS, COSTOS_CAPEX,
+        COMPLEJIDAD_INSTALACION, MULTIPLICADOR_IMPACTO, MULTIPLICADOR_TRANSPORTE, MULTIPLICADOR_REGION,
+        DIFICULTAD_TURBINA, PARAMETROS_COSTES
+    )).encode())
+    for funcion in (preparar_puntos, determinar_tipo_turbina, calcular_costes_detallados,
+                    calcular_distancia_haversine, restaurar_tipos_puntos,
+                    preparar_puntos_incremental, preparar_puntos_con_cache):
+        huella.update(inspect.getsource(funcion).encode())
+    return huella.hexdigest()
+
+@etapa('cache_puntos', "COMPARANDO CON LA EJECUCIÓN ANTERIOR")
+def comparar_con_cache(puntos, capas_areas, ruta=RUTA_CACHE_PUNTOS, ignorar=False):
+    """
+    Compara los puntos con la caché de la ejecución anterior por clave y
+    huella de contenido
+    
+    Args:
+        puntos: GeoDataFrame de puntos recién cargado
+        capas_areas: Capas descargadas (las restrictivas invalidan el filtro espacial)
+        ruta: Archivo de la caché
+        ignorar: True para recalcular todo (la caché se reescribe igualmente)
+    
+    Returns:
+        Diccionario con el estado de la caché para filtrar_puntos_incremental(),
+        preparar_puntos_incremental() y guardar_cache_puntos()
+    """
+    import pickle
+    
+    claves = claves_puntos(puntos)
+    huellas = huellas_puntos(puntos)
+    cache = {
+        'ruta': ruta,
+        'columna_id': COLUMNA_ID_PUNTO,
+        'huella_parametros': huella_parametros_puntos(),
+        'huella_capas': huella_capas_restrictivas(capas_areas),
+        'claves': claves,
+        'huellas': huellas,
+        'excluido': np.zeros(len(puntos), dtype=bool),
+        'puntos': np.full(len(puntos), None, dtype=object),
+        'reutilizar_filtro': np.zeros(len(puntos), dtype=bool)
+    }
+    
+    previa = None
+    if not ignorar and os.path.exists(ruta):
+        try:
+            with open(ruta, 'rb') as f:
+                previa = pickle.load(f)
+        except Exception as e:
+            print(f"⚠️  Caché ilegible ({e}): se recalcula todo")
+        if previa is not None and (previa.get('version') != VERSION_CACHE_PUNTOS or
+                                   previa.get('columna_id') != COLUMNA_ID_PUNTO):
+            previa = None
+    if previa is None:
+        print(f"  Sin caché previa: se calculan los {len(puntos):,} puntos")
+        contar('cache_recalculados', len(puntos))
+        return cache
+    
+    # Fila de cada punto en la caché anterior (-1 si es nuevo)
+    tabla = previa['tabla']
+    posicion = claves.merge(tabla[['clave', 'ocurrencia']].assign(previa=np.arange(len(tabla))),
+                            how='left', on=['clave', 'ocurrencia'])['previa']
+    posicion = posicion.fillna(-1).to_numpy(dtype=np.int64)
+    existe = posicion >= 0
+    iguales = existe.copy()
+    iguales[existe] = tabla['huella'].to_numpy()[posicion[existe]] == huellas[existe]
+    
+    if previa['huella_capas'] == cache['huella_capas']:
+        cache['reutilizar_filtro'] = iguales
+        cache['excluido'][iguales] = tabla['excluido'].to_numpy()[posicion[iguales]]
+    else:
+        print("  Las capas restrictivas cambiaron: se repite el filtro espacial de todos los puntos")
+    if previa['huella_parametros'] == cache['huella_parametros']:
+        cache['puntos'][iguales] = tabla['punto'].to_numpy()[posicion[iguales]]
+    else:
+        print("  Los parámetros de turbinas o costes cambiaron: se recalculan todos los puntos")
+    
+    nuevos = int((~existe).sum())
+    modificados = int((existe & ~iguales).sum())
+    eliminados = len(tabla) - int(existe.sum())
+    print(f"  ✓ {int(iguales.sum()):,} sin cambios | {nuevos:,} nuevos | {modificados:,} modificados | "
+          f"{eliminados:,} eliminados")
+    contar('cache_sin_cambios', int(iguales.sum()))
+    contar('cache_recalculados', nuevos + modificados)
+    return cache
+
+def filtrar_puntos_incremental(puntos, capas_areas, cache=None):
+    """
+    filtrar_puntos_fuera_de_areas() solo para los puntos que no están en la
+    caché; el resto conserva el resultado anterior
+    """
+    if cache is None:
+        return filtrar_puntos_fuera_de_areas(puntos, capas_areas)
+    
+    pendientes = np.flatnonzero(~cache['reutilizar_filtro'])
+    if len(pendientes) > 0:
+        subconjunto = puntos.iloc[pendientes]
+        filtrados = filtrar_puntos_fuera_de_areas(subconjunto, capas_areas)
+        cache['excluido'][pendientes] = ~subconjunto.index.isin(filtrados.index)
+    else:
+        print(f"\n✓ Filtro espacial de la caché: quedan {int((~cache['excluido']).sum()):,} de {len(puntos):,} puntos")
+    
+    excluido = cache['excluido']
+    return puntos[~excluido] if excluido.any() else puntos
+
+def preparar_puntos_incremental(puntos_filtrados, cache=None):
+    """
+    preparar_puntos() solo para los puntos que no están en la caché; los
+    demás se toman de la ejecución anterior (con su id actual)
+    """
+    if cache is None:
+        return preparar_puntos(puntos_filtrados)
+    
+    filas = np.flatnonzero(~cache['excluido'])
+    guardados = cache['puntos']
+    pendientes = [i for i, fila in enumerate(filas) if guardados[fila] is None]
+    nuevos = iter(preparar_puntos(puntos_filtrados.iloc[pendientes]) if pendientes else [])
+    if not pendientes:
+        print("\n✓ Puntos preparados tomados de la caché")
+    
+    puntos_data = []
+    for fila, idx in zip(filas, puntos_filtrados.index):
+        punto = guardados[fila]
+        punto = next(nuevos) if punto is None else dict(punto, id=int(idx))
+        guardados[fila] = punto
+        puntos_data.append(punto)
+    contar('puntos_reutilizados', len(filas) - len(pendientes))
+    return puntos_data
+
+def guardar_cache_puntos(cache):
+    """
+    Escribe la caché de puntos (clave, huella, exclusión y datos preparados)
+    """
+    if cache is None:
+        return
+    import pickle
+    tabla = cache['claves'].assign(huella=cache['huellas'], excluido=cache['excluido'], punto=cache['puntos'])
+    datos = {
+        'version': VERSION_CACHE_PUNTOS,
+        'columna_id': cache['columna_id'],
+        'huella_parametros': cache['huella_parametros'],
+        'huella_capas': cache['huella_capas'],
+        'tabla': tabla
+    }
+    temporal = cache['ruta'] + '.tmp'
+    with open(temporal, 'wb') as f:
+        pickle.dump(datos, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporal, cache['ruta'])
+    print(f"💾 Caché de puntos: {cache['ruta']} ({len(tabla):,} puntos)")
+
+def filtrar_puntos_con_cache(puntos, capas_areas, estado, recalcular=False):
+    """
+    Filtro espacial con la caché de puntos (si USAR_CACHE_PUNTOS); deja la
+    caché en estado['cache'] para preparar_puntos_con_cache()
+    """
+    cache = comparar_con_cache(puntos, capas_areas, ignorar=recalcular) if USAR_CACHE_PUNTOS else None
+    puntos_filtrados = filtrar_puntos_incremental(puntos, capas_areas, cache)
+    guardar_cache_puntos(cache)
+    estado['cache'] = cache
+    return puntos_filtrados
+
+def preparar_puntos_con_cache(puntos_filtrados, estado):
+    """
+    Preparación de los puntos con la caché de puntos que dejó
+    filtrar_puntos_con_cache() (si USAR_CACHE_PUNTOS)
+    """
+    cache = estado.get('cache')
+    puntos_data = preparar_puntos_incremental(puntos_filtrados, cache)
+    guardar_cache_puntos(cache)
+    return puntos_data
+
+def huella_capas_distancia(capas_areas):
+    """
+    Huella de lo que determina las distancias de cada punto: capas de
+    CAPAS_DISTANCIA y BORDES_DISTANCIA, CRS, columnas de id y el código
+    """
+    import hashlib
+    import inspect
+    huella = hashlib.sha256(repr((
+        CAPAS_DISTANCIA, [huella_archivo(r) for r in CAPAS_DISTANCIA.values()],
+        BORDES_DISTANCIA, huella_capas({k: capas_areas.get(k) for k in BORDES_DISTANCIA}),
+        CRS_DISTANCIAS, COLUMNAS_ID_ELEMENTO
+    )).encode())
+    for funcion in (calcular_distancias_capas, capas_para_distancias, distancias_bloque,
+                    calcular_distancias_incremental):
+        huella.update(inspect.getsource(funcion).encode())
+    return huella.hexdigest()[:16]
+
+def calcular_distancias_incremental(puntos, capas_areas, procesos=None, ruta=RUTA_CACHE_DISTANCIAS,
+                                    ignorar=False):
+    """
+    calcular_distancias_capas() solo para los puntos nuevos o movidos; el
+    resto toma sus distancias de la caché (misma clave que la caché de
+    puntos, y la geometría como huella: los cambios de atributos no obligan
+    a recalcular la distancia)
+    
+    Args:
+        puntos: GeoDataFrame de puntos
+        capas_areas: Capas descargadas (para BORDES_DISTANCIA)
+        procesos: Número de procesos (None = todos los núcleos)
+        ruta: Archivo de la caché
+        ignorar: True para recalcular todo (la caché se reescribe igualmente)
+    
+    Returns:
+        Igual que calcular_distancias_capas()
+    """
+    import pickle
+    import shapely
+    
+    if not CAPAS_DISTANCIA and not BORDES_DISTANCIA:
+        return None
+    
+    claves = claves_puntos(puntos)
+    huellas = pd.util.hash_pandas_object(pd.Series(shapely.to_wkb(puntos.geometry.to_numpy())),
+                                         index=False).to_numpy()
+    huella = huella_capas_distancia(capas_areas)
+    
+    previa = None
+    if not ignorar and os.path.exists(ruta):
+        try:
+            with open(ruta, 'rb') as f:
+                previa = pickle.load(f)
+        except Exception as e:
+            print(f"⚠️  Caché de distancias ilegible ({e}): se recalcula todo")
+        if previa is not None and (previa.get('version') != VERSION_CACHE_PUNTOS or
+                                   previa.get('columna_id') != COLUMNA_ID_PUNTO or
+                                   previa.get('huella_capas') != huella):
+            previa = None
+    
+    # Fila de cada punto en la caché anterior (-1 si es nuevo o se movió)
+    posicion = np.full(len(puntos), -1, dtype=np.int64)
+    if previa is not None:
+        tabla = previa['tabla']
+        posicion = claves.merge(tabla[['clave', 'ocurrencia']].assign(previa=np.arange(len(tabla))),
+                                how='left', on=['clave', 'ocurrencia'])['previa']
+        posicion = posicion.fillna(-1).to_numpy(dtype=np.int64, copy=True)
+        existe = posicion >= 0
+        existe[existe] = tabla['huella'].to_numpy()[posicion[existe]] == huellas[existe]
+        posicion[~existe] = -1
+    reutilizar = posicion >= 0
+    pendientes = np.flatnonzero(~reutilizar)
+    print(f"\n📏 Distancias: {int(reutilizar.sum()):,} de la caché | {len(pendientes):,} por calcular")
+    contar('distancias_reutilizadas', int(reutilizar.sum()))
+    
+    nuevas = calcular_distancias_capas(puntos.iloc[pendientes], capas_areas, procesos) if len(pendientes) else None
+    if nuevas is None and not reutilizar.any():
+        return None
+    columnas_previas = [c for c in previa['tabla'].columns if c not in ('clave', 'ocurrencia', 'huella')] \
+        if previa is not None else []
+    distancias = pd.DataFrame(index=puntos.index)
+    for columna in (nuevas.columns if nuevas is not None else columnas_previas):
+        valores = np.full(len(puntos), np.nan if columna.startswith('dist_') else None,
+                          dtype=float if columna.startswith('dist_') else object)
+        if reutilizar.any():
+            valores[reutilizar] = previa['tabla'][columna].to_numpy()[posicion[reutilizar]]
+        if nuevas is not None:
+            valores[pendientes] = nuevas[columna].to_numpy()
+        distancias[columna] = valores
+    
+    datos = {
+        'version': VERSION_CACHE_PUNTOS,
+        'columna_id': COLUMNA_ID_PUNTO,
+        'huella_capas': huella,
+        'tabla': pd.concat([claves.assign(huella=huellas), distancias.reset_index(drop=True)], axis=1)
+    }
+    temporal = ruta + '.tmp'
+    with open(temporal, 'wb') as f:
+        pickle.dump(datos, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporal, ruta)
+    print(f"💾 Caché de distancias: {ruta} ({len(puntos):,} puntos)")
+    return distancias
+
+def calcular_distancias_con_cache(puntos, capas_areas, procesos=None, recalcular=False):
+    """
+    Distancias a las capas con la caché por punto (si USAR_CACHE_PUNTOS)
+    """
+    if USAR_CACHE_PUNTOS:
+        return calcular_distancias_incremental(puntos, capas_areas, procesos, ignorar=recalcular)
+    return calcular_distancias_capas(puntos, capas_areas, procesos)
+
+# ====================================================================
+# TESELAS VECTORIALES DE LAS CAPAS DE ÁREAS
+# ====================================================================
+
+ORIGEN_MERCATOR = 20037508.342789244  # Semiancho del mundo en EPSG:3857 (metros)
+
+def rango_teselas(limites, zoom):
+    """
+    Columnas y filas (esquema XYZ) de las teselas que cubren unos límites EPSG:3857
+    
+    Returns:
+        (x_min, x_max, y_min, y_max), ambos extremos incluidos
+    """
+    lado = 2 * ORIGEN_MERCATOR / 2 ** zoom
+    ultima = 2 ** zoom - 1
+    minx, miny, maxx, maxy = limites
+    x_min = min(max(int((minx + ORIGEN_MERCATOR) // lado), 0), ultima)
+    x_max = min(max(int((maxx + ORIGEN_MERCATOR) // lado), 0), ultima)
+    y_min = min(max(int((ORIGEN_MERCATOR - maxy) // lado), 0), ultima)
+    y_max = min(max(int((ORIGEN_MERCATOR - miny) // lado), 0), ultima)
+    return x_min, x_max, y_min, y_max
+
+def limites_tesela(x, y, zoom):
+    """
+    Límites EPSG:3857 (minx, miny, maxx, maxy) de la tesela XYZ
+    """
+    lado = 2 * ORIGEN_MERCATOR / 2 ** zoom
+    minx = -ORIGEN_MERCATOR + x * lado
+    maxy = ORIGEN_MERCATOR - y * lado
+    return minx, maxy - lado, minx + lado, maxy
+
+def generar_teselas_capa(gdf, nombre_capa, carpeta, zoom_min=ZOOM_TESELAS_MIN, zoom_max=ZOOM_TESELAS_MAX):
+    """
+    Corta una capa de polígonos en teselas Mapbox Vector Tile (carpeta/z/x/y.pbf),
+    simplificada en cada zoom a TOLERANCIA_TESELAS_PX píxeles. Solo se escriben
+    las teselas que tocan alguna geometría
+    
+    Args:
+        gdf: GeoDataFrame de la capa (cualquier CRS)
+        nombre_capa: Nombre de la capa dentro de cada tesela
+        carpeta: Carpeta de la pirámide de esta capa
+    
+    Returns:
+        Número de teselas escritas
+    """
+    import shapely
+    import mapbox_vector_tile
+    
+    geometrias = gdf.geometry.to_crs("EPSG:3857").to_numpy()
+    geometrias = geometrias[~(shapely.is_empty(geometrias) | shapely.is_missing(geometrias))]
+    geometrias = shapely.make_valid(geometrias)
+    escritas = 0
+    
+    for zoom in range(zoom_min, zoom_max + 1):
+        pixel = 2 * ORIGEN_MERCATOR / 2 ** zoom / 256
+        simplificadas = shapely.simplify(geometrias, pixel * TOLERANCIA_TESELAS_PX, preserve_topology=True)
+        # Se descartan las geometrías más pequeñas que un píxel en este zoom
+        limites = shapely.bounds(simplificadas)
+        visibles = ((limites[:, 2] - limites[:, 0]) >= pixel) | ((limites[:, 3] - limites[:, 1]) >= pixel)
+        simplificadas, limites = simplificadas[visibles], limites[visibles]
+        if len(simplificadas) == 0:
+            continue
+        arbol = shapely.STRtree(simplificadas)
+        
+        teselas = set()
+        for limite in limites:
+            x_min, x_max, y_min, y_max = rango_teselas(limite, zoom)
+            teselas.update((x, y) for x in range(x_min, x_max + 1) for y in range(y_min, y_max + 1))
+        
+        borde = pixel * BORDE_TESELAS_PX
+        for x, y in teselas:
+            minx, miny, maxx, maxy = limites_tesela(x, y, zoom)
+            recorte = (minx - borde, miny - borde, maxx + borde, maxy + borde)
+            indices = arbol.query(shapely.box(*recorte), predicate='intersects')
+            if len(indices) == 0:
+                continue
+            recortadas = shapely.clip_by_rect(simplificadas[indices], *recorte)
+            recortadas = recortadas[~shapely.is_empty(recortadas)]
+            if len(recortadas) == 0:
+                continue
+            
+            contenido = mapbox_vector_tile.encode(
+                [{'name': nombre_capa, 'features': [{'geometry': g, 'properties': {}} for g in recortadas]}],
+                default_options={'quantize_bounds': (minx, miny, maxx, maxy), 'extents': 4096}
+            )
+            ruta = os.path.join(carpeta, str(zoom), str(x))
+            os.makedirs(ruta, exist_ok=True)
+            with open(os.path.join(ruta, f"{y}.pbf"), 'wb') as f:
+                f.write(contenido)
+            escritas += 1
+            contar('bytes_teselas', len(contenido))
+    
+    return escritas
+
+@etapa('teselas', "GENERANDO TESELAS VECTORIALES")
+def generar_teselas_capas(capas_areas, carpeta=CARPETA_TESELAS):
+    """
+    Pirámide de teselas vectoriales (ZOOM_TESELAS_MIN a ZOOM_TESELAS_MAX) de
+    cada capa de áreas descargada
+    
+    Returns:
+        Diccionario {clave de capa: plantilla de URL de sus teselas}, o None si
+        mapbox_vector_tile no está instalado
+    """
+    import importlib.util
+    if importlib.util.find_spec('mapbox_vector_tile') is None:
+        print("⚠️  mapbox_vector_tile no está instalado: las capas irán como GeoJSON en el HTML")
+        print("   pip install mapbox-vector-tile\n")
+        return None
+    
+    import shutil
+    import hashlib
+    import shapely
+    
+    urls = {}
+    for key, datos in capas_areas.items():
+        if datos is None:
+            continue
+        carpeta_capa = os.path.join(carpeta, key)
+        ruta_huella = os.path.join(carpeta_capa, "huella.txt")
+        urls[key] = f"{carpeta}/{key}/{{z}}/{{x}}/{{y}}.pbf".replace(os.sep, '/')
+        print(f"  {datos['config']['nombre']}...", end=" ")
+        
+        # Huella de las geometrías y de los parámetros: si no cambian se reutiliza la pirámide
+        huella = hashlib.sha256(repr((ZOOM_TESELAS_MIN, ZOOM_TESELAS_MAX, TOLERANCIA_TESELAS_PX,
+                                      BORDE_TESELAS_PX)).encode())
+        for wkb in shapely.to_wkb(datos['geodataframe'].geometry.to_numpy()):
+            huella.update(wkb or b'')
+        huella = huella.hexdigest()
+        if os.path.exists(ruta_huella):
+            with open(ruta_huella, 'r', encoding='utf-8') as f:
+                if f.read().strip() == huella:
+                    print("✓ sin cambios")
+                    continue
+        
+        if os.path.exists(carpeta_capa):
+            shutil.rmtree(carpeta_capa)
+        escritas = generar_teselas_capa(datos['geodataframe'], key, carpeta_capa)
+        os.makedirs(carpeta_capa, exist_ok=True)
+        with open(ruta_huella, 'w', encoding='utf-8') as f:
+            f.write(huella)
+        print(f"✓ {escritas:,} teselas")
+        contar('teselas_escritas', escritas)
+    
+    print(f"\n📂 Teselas en {carpeta}/ (abrir el mapa por HTTP, p. ej. python -m http.server)")
+    return urls
+
+def capa_teselas_vectoriales(url, key, config):
+    """
+    Capa Leaflet.VectorGrid que carga las teselas de una capa de áreas; se
+    añade como hija de un FeatureGroup para que aparezca en el control de capas
+    """
+    from branca.element import MacroElement
+    from jinja2 import Template
+    
+    estilo = {
+        'fill': True, 'fillColor': config['color'], 'fillOpacity': config['fill_opacity'],
+        'color': config['color'], 'weight': 2, 'opacity': 0.8
+    }
+    capa = MacroElement()
+    capa._name = 'CapaTeselasVectoriales'
+    capa._template = Template("""
+        {% macro script(this, kwargs) %}
+        L.vectorGrid.protobuf({{ this.url|tojson }}, {
+            rendererFactory: L.canvas.tile,
+            vectorTileLayerStyles: { {{ this.key|tojson }}: {{ this.estilo|tojson }} },
+            minNativeZoom: {{ this.zoom_min }},
+            maxNativeZoom: {{ this.zoom_max }},
+            interactive: false
+        }).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+    capa.url, capa.key, capa.estilo = url, key, estilo
+    capa.zoom_min, capa.zoom_max = ZOOM_TESELAS_MIN, ZOOM_TESELAS_MAX
+    return capa
+
+def claves_quadkey(lat, lon, zoom=ZOOM_BLOQUES):
+    """
+    Quadkey (Web Mercator) de cada punto en el nivel de zoom indicado
+    
+    Returns:
+        (claves, x, y): lista de quadkeys y columnas y filas XYZ de las teselas
+    """
+    lat = np.clip(np.asarray(lat, dtype=float), -85.05112878, 85.05112878)
+    n = 2 ** zoom
+    x = np.clip(((np.asarray(lon, dtype=float) + 180) / 360 * n).astype(np.int64), 0, n - 1)
+    y = np.clip(((1 - np.arcsinh(np.tan(np.radians(lat))) / np.pi) / 2 * n).astype(np.int64), 0, n - 1)
+    
+    digitos = np.zeros((len(x), zoom), dtype=np.int64)
+    for i in range(zoom):
+        bit = zoom - 1 - i
+        digitos[:, i] = ((x >> bit) & 1) + 2 * ((y >> bit) & 1)
+    claves = [''.join(map(str, fila)) for fila in digitos.tolist()]
+    return claves, x, y
+
+def agrupar_puntos_en_bloques(puntos_data, zoom=ZOOM_BLOQUES):
+    """
+    Reparte los puntos del mapa en bloques por quadkey
+    
+    Args:
+        puntos_data: Lista de puntos de preparar_puntos()
+    
+    Returns:
+        (bloques, indice): diccionario {quadkey: puntos del bloque, en su
+        orden original} e índice de bloques con sus límites en grados
+    """
+    claves, x, y = claves_quadkey([p['lat'] for p in puntos_data], [p['lon'] for p in puntos_data], zoom)
+    bloques = {}
+    teselas = {}
+    for punto, clave, tx, ty in zip(puntos_data, claves, x.tolist(), y.tolist()):
+        bloques.setdefault(clave, []).append(punto)
+        teselas[clave] = (tx, ty)
+    
+    n = 2 ** zoom
+    indice = []
+    for clave in sorted(bloques):
+        tx, ty = teselas[clave]
+        indice.append({
+            'clave': clave,
+            'oeste': tx / n * 360 - 180,
+            'este': (tx + 1) / n * 360 - 180,
+            'norte': math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n)))),
+            'sur': math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (ty + 1) / n)))),
+            'n': len(bloques[clave])
+        })
+    return bloques, indice
+
+def tabla_filtros_iniciales(puntos_data):
+    """
+    Puntos que pasan los filtros iniciales del mapa (todas las turbinas y
+    regiones, sin CAPEX máximo), con lo que necesitan los agregados
+    precalculados del mapa
+    
+    Args:
+        puntos_data: Lista de puntos de preparar_puntos()
+    
+    Returns:
+        DataFrame con una fila por punto: posición, VSS, potencia máxima,
+        CAPEX/VSS mínimo y la turbina recomendada (menor CAPEX, como el mapa)
+    """
+    recomendadas = [min(p['turbinas'], key=lambda t: t['capex_total']) if p['turbinas'] else None
+                    for p in puntos_data]
+    tabla = pd.DataFrame({
+        'lat': [p['lat'] for p in puntos_data],
+        'lon': [p['lon'] for p in puntos_data],
+        'caudal': [p['caudal'] for p in puntos_data],
+        'pendiente': [p['pendiente'] for p in puntos_data],
+        'vss': [p['vss'] for p in puntos_data],
+        'region': [p['region'] for p in puntos_data],
+        'departamento': [p['departamento'] for p in puntos_data],
+        'municipio': [p['municipio'] for p in puntos_data],
+        'turbinas': [len(p['turbinas']) for p in puntos_data],
+        'potencia': [max((t['potencia_maxima'] for t in p['turbinas']), default=0) for p in puntos_data],
+        'capex_por_vss_min': [min((t['capex_por_vss'] for t in p['turbinas'] if t['capex_por_vss'] > 0),
+                                  default=np.nan) for p in puntos_data],
+        'vss_abastecibles': [t['vss_abastecibles'] if t else 0 for t in recomendadas],
+        'capex_total': [t['capex_total'] if t else 0 for t in recomendadas],
+        'capex_por_vss': [t['capex_por_vss'] if t else 0 for t in recomendadas]
+    })
+    pasa = ((tabla['caudal'] > CAUDAL_MIN_INICIAL) & (tabla['caudal'] < CAUDAL_MAX_INICIAL) &
+            (tabla['pendiente'] > PENDIENTE_MIN_INICIAL) & (tabla['vss'] >= 0) &
+            tabla['region'].isin(list(MULTIPLICADOR_REGION.keys())) & (tabla['turbinas'] > 0))
+    return tabla[pasa]
+
+def calcular_agregados_zoom(tabla, zoom_max=ZOOM_PUNTOS_INDIVIDUALES - 1):
+    """
+    Agregados por celda de TAMAÑO_CELDA_AGREGADOS_PX píxeles para cada zoom
+    de 0 a zoom_max. Cada celda es la unión de 4 celdas del zoom siguiente
+    (quadtree), y el mapa calcula las mismas celdas cuando cambian los filtros
+    
+    Args:
+        tabla: Puntos de tabla_filtros_iniciales()
+    
+    Returns:
+        Diccionario {zoom: [[lat, lon, puntos, vss, potencia_kw, capex_por_vss_min], ...]}
+        (capex_por_vss_min es None si ninguna turbina abastece VSS)
+    """
+    # Celdas en el zoom más fino (misma fórmula que el mapa); las demás por desplazamiento de bits
+    escala = 256 * 2 ** zoom_max / TAMAÑO_CELDA_AGREGADOS_PX
+    seno = np.sin(tabla['lat'].to_numpy() * np.pi / 180)
+    x = np.floor((tabla['lon'].to_numpy() + 180) / 360 * escala).astype(np.int64)
+    y = np.floor((0.5 - np.log((1 + seno) / (1 - seno)) / (4 * np.pi)) * escala).astype(np.int64)
+    
+    agregados = {}
+    for zoom in range(zoom_max + 1):
+        desplazamiento = zoom_max - zoom
+        grupos = tabla.groupby([x >> desplazamiento, y >> desplazamiento], sort=True)
+        celdas = grupos.agg(lat=('lat', 'mean'), lon=('lon', 'mean'), n=('lat', 'size'), vss=('vss', 'sum'),
+                            potencia=('potencia', 'sum'), capex_por_vss=('capex_por_vss_min', 'min'))
+        agregados[zoom] = [
+            [round(c.lat, 5), round(c.lon, 5), int(c.n), round(c.vss, 2), round(c.potencia, 2),
+             None if pd.isna(c.capex_por_vss) else round(c.capex_por_vss, 2)]
+            for c in celdas.itertuples(index=False)
+        ]
+    return agregados
+
+def filas_territorio(agregados):
+    """
+    Agregados de agregar_por_territorio() en el formato compacto del mapa
+    
+    Returns:
+        Diccionario {nivel: [[departamento, municipio, puntos, vss, vss_abastecibles,
+        capex_por_vss_min, capex_por_vss_mediana, capex_total], ...]}
+    """
+    filas = {'departamento': [], 'municipio': []}
+    for a in agregados.itertuples(index=False):
+        filas[a.nivel].append([
+            a.departamento, a.municipio, int(a.puntos), round(a.vss, 2), int(a.vss_abastecibles),
+            None if pd.isna(a.capex_por_vss_min) else round(a.capex_por_vss_min, 2),
+            None if pd.isna(a.capex_por_vss_mediana) else round(a.capex_por_vss_mediana, 2),
+            round(a.capex_total, 2)
+        ])
+    return filas
+
+def javascript_servidor(mapa):
+    """
+    JavaScript del mapa en modo servidor: el HTML no lleva los puntos y pide
+    a /api/puntos los del área visible que pasan los filtros de caudal,
+    pendiente, VSS y región; los que salen de la vista se descartan. Con la
+    priorización activa pide el ranking nacional al servidor, cortado por
+    Top N y presupuesto cuando el ranking del mapa coincide con el del
+    servidor (solo CAPEX/VSS, costes por defecto, sin cartera óptima)
+    """
+    return f'''
+    <script>
+    var LIMITE_PUNTOS_VISIBLES = {LIMITE_PUNTOS_CONSULTA};
+    var temporizadorCargaVisible = null;
+    var consultaVisibleAnterior = null;
+    var actualizarSinCarga = actualizar;
+    
+    actualizar = function() {{
+        actualizarSinCarga();
+        programarCargaVisible();
+    }};
+    
+    // Sustituye los puntos cargados por los de la respuesta (orden original por id);
+    // si son los mismos se conservan para no invalidar las cachés
+    function incorporarPuntos(nuevos) {{
+        nuevos.sort(function(a, b) {{ return a.id - b.id; }});
+        var iguales = nuevos.length === puntos.length && nuevos.every(function(p, i) {{ return p.id === puntos[i].id; }});
+        if (iguales) return;
+        reemplazarPuntos(nuevos);
+        actualizarSinCarga();
+    }}
+    
+    function mostrarAvisoTruncado(datos) {{
+        var aviso = document.getElementById('aviso-truncado');
+        if (!aviso) {{
+            aviso = document.createElement('div');
+            aviso.id = 'aviso-truncado';
+            aviso.style.cssText = 'font-size: 11px; margin-top: 6px;';
+            document.getElementById('count').parentNode.parentNode.appendChild(aviso);
+        }}
+        aviso.style.display = datos.truncado ? 'block' : 'none';
+        aviso.textContent = !datos.truncado ? '' :
+            '⚠️ Cargados ' + formatNumber(datos.devueltos) + ' de ' + formatNumber(datos.total) +
+            (modoPriorizacion ? ' candidatos (los mejores por CAPEX/VSS)' : ' puntos: acerque el mapa para ver el resto');
+    }}
+    
+    // El servidor ordena por CAPEX/VSS con los costes por defecto: solo entonces
+    // puede aplicar él los cortes de Top N y presupuesto
+    function rankingComoServidor(estado) {{
+        return columnasCostes === null && estado.pesos.every(function(peso, i) {{
+            return CRITERIOS_RANKING[i].id === 'capex' ? peso > 0 : peso === 0;
+        }});
+    }}
+    
+    function programarCargaVisible() {{
+        if (temporizadorCargaVisible) {{
+            clearTimeout(temporizadorCargaVisible);
+        }}
+        temporizadorCargaVisible = setTimeout(cargarPuntosVisibles, 200);
+    }}
+    
+    function cargarPuntosVisibles() {{
+        temporizadorCargaVisible = null;
+        var estado = leerEstadoFiltros();
+        var regiones = estado.regionesSeleccionadas.map(function(r) {{ return r === '' ? 'Sin dato' : r; }});
+        var consulta = '/api/puntos?detalle=1&limite=' + LIMITE_PUNTOS_VISIBLES +
+            '&caudal_min=' + estado.cmin + '&caudal_max=' + estado.cmax +
+            '&pendiente_min=' + estado.pmin + '&vss_min=' + estado.vssMin +
+            '&regiones=' + encodeURIComponent(regiones.length ? regiones.join(',') : 'ninguna');
+        if (estado.priorizacion) {{
+            // Ranking nacional (sin bbox), igual que el de todos los bloques en el mapa de un archivo
+            consulta += '&priorizacion=1';
+            if (estado.capexMax !== null && !isNaN(estado.capexMax)) consulta += '&capex_max=' + estado.capexMax;
+            if (rankingComoServidor(estado)) {{
+                if (!isNaN(estado.topN) && estado.topN > 0) consulta += '&top=' + estado.topN;
+                // La cartera óptima elige entre todos los candidatos tras Top N
+                if (!estado.carteraOptima && !isNaN(estado.budgetMax) && estado.budgetMax > 0) {{
+                    consulta += '&presupuesto=' + estado.budgetMax;
+                }}
+            }}
+        }} else {{
+            var limites = map_{mapa._id}.getBounds();
+            consulta += '&bbox=' + [limites.getWest(), limites.getSouth(), limites.getEast(), limites.getNorth()].join(',');
+        }}
+        if (consulta === consultaVisibleAnterior) return;
+        consultaVisibleAnterior = consulta;
+        
+        fetch(consulta)
+            .then(function(respuesta) {{ return respuesta.json(); }})
+            .then(function(datos) {{
+                if (consulta !== consultaVisibleAnterior) return; // Respuesta obsoleta
+                mostrarAvisoTruncado(datos);
+                incorporarPuntos(datos.puntos);
+            }})
+            .catch(function(error) {{
+                consultaVisibleAnterior = null;
+                console.error('Error al cargar puntos:', error);
+            }});
+    }}
+    
+    window.addEventListener('load', function() {{
+        map_{mapa._id}.on('moveend', programarCargaVisible);
+        programarCargaVisible();
+    }});
+    </script>
+    '''
+
+@etapa('construccion_mapa')
+def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original, puntos_data=None, servidor=False):
+    # folium solo se importa al crear el mapa (el análisis sin mapa no lo necesita)
+    import folium
+    from folium import plugins
+    
+    print("Creando mapa interactivo...\n")
+    
+    centro_lat = puntos_filtrados.geometry.y.mean()
+    centro_lon = puntos_filtrados.geometry.x.mean()
+    
+    mapa = folium.Map(location=[centro_lat, centro_lon], zoom_start=6, tiles='cartodbdark_matter')
+    
+    folium.TileLayer('OpenStreetMap', name='Mapa Claro').add_to(mapa)
+    folium.TileLayer('cartodbdark_matter', name='Mapa Oscuro ⚫').add_to(mapa)
+    folium.TileLayer('cartodbpositron', name='Mapa Minimalista').add_to(mapa)
+    
+    # Capas de áreas: teselas vectoriales si es posible (el modo servidor ya se abre por
+    # HTTP), si no GeoJSON completo en el HTML
+    urls_teselas = None
+    if (USAR_TESELAS_VECTORIALES or servidor) and any(datos is not None for datos in capas_areas.values()):
+        urls_teselas = generar_teselas_capas(capas_areas)
+        if urls_teselas:
+            mapa.get_root().header.add_child(folium.Element(
+                '<script src="https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.js"></script>'
+            ))
+    
+    for key, datos in capas_areas.items():
+        if datos is None:
+            continue
+        gdf = datos['geodataframe']
+        config = datos['config']
+        grupo = folium.FeatureGroup(name=config['nombre'], show=True)
+        if urls_teselas and key in urls_teselas:
+            grupo.add_child(capa_teselas_vectoriales(urls_teselas[key], key, config))
+        else:
+            style_function = lambda x, color=config['color'], opacity=config['fill_opacity']: {
+                'fillColor': color, 'fillOpacity': opacity, 'color': color, 'weight': 2, 'opacity': 0.8
+            }
+            folium.GeoJson(gdf, style_function=style_function).add_to(grupo)
+        grupo.add_to(mapa)
+    
+    print(f"Preparando {len(puntos_filtrados):,} puntos...")
+    
+    # Calcular máximos reales y redondear
+    if COLUMNA_VSS in puntos_filtrados.columns:
+        vss_valores = valores_float64(puntos_filtrados, COLUMNA_VSS).dropna()
+        vss_max_real = math.ceil(vss_valores.max()) if len(vss_valores) > 0 else 10
+        vss_min_inicial = 0
+        print(f"  VSS: mín=0, máx={vss_max_real} (redondeado)")
+    else:
+        vss_max_real = 10
+        vss_min_inicial = 0
+    
+    if COLUMNA_DISTANCIA in puntos_filtrados.columns:
+        dist_valores = valores_float64(puntos_filtrados, COLUMNA_DISTANCIA).dropna()
+        dist_max_real = math.ceil(dist_valores.max()) if len(dist_valores) > 0 else 100
+        print(f"  Distancia: máx={dist_max_real} (redondeado)")
+    else:
+        dist_max_real = 100
+    
+    if puntos_data is None:
+        puntos_data = preparar_puntos(puntos_filtrados)
+    
+    # Agregados por celda para los zooms bajos y por territorio (filtros iniciales)
+    agregados_zoom = agregados_territorio = None
+    if puntos_data:
+        tabla_iniciales = tabla_filtros_iniciales(puntos_data)
+        agregados_zoom = calcular_agregados_zoom(tabla_iniciales)
+        agregados_territorio = filas_territorio(agregar_por_territorio(tabla_iniciales))
+    
+    # Puntos en bloques por quadkey (JSON sin evaluar hasta que el bloque entra en la vista)
+    if CARGA_POR_BLOQUES and not servidor:
+        bloques, indice_bloques = agrupar_puntos_en_bloques(puntos_data)
+        puntos_iniciales = []
+        partes = []
+        for clave, lista in bloques.items():
+            contenido = json.dumps(lista).replace('</', '<\\/')
+            partes.append(f'<script type="application/json" id="bloque-{clave}">{contenido}</script>\n')
+        bloques_html = ''.join(partes)
+        print(f"  {len(bloques):,} bloques de puntos (quadkey z{ZOOM_BLOQUES})")
+    else:
+        indice_bloques = None
+        puntos_iniciales = puntos_data
+        bloques_html = ''
+    
+    # Panel de controles
+    controles_html = f'''
+    <div id="control-panel" style="position: fixed; top: 80px; left: 10px; width: 380px; 
+         background: white; z-index: 9999; padding: 18px; border-radius: 10px; 
+         box-shadow: 0 6px 12px rgba(0,0,0,0.4); font-family: 'Segoe UI', Arial, sans-serif; 
+         max-height: 85vh; overflow-y: auto;">
+        
+        <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 20px; border-bottom: 3px solid #E54D9A; padding-bottom: 10px;">
+            <h3 style="margin: 0; color: #5D0E41; font-size: 18px;">
+                🎛️ Filtros Interactivos
+            </h3>
+            <button id="btn-minimizar" onclick="toggleMinimizar()" style="background: #E54D9A; color: white; border: none; border-radius: 50%; width: 30px; height: 30px; cursor: pointer; font-size: 16px; font-weight: bold; display: flex; align-items: center; justify-content: center; box-shadow: 0 2px 4px rgba(0,0,0,0.2);" title="Minimizar/Maximizar">
+                −
+            </button>
+        </div>
+        
+        <div id="panel-contenido">
+        
+        <div style="border: 2px solid #E54D9A; padding: 15px; border-radius: 8px; margin-bottom: 18px; background: #F5F3F0;">
+            <h4 style="margin: 0 0 15px 0; color: #E54D9A; font-size: 15px;">Filtros</h4>
+            
+            <!-- Caudal -->
+            <div style="margin-bottom: 20px; background: white; padding: 12px; border-radius: 6px; border: 1px solid #e0e0e0;">
+                <div style="display: flex; align-items: center; margin-bottom: 8px;">
+                    <span style="font-size: 20px; margin-right: 8px;">💧</span>
+                    <label style="font-weight: 600; font-size: 13px; color: #5D0E41; flex: 1;">Caudal</label>
+                </div>
+                <div style="display: flex; gap: 10px; align-items: center; margin-bottom: 6px;">
+                    <div style="flex: 1;">
+                        <div style="font-size: 11px; color: #8B8B6E; margin-bottom: 3px;">Mínimo</div>
+                        <div style="font-size: 16px; font-weight: bold; color: #E54D9A;">
+                            <span id="cmin">{CAUDAL_MIN_INICIAL}</span>
+                        </div>
+                    </div>
+                    <div style="color: #C0C0B0; font-size: 18px;">-</div>
+                    <div style="flex: 1; text-align: right;">
+                        <div style="font-size: 11px; color: #8B8B6E; margin-bottom: 3px;">Máximo</div>
+                        <div style="font-size: 16px; font-weight: bold; color: #E54D9A;">
+                            <span id="cmax">{CAUDAL_MAX_INICIAL}</span>
+                        </div>
+                    </div>
+                </div>
+                <input type="range" id="caudal-min" min="0" max="1" step="0.01" value="{CAUDAL_MIN_INICIAL}" 
+                       style="width: 100%; margin-bottom: 5px; height: 6px;" oninput="actualizarValores()">
+                <input type="range" id="caudal-max" min="0" max="1" step="0.01" value="{CAUDAL_MAX_INICIAL}" 
+                       style="width: 100%; height: 6px;" oninput="actualizarValores()">
+            </div>
+            
+            <!-- Pendiente -->
+            <div style="margin-bottom: 20px; background: white; padding: 12px; border-radius: 6px; border: 1px solid #e0e0e0;">
+                <div style="display: flex; align-items: center; margin-bottom: 8px;">
+                    <span style="font-size: 20px; margin-right: 8px;">📐</span>
+                    <label style="font-weight: 600; font-size: 13px; color: #5D0E41; flex: 1;">Pendiente Mínima</label>
+                    <span style="font-size: 16px; font-weight: bold; color: #E54D9A;" id="pmin">{PENDIENTE_MIN_INICIAL}</span>
+                </div>
+                <input type="range" id="pend-min" min="0" max="0.5" step="0.01" value="{PENDIENTE_MIN_INICIAL}" 
+                       style="width: 100%; height: 6px;" oninput="actualizarValores()">
+            </div>
+            
+            <!-- VSS MÍNIMO - ICONO 🏠 -->
+            <div style="margin-bottom: 20px; background: white; padding: 12px; border-radius: 6px; border: 1px solid #e0e0e0;">
+                <div style="display: flex; align-items: center; margin-bottom: 8px;">
+                    <span style="font-size: 20px; margin-right: 8px;">🏠</span>
+                    <label style="font-weight: 600; font-size: 13px; color: #5D0E41; flex: 1;">VSS Mínimo</label>
+                    <span style="font-size: 16px; font-weight: bold; color: #FF0066;" id="vss-min-val">{vss_min_inicial}</span>
+                </div>
+                <div style="font-size: 10px; color: #A8A890; margin-bottom: 4px;">
+                    Viviendas Sin Servicio | Rango: 0 - {vss_max_real}
+                </div>
+                <input type="range" id="vss-min" min="0" max="{vss_max_real}" step="1" 
+                       value="{vss_min_inicial}" style="width: 100%; height: 6px;" oninput="actualizarValores()">
+            </div>
         </div>
         
         <!-- TASA DE CAMBIO -->
@@ -851,6 +2353,25 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
             <div style="font-size: 36px; font-weight: bold;">
                 <span id="count">0</span>
             </div>
+            <div id="ambito-count" style="font-size: 11px; margin-top: 4px; opacity: 0.85;"></div>
+        </div>
+        
+        <!-- RESUMEN POR TERRITORIO -->
+        <div style="margin-bottom: 18px; border: 2px solid #5D0E41; padding: 12px; border-radius: 8px; background: #FFF5F8;">
+            <div style="display: flex; align-items: center; justify-content: space-between; margin-bottom: 8px;">
+                <label style="font-weight: 600; font-size: 13px; color: #5D0E41;">
+                    <span style="font-size: 18px; margin-right: 6px;">🗺️</span>Resumen por territorio
+                </label>
+                <select id="nivel-territorio" onchange="mostrarTerritorio()" 
+                        style="font-size: 11px; padding: 3px; border: 1px solid #E54D9A; border-radius: 4px;">
+                    <option value="departamento" selected>Departamentos</option>
+                    <option value="municipio">Municipios</option>
+                </select>
+            </div>
+            <div id="tabla-territorio" style="max-height: 260px; overflow: auto; background: white; border-radius: 6px; font-size: 10px;"></div>
+            <div style="font-size: 10px; color: #5D5D4D; margin-top: 4px; font-style: italic;">
+                Color según la mediana de CAPEX/VSS (verde: menor, rojo: mayor)
+            </div>
         </div>
         
         <!-- FILTRO DE TURBINAS -->
@@ -985,6 +2506,15 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                        style="width: 100%; padding: 6px; border: 2px solid #f093fb; border-radius: 4px; font-size: 12px;"
                        oninput="aplicarFiltrosPriorizacion()">
                 <div style="font-size: 9px; color: #CC0052; margin-top: 2px;">Suma CAPEX desde ranking #1</div>
+                <div style="display: flex; align-items: center; justify-content: space-between; margin-top: 6px;">
+                    <label for="budget-optimo" style="font-weight: 600; font-size: 11px; color: #555; cursor: pointer;">
+                        🧮 Cartera óptima (máx. VSS)
+                    </label>
+                    <input type="checkbox" id="budget-optimo" 
+                           style="width: 16px; height: 16px; cursor: pointer;"
+                           onchange="aplicarFiltrosPriorizacion()">
+                </div>
+                <div id="comparativa-cartera" style="display: none; margin-top: 6px; padding: 6px; background: white; border: 1px solid #f093fb; border-radius: 4px; font-size: 10px;"></div>
             </div>
             
             <!-- Ranking por colores -->
@@ -1003,6 +2533,32 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                     </div>
                 </div>
             </div>
+            
+            <!-- Pesos del ranking multicriterio -->
+            <div style="margin-top: 10px;">
+                <div style="font-weight: 600; font-size: 11px; color: #555; margin-bottom: 4px;">⚖️ Pesos del ranking</div>
+                <div style="display: grid; grid-template-columns: 1fr 60px; gap: 3px 6px; align-items: center; font-size: 10px;">
+                    <label for="peso-capex">CAPEX/VSS (menor)</label>
+                    <input type="number" id="peso-capex" value="1" min="0" step="0.1" style="padding: 3px; border: 1px solid #f093fb; border-radius: 3px; font-size: 10px;" oninput="aplicarFiltrosPriorizacion()">
+                    <label for="peso-distancia">Distancia capital (menor)</label>
+                    <input type="number" id="peso-distancia" value="0" min="0" step="0.1" style="padding: 3px; border: 1px solid #f093fb; border-radius: 3px; font-size: 10px;" oninput="aplicarFiltrosPriorizacion()">
+                    <label for="peso-vss">VSS (mayor)</label>
+                    <input type="number" id="peso-vss" value="0" min="0" step="0.1" style="padding: 3px; border: 1px solid #f093fb; border-radius: 3px; font-size: 10px;" oninput="aplicarFiltrosPriorizacion()">
+                    <label for="peso-potencia">Potencia máxima (mayor)</label>
+                    <input type="number" id="peso-potencia" value="0" min="0" step="0.1" style="padding: 3px; border: 1px solid #f093fb; border-radius: 3px; font-size: 10px;" oninput="aplicarFiltrosPriorizacion()">
+                    <label for="peso-hibrida">Híbrida (evitar)</label>
+                    <input type="number" id="peso-hibrida" value="0" min="0" step="0.1" style="padding: 3px; border: 1px solid #f093fb; border-radius: 3px; font-size: 10px;" oninput="aplicarFiltrosPriorizacion()">
+                </div>
+                <div style="display: flex; align-items: center; justify-content: space-between; margin-top: 6px;">
+                    <label for="pareto-resaltar" style="font-weight: 600; font-size: 11px; color: #555; cursor: pointer;">
+                        🥇 Resaltar frente de Pareto
+                    </label>
+                    <input type="checkbox" id="pareto-resaltar" 
+                           style="width: 16px; height: 16px; cursor: pointer;"
+                           onchange="aplicarFiltrosPriorizacion()">
+                </div>
+                <div id="resumen-pareto" style="font-size: 9px; color: #CC0052; margin-top: 2px;"></div>
+            </div>
         </div>
         
         <button onclick="despriorizar()" id="btn-despriorizar" style="width: 100%; padding: 10px; background: #5D5D4D; 
@@ -1026,6 +2582,14 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
             📥 Descargar datos visibles
         </button>
         
+        <!-- Progreso de la exportación CSV -->
+        <div id="progreso-csv" style="display: none; margin-top: 6px;">
+            <div style="height: 8px; background: #F5E8F0; border-radius: 4px; overflow: hidden;">
+                <div id="progreso-csv-barra" style="height: 100%; width: 0%; background: #E54D9A; transition: width 0.2s;"></div>
+            </div>
+            <div id="progreso-csv-texto" style="font-size: 10px; color: #5D0E41; margin-top: 2px;"></div>
+        </div>
+        
         <button onclick="toggleParametrizacion()" style="width: 100%; padding: 12px; margin-top: 8px; background: linear-gradient(135deg, #2C3E50 0%, #3498DB 100%); 
                 color: white; border: none; border-radius: 6px; cursor: pointer; font-weight: bold; 
                 font-size: 14px; box-shadow: 0 3px 6px rgba(52,152,219,0.4); transition: all 0.3s;"
@@ -1047,31 +2611,31 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                 <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 6px; font-size: 11px;">
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Francis:</span>
-                        <input type="number" id="param-ef-francis" value="0.92" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-ef-francis" value="0.92" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>PAT:</span>
-                        <input type="number" id="param-ef-pat" value="0.86" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-ef-pat" value="0.86" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Pelton:</span>
-                        <input type="number" id="param-ef-pelton" value="0.90" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-ef-pelton" value="0.90" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Kaplan:</span>
-                        <input type="number" id="param-ef-kaplan" value="0.89" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-ef-kaplan" value="0.89" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Low Head:</span>
-                        <input type="number" id="param-ef-lowhead" value="0.89" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-ef-lowhead" value="0.89" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Turgo:</span>
-                        <input type="number" id="param-ef-turgo" value="0.87" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-ef-turgo" value="0.87" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Cross Flow:</span>
-                        <input type="number" id="param-ef-crossflow" value="0.70" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-ef-crossflow" value="0.70" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                 </div>
             </div>
@@ -1084,31 +2648,31 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                 <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 6px; font-size: 11px;">
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Francis:</span>
-                        <input type="number" id="param-capex-francis" value="595" step="1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-capex-francis" value="595" step="1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>PAT:</span>
-                        <input type="number" id="param-capex-pat" value="100" step="1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-capex-pat" value="100" step="1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Pelton:</span>
-                        <input type="number" id="param-capex-pelton" value="300" step="1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-capex-pelton" value="300" step="1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Kaplan:</span>
-                        <input type="number" id="param-capex-kaplan" value="425" step="1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-capex-kaplan" value="425" step="1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Low Head:</span>
-                        <input type="number" id="param-capex-lowhead" value="425" step="1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-capex-lowhead" value="425" step="1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Turgo:</span>
-                        <input type="number" id="param-capex-turgo" value="295" step="1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-capex-turgo" value="295" step="1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Cross Flow:</span>
-                        <input type="number" id="param-capex-crossflow" value="200" step="1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-capex-crossflow" value="200" step="1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                 </div>
             </div>
@@ -1121,31 +2685,31 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                 <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 6px; font-size: 11px;">
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Francis:</span>
-                        <input type="number" id="param-inst-francis" value="0.20" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-inst-francis" value="0.20" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>PAT:</span>
-                        <input type="number" id="param-inst-pat" value="0.10" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-inst-pat" value="0.10" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Pelton:</span>
-                        <input type="number" id="param-inst-pelton" value="0.20" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-inst-pelton" value="0.20" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Kaplan:</span>
-                        <input type="number" id="param-inst-kaplan" value="0.20" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-inst-kaplan" value="0.20" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Low Head:</span>
-                        <input type="number" id="param-inst-lowhead" value="0.20" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-inst-lowhead" value="0.20" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Turgo:</span>
-                        <input type="number" id="param-inst-turgo" value="0.20" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-inst-turgo" value="0.20" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Cross Flow:</span>
-                        <input type="number" id="param-inst-crossflow" value="0.15" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-inst-crossflow" value="0.15" step="0.01" min="0" max="1" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                 </div>
             </div>
@@ -1158,31 +2722,31 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                 <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 6px; font-size: 11px;">
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Francis:</span>
-                        <input type="number" id="param-imp-francis" value="1.3" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-imp-francis" value="1.3" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>PAT:</span>
-                        <input type="number" id="param-imp-pat" value="0.8" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-imp-pat" value="0.8" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Pelton:</span>
-                        <input type="number" id="param-imp-pelton" value="1.3" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-imp-pelton" value="1.3" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Kaplan:</span>
-                        <input type="number" id="param-imp-kaplan" value="1.3" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-imp-kaplan" value="1.3" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Low Head:</span>
-                        <input type="number" id="param-imp-lowhead" value="1.3" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-imp-lowhead" value="1.3" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Turgo:</span>
-                        <input type="number" id="param-imp-turgo" value="1.0" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-imp-turgo" value="1.0" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Cross Flow:</span>
-                        <input type="number" id="param-imp-crossflow" value="0.8" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-imp-crossflow" value="0.8" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                 </div>
             </div>
@@ -1195,31 +2759,31 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                 <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 6px; font-size: 11px;">
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Francis:</span>
-                        <input type="number" id="param-trans-francis" value="5.0" step="0.5" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-trans-francis" value="5.0" step="0.5" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>PAT:</span>
-                        <input type="number" id="param-trans-pat" value="2.0" step="0.5" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-trans-pat" value="2.0" step="0.5" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Pelton:</span>
-                        <input type="number" id="param-trans-pelton" value="2.0" step="0.5" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-trans-pelton" value="2.0" step="0.5" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Kaplan:</span>
-                        <input type="number" id="param-trans-kaplan" value="5.0" step="0.5" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-trans-kaplan" value="5.0" step="0.5" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Low Head:</span>
-                        <input type="number" id="param-trans-lowhead" value="5.0" step="0.5" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-trans-lowhead" value="5.0" step="0.5" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Turgo:</span>
-                        <input type="number" id="param-trans-turgo" value="5.0" step="0.5" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-trans-turgo" value="5.0" step="0.5" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Cross Flow:</span>
-                        <input type="number" id="param-trans-crossflow" value="3.5" step="0.5" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-trans-crossflow" value="3.5" step="0.5" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                 </div>
             </div>
@@ -1232,31 +2796,31 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                 <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 6px; font-size: 11px;">
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Francis:</span>
-                        <input type="number" id="param-dif-francis" value="3" step="1" min="1" max="3" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-dif-francis" value="3" step="1" min="1" max="3" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>PAT:</span>
-                        <input type="number" id="param-dif-pat" value="1" step="1" min="1" max="3" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-dif-pat" value="1" step="1" min="1" max="3" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Pelton:</span>
-                        <input type="number" id="param-dif-pelton" value="1" step="1" min="1" max="3" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-dif-pelton" value="1" step="1" min="1" max="3" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Kaplan:</span>
-                        <input type="number" id="param-dif-kaplan" value="3" step="1" min="1" max="3" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-dif-kaplan" value="3" step="1" min="1" max="3" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Low Head:</span>
-                        <input type="number" id="param-dif-lowhead" value="3" step="1" min="1" max="3" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-dif-lowhead" value="3" step="1" min="1" max="3" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Turgo:</span>
-                        <input type="number" id="param-dif-turgo" value="3" step="1" min="1" max="3" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-dif-turgo" value="3" step="1" min="1" max="3" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Cross Flow:</span>
-                        <input type="number" id="param-dif-crossflow" value="2" step="1" min="1" max="3" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-dif-crossflow" value="2" step="1" min="1" max="3" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                 </div>
             </div>
@@ -1269,31 +2833,31 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                 <div style="display: grid; grid-template-columns: 1fr; gap: 6px; font-size: 11px;">
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Pacífico:</span>
-                        <input type="number" id="param-reg-pacifico" value="1.6" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-reg-pacifico" value="1.6" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Eje Cafetero – Antioquia:</span>
-                        <input type="number" id="param-reg-eje" value="1.4" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-reg-eje" value="1.4" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Centro Sur:</span>
-                        <input type="number" id="param-reg-centrosur" value="1.3" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-reg-centrosur" value="1.3" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Centro Oriente:</span>
-                        <input type="number" id="param-reg-centrooriente" value="1.2" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-reg-centrooriente" value="1.2" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Caribe:</span>
-                        <input type="number" id="param-reg-caribe" value="1.0" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-reg-caribe" value="1.0" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Llano:</span>
-                        <input type="number" id="param-reg-llano" value="1.0" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-reg-llano" value="1.0" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; justify-content: space-between; align-items: center; background: white; padding: 4px 8px; border-radius: 4px;">
                         <span>Sin dato:</span>
-                        <input type="number" id="param-reg-sindato" value="1.2" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-reg-sindato" value="1.2" step="0.1" min="0" style="width: 60px; padding: 2px; border: 1px solid #ccc; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                 </div>
             </div>
@@ -1311,7 +2875,7 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                     </div>
                     <div style="display: flex; align-items: center; gap: 8px;">
                         <span style="font-size: 11px;">Coef. equipos:</span>
-                        <input type="number" id="param-form-coef-equipos" value="0.8" step="0.05" min="0" max="2" style="width: 70px; padding: 3px; border: 1px solid #E67E22; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-form-coef-equipos" value="0.8" step="0.05" min="0" max="2" style="width: 70px; padding: 3px; border: 1px solid #E67E22; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                 </div>
                 
@@ -1322,7 +2886,7 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                     </div>
                     <div style="display: flex; align-items: center; gap: 8px;">
                         <span style="font-size: 11px;">Cbase (USD/kW):</span>
-                        <input type="number" id="param-form-cbase-obra" value="2200" step="100" min="0" style="width: 70px; padding: 3px; border: 1px solid #E67E22; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-form-cbase-obra" value="2200" step="100" min="0" style="width: 70px; padding: 3px; border: 1px solid #E67E22; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                     </div>
                 </div>
                 
@@ -1334,16 +2898,16 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                     <div style="font-size: 9px; color: #888; margin-bottom: 4px;">Si potencia &lt; 50 kW:</div>
                     <div style="display: flex; align-items: center; gap: 6px; margin-bottom: 4px;">
                         <span style="font-size: 10px;">Cbase:</span>
-                        <input type="number" id="param-form-cbase-linea-baja" value="15000" step="1000" min="0" style="width: 65px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;">
+                        <input type="number" id="param-form-cbase-linea-baja" value="15000" step="1000" min="0" style="width: 65px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;" oninput="reparametrizarEnVivo()">
                         <span style="font-size: 10px;">F:</span>
-                        <input type="number" id="param-form-f-linea-baja" value="400" step="50" min="0" style="width: 55px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;">
+                        <input type="number" id="param-form-f-linea-baja" value="400" step="50" min="0" style="width: 55px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="font-size: 9px; color: #888; margin-bottom: 4px;">Si potencia ≥ 50 kW:</div>
                     <div style="display: flex; align-items: center; gap: 6px;">
                         <span style="font-size: 10px;">Cbase:</span>
-                        <input type="number" id="param-form-cbase-linea-alta" value="20000" step="1000" min="0" style="width: 65px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;">
+                        <input type="number" id="param-form-cbase-linea-alta" value="20000" step="1000" min="0" style="width: 65px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;" oninput="reparametrizarEnVivo()">
                         <span style="font-size: 10px;">F:</span>
-                        <input type="number" id="param-form-f-linea-alta" value="500" step="50" min="0" style="width: 55px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;">
+                        <input type="number" id="param-form-f-linea-alta" value="500" step="50" min="0" style="width: 55px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;" oninput="reparametrizarEnVivo()">
                     </div>
                 </div>
                 
@@ -1354,9 +2918,9 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                     </div>
                     <div style="display: flex; align-items: center; gap: 6px;">
                         <span style="font-size: 10px;">Base:</span>
-                        <input type="number" id="param-form-base-ambiental" value="8000" step="500" min="0" style="width: 60px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;">
+                        <input type="number" id="param-form-base-ambiental" value="8000" step="500" min="0" style="width: 60px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;" oninput="reparametrizarEnVivo()">
                         <span style="font-size: 10px;">Coef/kW:</span>
-                        <input type="number" id="param-form-coef-ambiental" value="100" step="10" min="0" style="width: 55px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;">
+                        <input type="number" id="param-form-coef-ambiental" value="100" step="10" min="0" style="width: 55px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;" oninput="reparametrizarEnVivo()">
                     </div>
                 </div>
                 
@@ -1368,25 +2932,25 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                     <div style="display: flex; flex-wrap: wrap; gap: 6px; margin-bottom: 6px;">
                         <div style="display: flex; align-items: center; gap: 4px;">
                             <span style="font-size: 10px;">Factor topo:</span>
-                            <input type="number" id="param-form-factor-topo" value="1.8" step="0.1" min="1" style="width: 50px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;">
+                            <input type="number" id="param-form-factor-topo" value="1.8" step="0.1" min="1" style="width: 50px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;" oninput="reparametrizarEnVivo()">
                         </div>
                         <div style="display: flex; align-items: center; gap: 4px;">
                             <span style="font-size: 10px;">Coef base:</span>
-                            <input type="number" id="param-form-coef-transp-base" value="8.0" step="0.5" min="0" style="width: 50px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;">
+                            <input type="number" id="param-form-coef-transp-base" value="8.0" step="0.5" min="0" style="width: 50px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;" oninput="reparametrizarEnVivo()">
                         </div>
                     </div>
                     <div style="font-size: 9px; color: #888; margin-bottom: 2px;">Peso (ton) = kW × coef:</div>
                     <div style="display: flex; align-items: center; gap: 6px; margin-bottom: 4px;">
                         <span style="font-size: 10px;">&lt;50kW:</span>
-                        <input type="number" id="param-form-peso-bajo" value="0.150" step="0.01" min="0" style="width: 55px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;">
+                        <input type="number" id="param-form-peso-bajo" value="0.150" step="0.01" min="0" style="width: 55px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;" oninput="reparametrizarEnVivo()">
                         <span style="font-size: 10px;">≥50kW:</span>
-                        <input type="number" id="param-form-peso-alto" value="0.120" step="0.01" min="0" style="width: 55px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;">
+                        <input type="number" id="param-form-peso-alto" value="0.120" step="0.01" min="0" style="width: 55px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;" oninput="reparametrizarEnVivo()">
                     </div>
                     <div style="display: flex; align-items: center; gap: 6px;">
                         <span style="font-size: 10px;">Movilización:</span>
-                        <input type="number" id="param-form-coef-movil" value="3000" step="500" min="0" style="width: 55px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;">
+                        <input type="number" id="param-form-coef-movil" value="3000" step="500" min="0" style="width: 55px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;" oninput="reparametrizarEnVivo()">
                         <span style="font-size: 10px;">Logística:</span>
-                        <input type="number" id="param-form-coef-logist" value="100" step="10" min="0" style="width: 50px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;">
+                        <input type="number" id="param-form-coef-logist" value="100" step="10" min="0" style="width: 50px; padding: 2px; border: 1px solid #E67E22; border-radius: 3px; text-align: center; font-size: 10px;" oninput="reparametrizarEnVivo()">
                     </div>
                 </div>
                 
@@ -1397,7 +2961,7 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                     </div>
                     <div style="display: flex; align-items: center; gap: 8px;">
                         <span style="font-size: 11px;">Coef. otros (%):</span>
-                        <input type="number" id="param-form-coef-otros" value="0.05" step="0.01" min="0" max="1" style="width: 70px; padding: 3px; border: 1px solid #E67E22; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-form-coef-otros" value="0.05" step="0.01" min="0" max="1" style="width: 70px; padding: 3px; border: 1px solid #E67E22; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                         <span style="font-size: 10px; color: #888;">(5%)</span>
                     </div>
                 </div>
@@ -1409,7 +2973,7 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                     </div>
                     <div style="display: flex; align-items: center; gap: 8px;">
                         <span style="font-size: 11px;">Coef. OPEX (%):</span>
-                        <input type="number" id="param-form-coef-opex" value="0.03" step="0.01" min="0" max="1" style="width: 70px; padding: 3px; border: 1px solid #E67E22; border-radius: 3px; text-align: center;">
+                        <input type="number" id="param-form-coef-opex" value="0.03" step="0.01" min="0" max="1" style="width: 70px; padding: 3px; border: 1px solid #E67E22; border-radius: 3px; text-align: center;" oninput="reparametrizarEnVivo()">
                         <span style="font-size: 10px; color: #888;">(3%)</span>
                     </div>
                 </div>
@@ -1623,11 +3187,356 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
     # JavaScript
     javascript = f'''
     <script>
-    var puntos = {json.dumps(puntos_data)};
+    var puntos = {json.dumps(puntos_iniciales)};
     var puntosOriginal = JSON.parse(JSON.stringify(puntos)); // Copia de seguridad de datos originales
     var layer = null;
     var modoPriorizacion = false;
-    var rankingPuntos = [];
+    
+    // Índice denso id -> fila de `puntos`, construido una vez al cargar.
+    // Ranking y frente de Pareto se guardan en arrays tipados alineados con
+    // las filas (0 = sin ranking / fuera del frente), no indexados por id.
+    var indicePuntos = construirIndicePuntos(puntos);
+    var rankingPuntos = new Int32Array(puntos.length);
+    var paretoPuntos = new Uint8Array(puntos.length);
+    
+    function construirIndicePuntos(lista) {{
+        var indice = new Map();
+        for (var i = 0; i < lista.length; i++) {{
+            indice.set(lista[i].id, i);
+        }}
+        return indice;
+    }}
+    
+    function filaDePunto(id) {{
+        var fila = indicePuntos.get(id);
+        return fila === undefined ? -1 : fila;
+    }}
+    
+    function obtenerPunto(id) {{
+        var fila = indicePuntos.get(id);
+        return fila === undefined ? null : puntos[fila];
+    }}
+    
+    // Posición en el ranking actual (null si el punto no está priorizado)
+    function rankingDePunto(id) {{
+        var fila = indicePuntos.get(id);
+        return fila === undefined || rankingPuntos[fila] === 0 ? null : rankingPuntos[fila];
+    }}
+    
+    function esPuntoPareto(id) {{
+        var fila = indicePuntos.get(id);
+        return fila !== undefined && paretoPuntos[fila] === 1;
+    }}
+    
+    // Sustituye la lista de puntos cargados (bloques visibles o servidor) y
+    // reconstruye los índices y cachés que dependen de ella
+    function reemplazarPuntos(lista) {{
+        var reparametrizado = columnasCostes !== null;
+        puntos = lista;
+        indicePuntos = construirIndicePuntos(puntos);
+        rankingPuntos = new Int32Array(puntos.length);
+        paretoPuntos = new Uint8Array(puntos.length);
+        columnasCostes = null;
+        cacheRanking = null;
+        cacheResultado = null;
+        cacheCurva = null;
+        carteraOptima = null;
+        // Los puntos recién leídos traen los costes por defecto
+        if (reparametrizado) {{
+            recalcularCostes();
+        }} else {{
+            versionCostes++;
+        }}
+    }}
+    
+    // Bloques de puntos por quadkey (null si los puntos van todos en `puntos`).
+    // Solo se leen los bloques que tocan la vista más un margen; los que
+    // salen de ella se descartan. La priorización necesita el ranking
+    // nacional y carga todos los bloques mientras está activa.
+    var BLOQUES_PUNTOS = {json.dumps(indice_bloques)};
+    var MARGEN_BLOQUES = {MARGEN_BLOQUES};
+    var bloquesCargados = {{}};
+    var todosLosBloques = false;
+    
+    function bloquesEnVista() {{
+        var vista = map_{mapa._id}.getBounds().pad(MARGEN_BLOQUES);
+        var oeste = vista.getWest(), este = vista.getEast(), sur = vista.getSouth(), norte = vista.getNorth();
+        return BLOQUES_PUNTOS.filter(function(b) {{
+            return b.este >= oeste && b.oeste <= este && b.norte >= sur && b.sur <= norte;
+        }});
+    }}
+    
+    // Carga los bloques necesarios y descarta el resto; devuelve true si cambió la lista de puntos.
+    // Con los agregados precalculados a la vista no hace falta ningún bloque (salvo forzarVista)
+    function sincronizarBloques(forzarVista) {{
+        if (!BLOQUES_PUNTOS) return false;
+        var necesarios = todosLosBloques ? BLOQUES_PUNTOS :
+            (!forzarVista && agregadosPrecalculadosVigentes(leerEstadoFiltros())) ? [] : bloquesEnVista();
+        var nuevos = {{}};
+        var cambio = false;
+        necesarios.forEach(function(b) {{
+            if (bloquesCargados[b.clave]) {{
+                nuevos[b.clave] = bloquesCargados[b.clave];
+            }} else {{
+                nuevos[b.clave] = JSON.parse(document.getElementById('bloque-' + b.clave).textContent);
+                cambio = true;
+            }}
+        }});
+        Object.keys(bloquesCargados).forEach(function(clave) {{
+            if (!nuevos[clave]) cambio = true;
+        }});
+        if (!cambio) return false;
+        
+        bloquesCargados = nuevos;
+        var lista = [];
+        Object.keys(nuevos).forEach(function(clave) {{
+            Array.prototype.push.apply(lista, nuevos[clave]);
+        }});
+        // Orden original de los puntos (los empates del ranking se resuelven por él)
+        lista.sort(function(a, b) {{ return a.id - b.id; }});
+        reemplazarPuntos(lista);
+        return true;
+    }}
+    
+    // Con bloques solo de la vista, el conteo y el resumen por territorio no son
+    // nacionales: se indica bajo el conteo (la descarga CSV carga todos los bloques)
+    function mostrarAmbitoConteo(estado) {{
+        var parcial = BLOQUES_PUNTOS !== null && Object.keys(bloquesCargados).length < BLOQUES_PUNTOS.length &&
+                      !agregadosPrecalculadosVigentes(estado);
+        document.getElementById('ambito-count').textContent = parcial ? 'en la zona cargada del mapa' : '';
+    }}
+    
+    // Agregados por celda (quadtree de TAMAÑO_CELDA_AGREGADOS píxeles) por debajo de
+    // ZOOM_PUNTOS_INDIVIDUALES: precalculados en Python para los filtros iniciales y
+    // calculados aquí con los puntos cargados si cambian los filtros o los costes
+    var AGREGADOS_ZOOM = {json.dumps(agregados_zoom)};
+    var ZOOM_PUNTOS_INDIVIDUALES = {ZOOM_PUNTOS_INDIVIDUALES};
+    var TAMAÑO_CELDA_AGREGADOS = {TAMAÑO_CELDA_AGREGADOS_PX};
+    var claveFiltrosIniciales = null;
+    var zoomAnterior = null;
+    
+    function claveFiltros(estado) {{
+        return JSON.stringify([estado.cmin, estado.cmax, estado.pmin, estado.vssMin,
+                               estado.turbinasSeleccionadas, estado.regionesSeleccionadas, estado.capexMax]);
+    }}
+    
+    function vistaAgregada() {{
+        return !modoPriorizacion && map_{mapa._id}.getZoom() < ZOOM_PUNTOS_INDIVIDUALES;
+    }}
+    
+    function agregadosPrecalculadosVigentes(estado) {{
+        return AGREGADOS_ZOOM !== null && vistaAgregada() && columnasCostes === null &&
+               claveFiltros(estado) === claveFiltrosIniciales;
+    }}
+    
+    function agregarPorCelda(visibles, zoom) {{
+        var escala = 256 * Math.pow(2, zoom) / TAMAÑO_CELDA_AGREGADOS;
+        var celdas = new Map();
+        visibles.forEach(function(v) {{
+            var p = v.punto;
+            var seno = Math.sin(p.lat * Math.PI / 180);
+            var clave = Math.floor((p.lon + 180) / 360 * escala) + ':' +
+                        Math.floor((0.5 - Math.log((1 + seno) / (1 - seno)) / (4 * Math.PI)) * escala);
+            var c = celdas.get(clave);
+            if (!c) {{
+                c = [0, 0, 0, 0, 0, Infinity];
+                celdas.set(clave, c);
+            }}
+            var potencia = 0;
+            p.turbinas.forEach(function(t) {{
+                potencia = Math.max(potencia, t.potencia_maxima);
+                if (t.capex_por_vss > 0) c[5] = Math.min(c[5], t.capex_por_vss);
+            }});
+            c[0] += p.lat;
+            c[1] += p.lon;
+            c[2]++;
+            c[3] += p.vss;
+            c[4] += potencia;
+        }});
+        var agregados = [];
+        celdas.forEach(function(c) {{
+            agregados.push([c[0] / c[2], c[1] / c[2], c[2], c[3], c[4], c[5] === Infinity ? null : c[5]]);
+        }});
+        return agregados;
+    }}
+    
+    // Un círculo por celda (tamaño según número de puntos); devuelve los puntos representados
+    function mostrarAgregados(agregados, capa) {{
+        var maximo = 1;
+        agregados.forEach(function(a) {{ maximo = Math.max(maximo, a[2]); }});
+        var total = 0;
+        agregados.forEach(function(a) {{
+            total += a[2];
+            var texto = '<b>' + formatNumber(a[2]) + ' puntos</b>' +
+                '<br>🏠 VSS: ' + formatNumber(Math.round(a[3])) +
+                '<br>⚡ Potencia máx.: ' + formatNumber(Math.round(a[4])) + ' kW' +
+                '<br>💰 CAPEX/VSS mín.: ' + (a[5] === null ? 'N/A' : '$' + formatNumber(Math.round(a[5])));
+            L.circleMarker([a[0], a[1]], {{
+                radius: 5 + 15 * Math.sqrt(a[2] / maximo),
+                color: '#0D47A1',
+                fillColor: '#1E88E5',
+                weight: 1,
+                opacity: 0.9,
+                fillOpacity: 0.6
+            }}).bindTooltip(texto).on('click', function() {{
+                var mapa = map_{mapa._id};
+                mapa.setView([a[0], a[1]], Math.min(mapa.getZoom() + 2, ZOOM_PUNTOS_INDIVIDUALES));
+            }}).addTo(capa);
+        }});
+        return total;
+    }}
+    
+    // Resumen por departamento y municipio de los puntos visibles. Los totales se
+    // actualizan sumando y restando solo los puntos que entran o salen del resultado;
+    // el mínimo y la mediana de CAPEX/VSS se recalculan solo en los territorios tocados
+    var AGREGADOS_TERRITORIO = {json.dumps(agregados_territorio)};
+    var FILAS_PANEL_TERRITORIO = {FILAS_PANEL_TERRITORIO};
+    var territorio = null;
+    var territorioPrecalculado = false;
+    
+    // Grupos de cada punto (con su turbina recomendada); se rehace al cambiar puntos o costes
+    function reiniciarTerritorio() {{
+        var grupos = {{departamento: new Map(), municipio: new Map()}};
+        var porPunto = new Array(puntos.length);
+        puntos.forEach(function(p, i) {{
+            var t = turbinaMenorCapex(p);
+            var claves = {{departamento: p.departamento, municipio: p.departamento + '|' + p.municipio}};
+            var enGrupos = [];
+            ['departamento', 'municipio'].forEach(function(nivel) {{
+                var g = grupos[nivel].get(claves[nivel]);
+                if (!g) {{
+                    g = {{departamento: p.departamento, municipio: nivel === 'municipio' ? p.municipio : '',
+                         puntos: 0, vss: 0, vssAbastecibles: 0, capexTotal: 0, miembros: [], min: null, mediana: null}};
+                    grupos[nivel].set(claves[nivel], g);
+                }}
+                if (t && t.capex_por_vss > 0) g.miembros.push({{fila: i, capexPorVss: t.capex_por_vss}});
+                enGrupos.push(g);
+            }});
+            porPunto[i] = {{turbina: t, grupos: enGrupos}};
+        }});
+        ['departamento', 'municipio'].forEach(function(nivel) {{
+            grupos[nivel].forEach(function(g) {{
+                g.miembros.sort(function(a, b) {{ return a.capexPorVss - b.capexPorVss; }});
+            }});
+        }});
+        territorio = {{version: versionCostes, puntos: puntos, grupos: grupos, porPunto: porPunto,
+                      dentro: new Uint8Array(puntos.length), filas: [], tocados: new Set()}};
+    }}
+    
+    function moverPuntoTerritorio(fila, signo) {{
+        var p = puntos[fila];
+        var t = territorio.porPunto[fila].turbina;
+        territorio.porPunto[fila].grupos.forEach(function(g) {{
+            g.puntos += signo;
+            g.vss += signo * p.vss;
+            if (t) {{
+                g.vssAbastecibles += signo * t.vss_abastecibles;
+                g.capexTotal += signo * t.capex_total;
+            }}
+            territorio.tocados.add(g);
+        }});
+    }}
+    
+    function actualizarTerritorio(resultado) {{
+        if (!territorio || territorio.version !== versionCostes || territorio.puntos !== puntos) {{
+            reiniciarTerritorio();
+        }}
+        var dentro = new Uint8Array(puntos.length);
+        var filas = [];
+        resultado.visibles.forEach(function(v) {{
+            var fila = filaDePunto(v.punto.id);
+            dentro[fila] = 1;
+            filas.push(fila);
+        }});
+        territorio.filas.forEach(function(fila) {{
+            if (!dentro[fila]) moverPuntoTerritorio(fila, -1);
+        }});
+        filas.forEach(function(fila) {{
+            if (!territorio.dentro[fila]) moverPuntoTerritorio(fila, 1);
+        }});
+        territorio.dentro = dentro;
+        territorio.filas = filas;
+        
+        // Mínimo y mediana (los miembros ya están ordenados por CAPEX/VSS)
+        territorio.tocados.forEach(function(g) {{
+            var valores = [];
+            g.miembros.forEach(function(m) {{
+                if (dentro[m.fila]) valores.push(m.capexPorVss);
+            }});
+            var k = valores.length;
+            g.min = k ? valores[0] : null;
+            g.mediana = k ? (valores[(k - 1) >> 1] + valores[k >> 1]) / 2 : null;
+        }});
+        territorio.tocados.clear();
+    }}
+    
+    // [departamento, municipio, puntos, vss, vss_abastecibles, capex_por_vss_min, capex_por_vss_mediana, capex_total]
+    function filasTerritorio(nivel) {{
+        if (territorioPrecalculado) return AGREGADOS_TERRITORIO[nivel];
+        if (!territorio) return [];
+        var filas = [];
+        territorio.grupos[nivel].forEach(function(g) {{
+            if (g.puntos > 0) {{
+                filas.push([g.departamento, g.municipio, g.puntos, g.vss, g.vssAbastecibles, g.min, g.mediana, g.capexTotal]);
+            }}
+        }});
+        var comparar = function(a, b) {{ return a < b ? -1 : (a > b ? 1 : 0); }};
+        filas.sort(function(a, b) {{
+            return (b[4] - a[4]) || comparar(a[0], b[0]) || comparar(a[1], b[1]);
+        }});
+        return filas;
+    }}
+    
+    function mostrarTerritorio() {{
+        var nivel = document.getElementById('nivel-territorio').value || 'departamento';
+        var filas = filasTerritorio(nivel);
+        var mostradas = filas.slice(0, FILAS_PANEL_TERRITORIO);
+        
+        // Escala de color por mediana de CAPEX/VSS entre los territorios mostrados
+        var medianas = mostradas.map(function(f) {{ return f[6]; }}).filter(function(v) {{ return v !== null; }});
+        var minimo = Math.min.apply(null, medianas);
+        var maximo = Math.max.apply(null, medianas);
+        var usd = function(v) {{ return v === null ? 'N/A' : '$' + formatNumber(v); }};
+        
+        var html = '<table style="width: 100%; border-collapse: collapse; white-space: nowrap;">';
+        html += '<tr style="background: #5D0E41; color: white; position: sticky; top: 0;">' +
+                '<th style="padding: 4px; text-align: left;">' + (nivel === 'municipio' ? 'Municipio' : 'Departamento') + '</th>' +
+                '<th style="padding: 4px;">Puntos</th><th style="padding: 4px;">VSS</th>' +
+                '<th style="padding: 4px;">VSS abast.</th><th style="padding: 4px;">CAPEX/VSS mín.</th>' +
+                '<th style="padding: 4px;">CAPEX/VSS mediana</th><th style="padding: 4px;">CAPEX total</th></tr>';
+        mostradas.forEach(function(f) {{
+            var color = '#F5F5F5';
+            if (f[6] !== null) {{
+                var x = maximo > minimo ? (f[6] - minimo) / (maximo - minimo) : 0;
+                color = 'hsl(' + Math.round(120 * (1 - x)) + ', 70%, 82%)';
+            }}
+            var nombre = nivel === 'municipio' ? f[1] + ' <span style="color: #888;">(' + f[0] + ')</span>' : f[0];
+            html += '<tr style="border-bottom: 1px solid #EEE; background: ' + color + ';">' +
+                    '<td style="padding: 3px;">' + (nombre || 'Sin dato') + '</td>' +
+                    '<td style="padding: 3px; text-align: right;">' + formatNumber(f[2]) + '</td>' +
+                    '<td style="padding: 3px; text-align: right;">' + formatNumber(f[3]) + '</td>' +
+                    '<td style="padding: 3px; text-align: right;">' + formatNumber(f[4]) + '</td>' +
+                    '<td style="padding: 3px; text-align: right;">' + usd(f[5]) + '</td>' +
+                    '<td style="padding: 3px; text-align: right; font-weight: 600;">' + usd(f[6]) + '</td>' +
+                    '<td style="padding: 3px; text-align: right;">' + usd(f[7]) + '</td></tr>';
+        }});
+        html += '</table>';
+        if (filas.length > mostradas.length) {{
+            html += '<div style="padding: 4px; color: #888; font-style: italic;">... y ' +
+                    formatNumber(filas.length - mostradas.length) + ' más</div>';
+        }}
+        document.getElementById('tabla-territorio').innerHTML = html;
+    }}
+    
+    function alMoverMapa() {{
+        var zoom = map_{mapa._id}.getZoom();
+        var cambioZoom = zoom !== zoomAnterior && !modoPriorizacion &&
+            (zoom < ZOOM_PUNTOS_INDIVIDUALES || zoomAnterior < ZOOM_PUNTOS_INDIVIDUALES);
+        zoomAnterior = zoom;
+        if (sincronizarBloques() || cambioZoom) {{
+            actualizar();
+        }}
+    }}
     var puntosPriorizadosCompletos = []; // Almacenar todos los puntos priorizados
     var totalPuntosPriorizados = 0; // Total de puntos para calcular colores
     
@@ -1916,115 +3825,289 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
         return costes;
     }}
     
-    // Función para determinar turbinas aplicables
-    function determinarTurbinasAplicables(caudalCfs, caidaFt) {{
-        var turbinasAplicables = [];
+    // ================================================================
+    // MOTOR DE COSTES EN COLUMNAS (estructura de arrays)
+    // Cada par punto-turbina ocupa una fila de Float64Array. Las turbinas
+    // aplicables no dependen de los parámetros, así que las columnas se
+    // construyen una sola vez.
+    //
+    // Descomposición lineal: fijada la potencia usada para costes (kW),
+    // cada partida es c0 + c1·kW + c2·kW·dist_km, donde (c0, c1, c2) solo
+    // dependen de los parámetros, del tipo de turbina, de la región y del
+    // tramo de potencia (< 50 kW o ≥ 50 kW). Cada par guarda su vector
+    // [1, kW, kW·dist_km] y su clave (turbina, región, tramo); un nuevo
+    // juego de parámetros solo reconstruye la tabla de coeficientes
+    // (turbinas × regiones × tramos) y evalúa un producto de 3 términos.
+    // Si cambian las eficiencias, la potencia puede cruzar el umbral de
+    // 50 kW o el de opción híbrida: esos pares recalculan su vector.
+    // ================================================================
+    var TIPOS_TURBINA = ['Francis', 'PAT', 'Pelton', 'Kaplan', 'Low Head', 'Turgo', 'Cross Flow'];
+    var REGIONES_COSTE = [
+        'Región Pacífico', 'Región Eje Cafetero – Antioquia', 'Región Centro Sur',
+        'Región Centro Oriente', 'Región Caribe', 'Región Llano', ''
+    ];
+    var CODIGO_TURBINA = {{}};
+    TIPOS_TURBINA.forEach(function(tipo, i) {{ CODIGO_TURBINA[tipo] = i; }});
+    var CODIGO_REGION = {{}};
+    REGIONES_COSTE.forEach(function(region, i) {{ CODIGO_REGION[region] = i; }});
+    var CODIGO_REGION_SIN_DATO = CODIGO_REGION[''];
+    
+    // Partidas en el orden de la tabla de coeficientes
+    var PARTIDAS_CAPEX = ['costeTurbina', 'costeEquipos', 'costeObraCivil', 'costeInstalacion',
+                          'costeLinea', 'costeAmbiental', 'costeTransporte'];
+    var N_PARTIDAS = PARTIDAS_CAPEX.length;
+    var N_CLAVES = TIPOS_TURBINA.length * REGIONES_COSTE.length * 2;
+    
+    var columnasCostes = null;
+    
+    // Construir las columnas de entrada y reservar las de salida (una vez)
+    function construirColumnasCostes() {{
+        var n = 0;
+        puntos.forEach(function(p) {{ n += p.turbinas ? p.turbinas.length : 0; }});
+        
+        var c = {{
+            n: n,
+            // Entradas fijas
+            potenciaBase: new Float64Array(n),      // potencia_k × 0.9 (sin eficiencia)
+            potenciaVss: new Float64Array(n),       // kW para abastecer todas las VSS
+            potenciaPico: new Float64Array(n),
+            vss: new Float64Array(n),
+            distKm: new Float64Array(n),
+            region: new Uint8Array(n),
+            turbina: new Uint8Array(n),
+            // Vector de características (depende solo de las eficiencias)
+            potenciaMaxima: new Float64Array(n),
+            potenciaCostes: new Float64Array(n),    // kW
+            kwDist: new Float64Array(n),            // kW × dist_km
+            clave: new Uint16Array(n),              // (turbina, región, tramo)
+            vssAbastecibles: new Int32Array(n),
+            esHibrida: new Uint8Array(n),
+            eficienciaUsada: new Float64Array(TIPOS_TURBINA.length).fill(NaN),
+            // Salidas
+            costeTurbina: new Float64Array(n),
+            costeEquipos: new Float64Array(n),
+            costeObraCivil: new Float64Array(n),
+            costeInstalacion: new Float64Array(n),
+            costeLinea: new Float64Array(n),
+            costeAmbiental: new Float64Array(n),
+            costeTransporte: new Float64Array(n),
+            otrosCostes: new Float64Array(n),
+            capexTotal: new Float64Array(n),
+            opex: new Float64Array(n),
+            capexPorVss: new Float64Array(n),
+            // Objeto turbina de cada fila, para volcar los resultados
+            refs: new Array(n)
+        }};
+        
+        var k = 0;
+        puntos.forEach(function(p) {{
+            if (!p.turbinas) return;
+            var codigoRegion = CODIGO_REGION.hasOwnProperty(p.region) ? CODIGO_REGION[p.region] : CODIGO_REGION_SIN_DATO;
+            for (var i = 0; i < p.turbinas.length; i++) {{
+                c.potenciaBase[k] = p.potencia_k * 0.9;
+                c.potenciaVss[k] = p.vss * p.potencia_pico;
+                c.potenciaPico[k] = p.potencia_pico;
+                c.vss[k] = p.vss;
+                c.distKm[k] = p.dist_punto_capital / 1000;
+                c.region[k] = codigoRegion;
+                c.turbina[k] = CODIGO_TURBINA[p.turbinas[i].tipo];
+                c.refs[k] = p.turbinas[i];
+                k++;
+            }}
+        }});
         
-        // Definir polígonos simplificados
-        // Low Head: caudal 1-10000, caida 1-20
-        if (caudalCfs >= 1 && caudalCfs <= 10000 && caidaFt >= 1 && caidaFt <= 20) {{
-            turbinasAplicables.push('Low Head');
-        }}
-        // PAT: caudal 1-30, caida 30-300
-        if (caudalCfs >= 1 && caudalCfs <= 30 && caidaFt >= 30 && caidaFt <= 300) {{
-            turbinasAplicables.push('PAT');
-        }}
-        // Kaplan: caudal 100-10000, caida 10-150
-        if (caudalCfs >= 100 && caudalCfs <= 10000 && caidaFt >= 10 && caidaFt <= 150) {{
-            turbinasAplicables.push('Kaplan');
-        }}
-        // Cross Flow: caudal 1-200, caida 10-400
-        if (caudalCfs >= 1 && caudalCfs <= 200 && caidaFt >= 10 && caidaFt <= 400) {{
-            turbinasAplicables.push('Cross Flow');
-        }}
-        // Turgo: caudal 1-500, caida 100-1000
-        if (caudalCfs >= 1 && caudalCfs <= 500 && caidaFt >= 100 && caidaFt <= 1000) {{
-            turbinasAplicables.push('Turgo');
-        }}
-        // Francis: complejo, simplificado
-        if ((caudalCfs >= 10 && caudalCfs <= 3000 && caidaFt >= 50 && caidaFt <= 300) ||
-            (caudalCfs >= 10 && caudalCfs <= 200 && caidaFt >= 300 && caidaFt <= 3000)) {{
-            turbinasAplicables.push('Francis');
-        }}
-        // Pelton: caudal 1-200, caida 300-5000
-        if (caudalCfs >= 1 && caudalCfs <= 200 && caidaFt >= 300 && caidaFt <= 5000) {{
-            turbinasAplicables.push('Pelton');
+        return c;
+    }}
+    
+    // Pasar un diccionario de parámetros por tipo a un array indexado por código
+    function parametrosPorCodigo(diccionario, claves) {{
+        var arr = new Float64Array(claves.length);
+        for (var i = 0; i < claves.length; i++) {{
+            arr[i] = diccionario[claves[i]];
         }}
-        
-        return turbinasAplicables;
+        return arr;
     }}
     
-    // Función para recalcular todas las turbinas de un punto
-    function recalcularTurbinasPunto(p) {{
-        var turbinasAplicables = determinarTurbinasAplicables(p.caudal_cfs, p.caida_ft);
-        var nuevasTurbinas = [];
-        
-        var potenciaAbastecerVss = p.vss * p.potencia_pico;
+    // Recalcular el vector de características de los pares cuya eficiencia cambió
+    function actualizarCaracteristicas(c) {{
+        var eficiencia = parametrosPorCodigo(PARAM_EFICIENCIAS, TIPOS_TURBINA);
+        var cambiada = new Uint8Array(TIPOS_TURBINA.length);
+        var hayCambios = false;
+        for (var t = 0; t < TIPOS_TURBINA.length; t++) {{
+            if (c.eficienciaUsada[t] !== eficiencia[t]) {{
+                cambiada[t] = 1;
+                hayCambios = true;
+            }}
+        }}
+        if (!hayCambios) return 0;
         
-        turbinasAplicables.forEach(function(tipoTurbina) {{
-            var eficiencia = PARAM_EFICIENCIAS[tipoTurbina];
-            var potenciaMaxima = p.potencia_k * 0.9 * eficiencia;
+        var nRegiones = REGIONES_COSTE.length;
+        var recalculados = 0;
+        for (var i = 0, n = c.n; i < n; i++) {{
+            var t = c.turbina[i];
+            if (!cambiada[t]) continue;
             
-            var potenciaParaCostes, vssAbastecibles, esHibrida;
-            if (potenciaMaxima < potenciaAbastecerVss) {{
-                potenciaParaCostes = potenciaMaxima;
-                vssAbastecibles = Math.floor(potenciaMaxima / p.potencia_pico);
-                esHibrida = true;
+            var potenciaMaxima = c.potenciaBase[i] * eficiencia[t];
+            var kw;
+            if (potenciaMaxima < c.potenciaVss[i]) {{
+                kw = potenciaMaxima;
+                c.vssAbastecibles[i] = Math.floor(potenciaMaxima / c.potenciaPico[i]);
+                c.esHibrida[i] = 1;
             }} else {{
-                potenciaParaCostes = potenciaAbastecerVss;
-                vssAbastecibles = Math.floor(p.vss);
-                esHibrida = false;
+                kw = c.potenciaVss[i];
+                c.vssAbastecibles[i] = Math.floor(c.vss[i]);
+                c.esHibrida[i] = 0;
             }}
+            c.potenciaMaxima[i] = potenciaMaxima;
+            c.potenciaCostes[i] = kw;
+            c.kwDist[i] = kw * c.distKm[i];
+            c.clave[i] = (t * nRegiones + c.region[i]) * 2 + (kw < 50 ? 0 : 1);
+            recalculados++;
+        }}
+        c.eficienciaUsada.set(eficiencia);
+        return recalculados;
+    }}
+    
+    // Tabla de coeficientes (c0, c1, c2) por clave y partida para los parámetros actuales
+    function construirTablaCoeficientes() {{
+        var F = PARAM_FORMULAS;
+        var G = new Float64Array(N_CLAVES * N_PARTIDAS * 3);
+        
+        for (var t = 0; t < TIPOS_TURBINA.length; t++) {{
+            var tipo = TIPOS_TURBINA[t];
+            var costeKw = PARAM_COSTOS_CAPEX[tipo];
+            var complejidad = PARAM_COMPLEJIDAD[tipo];
+            var mImpacto = PARAM_IMPACTO[tipo];
+            var mTurb = PARAM_TRANSPORTE[tipo];
+            var dificultad = PARAM_DIFICULTAD[tipo];
             
-            var costes = calcularCostesDetallados(
-                tipoTurbina,
-                potenciaParaCostes,
-                p.caida,
-                p.dist_punto_capital,
-                p.region
-            );
-            
-            var capexPorVss = vssAbastecibles > 0 ? costes.capex_total / vssAbastecibles : 0;
-            
-            nuevasTurbinas.push({{
-                tipo: tipoTurbina,
-                potencia_maxima: Math.round(potenciaMaxima * 100) / 100,
-                potencia_abastecer_vss: Math.round(potenciaAbastecerVss * 100) / 100,
-                potencia_usada_costes: Math.round(potenciaParaCostes * 100) / 100,
-                vss_abastecibles: vssAbastecibles,
-                es_hibrida: esHibrida,
-                capex_simple: Math.round(potenciaMaxima * PARAM_COSTOS_CAPEX[tipoTurbina] * 100) / 100,
-                coste_turbina: Math.round(costes.coste_turbina * 100) / 100,
-                coste_equipos: Math.round(costes.coste_equipos * 100) / 100,
-                coste_obra_civil: Math.round(costes.coste_obra_civil * 100) / 100,
-                coste_instalacion: Math.round(costes.coste_instalacion * 100) / 100,
-                coste_linea: Math.round(costes.coste_linea * 100) / 100,
-                coste_ambiental: Math.round(costes.coste_ambiental * 100) / 100,
-                coste_transporte: Math.round(costes.coste_transporte * 100) / 100,
-                otros_costes: Math.round(costes.otros_costes * 100) / 100,
-                capex_total: Math.round(costes.capex_total * 100) / 100,
-                opex: Math.round(costes.opex * 100) / 100,
-                capex_por_vss: Math.round(capexPorVss * 100) / 100
-            }});
-        }});
-        
-        return nuevasTurbinas;
+            for (var r = 0; r < REGIONES_COSTE.length; r++) {{
+                var mRegion = PARAM_REGION[REGIONES_COSTE[r]] || 1.2;
+                
+                for (var tramo = 0; tramo < 2; tramo++) {{
+                    var cbaseLinea = tramo === 0 ? F.Cbase_linea_baja : F.Cbase_linea_alta;
+                    var fLinea = tramo === 0 ? F.F_linea_baja : F.F_linea_alta;
+                    var peso = tramo === 0 ? F.peso_kw_bajo : F.peso_kw_alto;
+                    var coefs = [
+                        [0, costeKw, 0],                                              // turbina
+                        [0, costeKw * F.coef_equipos, 0],                             // equipos
+                        [0, F.Cbase_obra_civil, 0],                                   // obra civil
+                        [0, costeKw * (1 + F.coef_equipos) * complejidad, 0],         // instalación
+                        [cbaseLinea, fLinea, 0],                                      // línea
+                        [F.base_ambiental * mImpacto, F.coef_ambiental_kw * mImpacto, 0], // ambiental
+                        [F.coef_movilizacion * dificultad * mRegion,                  // transporte
+                         F.coef_logistica * mRegion,
+                         F.coef_transporte_base * F.factor_topografia * peso * mTurb * mRegion]
+                    ];
+                    var base = ((t * REGIONES_COSTE.length + r) * 2 + tramo) * N_PARTIDAS * 3;
+                    for (var j = 0; j < N_PARTIDAS; j++) {{
+                        G[base + j * 3] = coefs[j][0];
+                        G[base + j * 3 + 1] = coefs[j][1];
+                        G[base + j * 3 + 2] = coefs[j][2];
+                    }}
+                }}
+            }}
+        }}
+        return G;
+    }}
+    
+    // Núcleo de cálculo: producto del vector de cada par por su fila de coeficientes
+    function calcularCostesColumnas(c) {{
+        actualizarCaracteristicas(c);
+        var G = construirTablaCoeficientes();
+        var salidas = PARTIDAS_CAPEX.map(function(nombre) {{ return c[nombre]; }});
+        var coefOtros = PARAM_FORMULAS.coef_otros_costes;
+        var coefOpex = PARAM_FORMULAS.coef_opex;
+        
+        for (var i = 0, n = c.n; i < n; i++) {{
+            var kw = c.potenciaCostes[i];
+            var kwDist = c.kwDist[i];
+            var base = c.clave[i] * N_PARTIDAS * 3;
+            var sumaParcial = 0;
+            for (var j = 0; j < N_PARTIDAS; j++, base += 3) {{
+                var valor = G[base] + G[base + 1] * kw + G[base + 2] * kwDist;
+                salidas[j][i] = valor;
+                sumaParcial += valor;
+            }}
+            var otrosCostes = sumaParcial * coefOtros;
+            var capexTotal = sumaParcial + otrosCostes;
+            var vssAbastecibles = c.vssAbastecibles[i];
+            
+            c.otrosCostes[i] = otrosCostes;
+            c.capexTotal[i] = capexTotal;
+            c.opex[i] = capexTotal * coefOpex;
+            c.capexPorVss[i] = vssAbastecibles > 0 ? capexTotal / vssAbastecibles : 0;
+        }}
+    }}
+    
+    function redondear2(x) {{
+        return Math.round(x * 100) / 100;
+    }}
+    
+    // Volcar las columnas de salida en los objetos turbina existentes (sin crear objetos nuevos)
+    function volcarColumnasEnTurbinas(c) {{
+        var costeKw = parametrosPorCodigo(PARAM_COSTOS_CAPEX, TIPOS_TURBINA);
+        for (var i = 0, n = c.n; i < n; i++) {{
+            var turb = c.refs[i];
+            turb.potencia_maxima = redondear2(c.potenciaMaxima[i]);
+            turb.potencia_abastecer_vss = redondear2(c.potenciaVss[i]);
+            turb.potencia_usada_costes = redondear2(c.potenciaCostes[i]);
+            turb.vss_abastecibles = c.vssAbastecibles[i];
+            turb.es_hibrida = c.esHibrida[i] === 1;
+            turb.capex_simple = redondear2(c.potenciaMaxima[i] * costeKw[c.turbina[i]]);
+            turb.coste_turbina = redondear2(c.costeTurbina[i]);
+            turb.coste_equipos = redondear2(c.costeEquipos[i]);
+            turb.coste_obra_civil = redondear2(c.costeObraCivil[i]);
+            turb.coste_instalacion = redondear2(c.costeInstalacion[i]);
+            turb.coste_linea = redondear2(c.costeLinea[i]);
+            turb.coste_ambiental = redondear2(c.costeAmbiental[i]);
+            turb.coste_transporte = redondear2(c.costeTransporte[i]);
+            turb.otros_costes = redondear2(c.otrosCostes[i]);
+            turb.capex_total = redondear2(c.capexTotal[i]);
+            turb.opex = redondear2(c.opex[i]);
+            turb.capex_por_vss = redondear2(c.capexPorVss[i]);
+        }}
+    }}
+    
+    // Leer el formulario y recalcular todos los pares; devuelve la duración en ms
+    function recalcularCostes() {{
+        leerParametrosDelFormulario();
+        versionCostes++;
+        var inicio = performance.now();
+        if (!columnasCostes) {{
+            columnasCostes = construirColumnasCostes();
+        }}
+        calcularCostesColumnas(columnasCostes);
+        volcarColumnasEnTurbinas(columnasCostes);
+        return performance.now() - inicio;
     }}
     
     // Función para aplicar parámetros y recalcular todo
     function aplicarParametros() {{
-        // Leer parámetros del formulario
-        leerParametrosDelFormulario();
-        
-        // Recalcular turbinas para cada punto
-        puntos.forEach(function(p) {{
-            p.turbinas = recalcularTurbinasPunto(p);
-        }});
+        var duracion = recalcularCostes();
         
         // Actualizar visualización
         actualizar();
         
-        alert('✓ Parámetros aplicados\\n\\nSe han recalculado los costes de ' + puntos.length + ' puntos con los nuevos parámetros.');
+        alert('✓ Parámetros aplicados\\n\\nSe han recalculado los costes de ' + puntos.length + ' puntos (' +
+              columnasCostes.n + ' combinaciones punto-turbina) en ' + Math.round(duracion) + ' ms.');
+    }}
+    
+    // Reparametrización interactiva: cada cambio en el panel recalcula CAPEX,
+    // ranking y análisis multiescenario sin pulsar "Aplicar y Recalcular"
+    var temporizadorReparametrizacion = null;
+    function reparametrizarEnVivo() {{
+        if (temporizadorReparametrizacion) {{
+            clearTimeout(temporizadorReparametrizacion);
+        }}
+        temporizadorReparametrizacion = setTimeout(function() {{
+            temporizadorReparametrizacion = null;
+            recalcularCostes();
+            actualizar();
+            if (document.getElementById('modal-multiescenario').style.display === 'block') {{
+                mostrarAnalisisMultiescenario();
+            }}
+        }}, 150);
     }}
     
     // Función para resetear parámetros a valores por defecto
@@ -2110,7 +4193,9 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
         document.getElementById('param-form-coef-otros').value = '0.05';
         document.getElementById('param-form-coef-opex').value = '0.03';
         
-        alert('✓ Parámetros reseteados a valores por defecto\\n\\nHaz clic en "Aplicar y Recalcular" para actualizar los cálculos.');
+        reparametrizarEnVivo();
+        
+        alert('✓ Parámetros reseteados a valores por defecto\\n\\nLos costes se recalculan automáticamente.');
     }}
     
     // Función para formatear números con espacios (23 000 en lugar de 23,000)
@@ -2131,12 +4216,18 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
     
     // Función para descargar informe Word del punto
     function descargarInforme(puntoId, tasaCambio, ranking) {{
-        var punto = puntos.find(function(p) {{ return p.id === puntoId; }});
+        var punto = obtenerPunto(puntoId);
         if (!punto) {{
             alert('Error: No se encontró el punto');
             return;
         }}
         
+        // Ranking vigente según el resultado compartido (el popup puede ser anterior a un re-ranking)
+        if (modoPriorizacion) {{
+            obtenerResultadoFiltrado();
+            ranking = rankingDePunto(puntoId) || ranking;
+        }}
+        
         var fechaGeneracion = new Date().toLocaleString('es-ES');
         
         // Estilos basados en la plantilla corporativa
@@ -2163,115 +4254,797 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
             html += '<div class="ranking-box">⭐ RANKING #' + ranking + '</div>';
         }}
         
-        // Fecha de generación
-        html += '<table>';
-        html += '<tr><td class="header-rosa col-label">Fecha de generación del informe</td>';
-        html += '<td class="row-gris1 col-value">' + fechaGeneracion + '</td></tr>';
-        html += '</table>';
+        // Fecha de generación
+        html += '<table>';
+        html += '<tr><td class="header-rosa col-label">Fecha de generación del informe</td>';
+        html += '<td class="row-gris1 col-value">' + fechaGeneracion + '</td></tr>';
+        html += '</table>';
+        
+        // INFORMACIÓN DEL PUNTO
+        html += '<table>';
+        html += '<tr><td colspan="2" class="header-morado">Información del punto</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">ID</td><td class="row-gris1 col-value">' + punto.id + '</td></tr>';
+        html += '<tr><td class="row-gris2 col-label">Municipio</td><td class="row-gris2 col-value">' + punto.municipio + '</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">Departamento</td><td class="row-gris1 col-value">' + punto.departamento + '</td></tr>';
+        html += '<tr><td class="row-gris2 col-label">Región</td><td class="row-gris2 col-value">' + punto.region + '</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">Coordenadas</td><td class="row-gris1 col-value">' + punto.lat.toFixed(6) + ', ' + punto.lon.toFixed(6) + '</td></tr>';
+        html += '<tr><td class="row-gris2 col-label">Capital más cercana</td><td class="row-gris2 col-value">' + punto.capital + ' (' + punto.depto_capital + ')</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">Distancia a capital</td><td class="row-gris1 col-value">' + formatNumber(punto.dist_punto_capital) + ' m</td></tr>';
+        html += '</table>';
+        
+        // ENERGÍA Y DEMANDA
+        html += '<table>';
+        html += '<tr><td colspan="2" class="header-morado">Energía y Demanda</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">Caudal</td><td class="row-gris1 col-value">' + punto.caudal.toFixed(3) + ' m³/s (' + punto.caudal_cfs.toFixed(2) + ' cfs)</td></tr>';
+        html += '<tr><td class="row-gris2 col-label">Caída hidráulica</td><td class="row-gris2 col-value">' + punto.caida.toFixed(2) + ' m (' + punto.caida_ft.toFixed(2) + ' ft)</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">Pendiente</td><td class="row-gris1 col-value">' + punto.pendiente.toFixed(4) + '</td></tr>';
+        html += '<tr><td class="row-gris2 col-label">Viviendas sin servicio</td><td class="row-gris2 col-value">' + Math.floor(punto.vss) + ' viviendas</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">Zona climática</td><td class="row-gris1 col-value">' + punto.zona_clima + '</td></tr>';
+        html += '<tr><td class="row-gris2 col-label">Potencia pico</td><td class="row-gris2 col-value">' + punto.potencia_pico.toFixed(2) + ' kW/vivienda</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">Turbinas disponibles</td><td class="row-gris1 col-value">' + (punto.turbinas ? punto.turbinas.length : 0) + ' tipo(s)</td></tr>';
+        html += '</table>';
+        
+        // TURBINAS
+        if (punto.turbinas && punto.turbinas.length > 0) {{
+            punto.turbinas.forEach(function(turb, idx) {{
+                html += '<table>';
+                html += '<tr><td colspan="2" class="header-morado">Turbina ' + (idx + 1) + ': ' + turb.tipo.toUpperCase() + '</td></tr>';
+                
+                // Potencias
+                html += '<tr><td class="row-gris1 col-label">Potencia máxima aprovechable</td><td class="row-gris1 col-value">' + turb.potencia_maxima.toFixed(2) + ' kW</td></tr>';
+                html += '<tr><td class="row-gris2 col-label">Potencia para abastecer VSS</td><td class="row-gris2 col-value">' + turb.potencia_abastecer_vss.toFixed(2) + ' kW</td></tr>';
+                html += '<tr><td class="row-gris1 col-label">Potencia usada para costes</td><td class="row-gris1 col-value">' + turb.potencia_usada_costes.toFixed(2) + ' kW</td></tr>';
+                html += '<tr><td class="row-gris2 col-label">VSS abastecidas</td><td class="row-gris2 col-value">' + turb.vss_abastecibles + ' de ' + Math.floor(punto.vss) + '</td></tr>';
+                
+                // Cobertura
+                var cobertura = turb.es_hibrida ? '⚠️ Híbrida recomendada' : '✓ Cobertura completa';
+                html += '<tr><td class="row-gris1 col-label">Cobertura</td><td class="row-gris1 col-value">' + cobertura + '</td></tr>';
+                html += '</table>';
+                
+                // Tabla CAPEX (3 columnas)
+                html += '<table>';
+                html += '<tr><td class="header-rosa">Partida</td><td class="header-rosa">USD</td><td class="header-rosa">COP</td></tr>';
+                html += '<tr><td class="row-gris1">Turbina y generador</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_turbina) + '</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_turbina * tasaCambio) + '</td></tr>';
+                html += '<tr><td class="row-gris2">Otros equipos</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.coste_equipos) + '</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.coste_equipos * tasaCambio) + '</td></tr>';
+                html += '<tr><td class="row-gris1">Obra civil</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_obra_civil) + '</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_obra_civil * tasaCambio) + '</td></tr>';
+                html += '<tr><td class="row-gris2">Instalación y puesta en marcha</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.coste_instalacion) + '</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.coste_instalacion * tasaCambio) + '</td></tr>';
+                html += '<tr><td class="row-gris1">Línea de conexión eléctrica</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_linea) + '</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_linea * tasaCambio) + '</td></tr>';
+                html += '<tr><td class="row-gris2">Costes ambientales</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.coste_ambiental) + '</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.coste_ambiental * tasaCambio) + '</td></tr>';
+                html += '<tr><td class="row-gris1">Transporte</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_transporte) + '</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_transporte * tasaCambio) + '</td></tr>';
+                html += '<tr><td class="row-gris2">Otros costes</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.otros_costes) + '</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.otros_costes * tasaCambio) + '</td></tr>';
+                html += '<tr><td class="header-morado">CAPEX total</td><td class="header-morado" style="text-align:right;">$' + formatNumber(turb.capex_total) + '</td><td class="header-morado" style="text-align:right;">$' + formatNumber(turb.capex_total * tasaCambio) + '</td></tr>';
+                html += '<tr><td class="row-gris1">OPEX Anual (3%)</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.opex) + '</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.opex * tasaCambio) + '</td></tr>';
+                html += '<tr><td class="row-gris2">CAPEX Total / VSS</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.capex_por_vss) + '</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.capex_por_vss * tasaCambio) + '</td></tr>';
+                html += '</table>';
+            }});
+        }}
+        
+        // TABLA DE ATRIBUTOS DEL PUNTO (al final)
+        html += '<table>';
+        html += '<tr><td colspan="2" class="header-morado">Atributos del punto</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">ID</td><td class="row-gris1 col-value">' + punto.id + '</td></tr>';
+        html += '<tr><td class="row-gris2 col-label">Latitud</td><td class="row-gris2 col-value">' + punto.lat.toFixed(6) + '</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">Longitud</td><td class="row-gris1 col-value">' + punto.lon.toFixed(6) + '</td></tr>';
+        html += '<tr><td class="row-gris2 col-label">Caudal (m³/s)</td><td class="row-gris2 col-value">' + punto.caudal.toFixed(3) + '</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">Caudal (cfs)</td><td class="row-gris1 col-value">' + punto.caudal_cfs.toFixed(2) + '</td></tr>';
+        html += '<tr><td class="row-gris2 col-label">Caída (m)</td><td class="row-gris2 col-value">' + punto.caida.toFixed(2) + '</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">Caída (ft)</td><td class="row-gris1 col-value">' + punto.caida_ft.toFixed(2) + '</td></tr>';
+        html += '<tr><td class="row-gris2 col-label">Pendiente</td><td class="row-gris2 col-value">' + punto.pendiente.toFixed(4) + '</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">VSS</td><td class="row-gris1 col-value">' + Math.floor(punto.vss) + '</td></tr>';
+        html += '<tr><td class="row-gris2 col-label">Municipio</td><td class="row-gris2 col-value">' + punto.municipio + '</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">Departamento</td><td class="row-gris1 col-value">' + punto.departamento + '</td></tr>';
+        html += '<tr><td class="row-gris2 col-label">Región</td><td class="row-gris2 col-value">' + punto.region + '</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">Capital cercana</td><td class="row-gris1 col-value">' + punto.capital + '</td></tr>';
+        html += '<tr><td class="row-gris2 col-label">Depto. capital</td><td class="row-gris2 col-value">' + punto.depto_capital + '</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">Distancia capital (m)</td><td class="row-gris1 col-value">' + formatNumber(punto.dist_punto_capital) + '</td></tr>';
+        html += '<tr><td class="row-gris2 col-label">Zona climática</td><td class="row-gris2 col-value">' + punto.zona_clima + '</td></tr>';
+        html += '<tr><td class="row-gris1 col-label">Potencia pico (kW/viv)</td><td class="row-gris1 col-value">' + punto.potencia_pico.toFixed(2) + '</td></tr>';
+        if (ranking !== null) {{
+            html += '<tr><td class="header-rosa">Ranking priorización</td><td class="header-rosa">#' + ranking + '</td></tr>';
+        }}
+        html += '</table>';
+        
+        html += '</body></html>';
+        
+        // Descargar como archivo .doc
+        var blob = new Blob(['\\ufeff' + html], {{ type: 'application/msword' }});
+        var link = document.createElement('a');
+        var fecha = new Date();
+        var nombreArchivo = 'Informe_Punto_' + punto.id + '_' + 
+                          fecha.getFullYear() + 
+                          String(fecha.getMonth()+1).padStart(2,'0') + 
+                          String(fecha.getDate()).padStart(2,'0') + '.doc';
+        
+        link.href = URL.createObjectURL(blob);
+        link.download = nombreArchivo;
+        document.body.appendChild(link);
+        link.click();
+        document.body.removeChild(link);
+        URL.revokeObjectURL(link.href);
+    }}
+
+    // ================================================================
+    // RANKING DE PRIORIZACIÓN EN CACHÉ
+    // La lista de candidatos y su orden por capex_por_vss solo se
+    // recalculan cuando cambian las entradas del ranking (filtros o
+    // parámetros de coste). Top N se resuelve con un montículo acotado y
+    // el corte por presupuesto con una búsqueda binaria sobre el CAPEX
+    // acumulado, sin volver a recorrer las turbinas de cada punto.
+    // ================================================================
+    var cacheRanking = null;
+    var versionCostes = 0; // Se incrementa cada vez que se recalculan los costes
+    
+    // Orden del ranking: menor puntuación multicriterio primero; empate por
+    // capex_por_vss y después por orden original
+    function compararCandidatos(a, b) {{
+        return (a.puntuacion - b.puntuacion) || (a.capex_por_vss - b.capex_por_vss) || (a.orden - b.orden);
+    }}
+    
+    // ================================================================
+    // RANKING MULTICRITERIO
+    // Cada criterio se normaliza a [0, 1] con 0 = mejor valor entre los
+    // candidatos; la puntuación es la suma ponderada. Con los pesos por
+    // defecto (solo CAPEX/VSS) el orden es el ranking clásico.
+    // ================================================================
+    var CRITERIOS_RANKING = [
+        {{ id: 'capex', nombre: 'CAPEX/VSS', sentido: 'min', valor: function(item) {{ return item.capex_por_vss; }} }},
+        {{ id: 'distancia', nombre: 'Distancia a capital', sentido: 'min', valor: function(item) {{ return item.punto.dist_punto_capital; }} }},
+        {{ id: 'vss', nombre: 'VSS', sentido: 'max', valor: function(item) {{ return item.punto.vss; }} }},
+        {{ id: 'potencia', nombre: 'Potencia máxima', sentido: 'max', valor: function(item) {{ return item.turbina.potencia_maxima; }} }},
+        {{ id: 'hibrida', nombre: 'Híbrida', sentido: 'min', valor: function(item) {{ return item.turbina.es_hibrida ? 1 : 0; }} }}
+    ];
+    
+    function leerPesosRanking() {{
+        return CRITERIOS_RANKING.map(function(criterio) {{
+            var peso = parseFloat(document.getElementById('peso-' + criterio.id).value);
+            return isNaN(peso) || peso < 0 ? 0 : peso;
+        }});
+    }}
+    
+    // Columnas normalizadas (0 = mejor) por criterio, una vez por conjunto de candidatos
+    function normalizarCriterios(candidatos) {{
+        return CRITERIOS_RANKING.map(function(criterio) {{
+            var n = candidatos.length;
+            var columna = new Float64Array(n);
+            var min = Infinity, max = -Infinity;
+            for (var i = 0; i < n; i++) {{
+                var v = criterio.valor(candidatos[i]);
+                columna[i] = v;
+                if (v < min) min = v;
+                if (v > max) max = v;
+            }}
+            var rango = max - min;
+            for (var i = 0; i < n; i++) {{
+                var t = rango > 0 ? (columna[i] - min) / rango : 0;
+                columna[i] = criterio.sentido === 'min' ? t : 1 - t;
+            }}
+            return columna;
+        }});
+    }}
+    
+    // Recalcular puntuaciones solo si cambian los pesos; invalida el orden
+    function puntuarCandidatos(rk, pesos) {{
+        var clavePesos = pesos.join(',');
+        if (rk.clavePesos === clavePesos) return;
+        
+        var activos = [];
+        pesos.forEach(function(peso, k) {{ if (peso > 0) activos.push(k); }});
+        var candidatos = rk.candidatos;
+        for (var i = 0; i < candidatos.length; i++) {{
+            var s = 0;
+            for (var j = 0; j < activos.length; j++) {{
+                s += pesos[activos[j]] * rk.criterios[activos[j]][i];
+            }}
+            candidatos[i].puntuacion = s;
+        }}
+        
+        rk.clavePesos = clavePesos;
+        rk.claveOrden = rk.clave + '|' + clavePesos;
+        rk.activos = activos;
+        rk.ordenados = null;
+        rk.prefijo = null;
+        rk.parcial = null;
+        puntosPriorizadosCompletos = [];
+    }}
+    
+    // ================================================================
+    // FRENTE DE PARETO
+    // Puntos no dominados en los criterios con peso > 0 (todos a
+    // minimizar tras la normalización). Con dos criterios: barrido tras
+    // ordenar, O(n log n). Con tres: barrido en orden lexicográfico con
+    // un árbol de Fenwick de mínimos de z por rango de y, O(n log n).
+    // Con más: sort-filter-skyline, ordenando por la suma de criterios
+    // (ningún punto puede ser dominado por otro posterior) y comparando
+    // solo contra el frente ya construido.
+    // ================================================================
+    function domina(cols, a, b) {{
+        var estricto = false;
+        for (var k = 0; k < cols.length; k++) {{
+            if (cols[k][a] > cols[k][b]) return false;
+            if (cols[k][a] < cols[k][b]) estricto = true;
+        }}
+        return estricto;
+    }}
+    
+    function calcularFrentePareto(cols, n) {{
+        var enFrente = new Uint8Array(n);
+        var d = cols.length;
+        if (d === 0 || n === 0) return enFrente;
+        
+        var idx = new Array(n);
+        for (var i = 0; i < n; i++) idx[i] = i;
+        
+        if (d === 1) {{
+            var x = cols[0], min = Infinity;
+            for (var i = 0; i < n; i++) if (x[i] < min) min = x[i];
+            for (var i = 0; i < n; i++) if (x[i] === min) enFrente[i] = 1;
+            return enFrente;
+        }}
+        
+        if (d === 2) {{
+            var x = cols[0], y = cols[1];
+            idx.sort(function(a, b) {{ return (x[a] - x[b]) || (y[a] - y[b]); }});
+            var mejorY = Infinity, xFrente = NaN;
+            for (var j = 0; j < n; j++) {{
+                var i = idx[j];
+                // Los duplicados exactos del último punto del frente tampoco están dominados
+                if (y[i] < mejorY || (y[i] === mejorY && x[i] === xFrente)) {{
+                    enFrente[i] = 1;
+                    mejorY = y[i];
+                    xFrente = x[i];
+                }}
+            }}
+            return enFrente;
+        }}
+        
+        if (d === 3) {{
+            var x = cols[0], y = cols[1], z = cols[2];
+            idx.sort(function(a, b) {{ return (x[a] - x[b]) || (y[a] - y[b]) || (z[a] - z[b]); }});
+            // Rango de y (1..r, valores iguales con el mismo rango)
+            var porY = idx.slice().sort(function(a, b) {{ return y[a] - y[b]; }});
+            var rango = new Int32Array(n), r = 0;
+            for (var j = 0; j < n; j++) {{
+                if (j === 0 || y[porY[j]] !== y[porY[j - 1]]) r++;
+                rango[porY[j]] = r;
+            }}
+            // Todo punto que domina a otro va antes en orden lexicográfico:
+            // basta buscar, entre los ya vistos con y <= y_i, el menor z
+            var minimoZ = new Float64Array(r + 1).fill(Infinity);
+            for (var j = 0; j < n; ) {{
+                var i = idx[j], fin = j + 1;
+                while (fin < n && x[idx[fin]] === x[i] && y[idx[fin]] === y[i] && z[idx[fin]] === z[i]) fin++;
+                var menor = Infinity;
+                for (var p = rango[i]; p > 0; p -= p & -p) {{
+                    if (minimoZ[p] < menor) menor = minimoZ[p];
+                }}
+                // Los duplicados exactos no se dominan entre sí
+                if (menor > z[i]) {{
+                    for (var k = j; k < fin; k++) enFrente[idx[k]] = 1;
+                }}
+                for (var p = rango[i]; p <= r; p += p & -p) {{
+                    if (z[i] < minimoZ[p]) minimoZ[p] = z[i];
+                }}
+                j = fin;
+            }}
+            return enFrente;
+        }}
+        
+        var suma = new Float64Array(n);
+        for (var k = 0; k < d; k++) {{
+            for (var i = 0; i < n; i++) suma[i] += cols[k][i];
+        }}
+        idx.sort(function(a, b) {{ return suma[a] - suma[b]; }});
+        var frente = [];
+        for (var j = 0; j < n; j++) {{
+            var i = idx[j], dominado = false;
+            for (var f = 0; f < frente.length; f++) {{
+                if (domina(cols, frente[f], i)) {{ dominado = true; break; }}
+            }}
+            if (!dominado) {{
+                frente.push(i);
+                enFrente[i] = 1;
+            }}
+        }}
+        return enFrente;
+    }}
+    
+    // Frente de Pareto del ranking actual (en caché por criterios activos)
+    function obtenerFrentePareto(rk) {{
+        var claveFrente = rk.activos.join(',');
+        if (!rk.pareto || rk.pareto.clave !== claveFrente) {{
+            var cols = rk.activos.map(function(k) {{ return rk.criterios[k]; }});
+            var enFrente = calcularFrentePareto(cols, rk.candidatos.length);
+            var total = 0;
+            for (var i = 0; i < enFrente.length; i++) total += enFrente[i];
+            rk.pareto = {{ clave: claveFrente, enFrente: enFrente, total: total }};
+        }}
+        return rk.pareto;
+    }}
+    
+    function marcarFrentePareto(rk) {{
+        paretoPuntos = new Uint8Array(puntos.length);
+        var resumen = document.getElementById('resumen-pareto');
+        if (!document.getElementById('pareto-resaltar').checked) {{
+            resumen.textContent = '';
+            return;
+        }}
+        var frente = obtenerFrentePareto(rk);
+        for (var i = 0; i < rk.candidatos.length; i++) {{
+            if (frente.enFrente[i]) paretoPuntos[filaDePunto(rk.candidatos[i].punto.id)] = 1;
+        }}
+        var nombres = rk.activos.map(function(k) {{ return CRITERIOS_RANKING[k].nombre; }});
+        resumen.textContent = nombres.length > 0
+            ? frente.total + ' puntos no dominados (' + nombres.join(', ') + ')'
+            : 'Asigna peso a algún criterio';
+    }}
+    
+    function obtenerRankingPriorizacion(cmin, cmax, pmin, vssMin, regionesSeleccionadas, capexMax, pesos) {{
+        var clave = JSON.stringify([cmin, cmax, pmin, vssMin, regionesSeleccionadas, capexMax, versionCostes]);
+        if (cacheRanking && cacheRanking.clave === clave) {{
+            puntuarCandidatos(cacheRanking, pesos);
+            return cacheRanking;
+        }}
+        
+        // Filtrar puntos que tengan PAT o Cross Flow y cumplan otros filtros
+        var candidatos = [];
+        
+        puntos.forEach(function(p) {{
+            var pasaCaudal = p.caudal > cmin && p.caudal < cmax;
+            var pasaPendiente = p.pendiente > pmin;
+            var pasaVss = p.vss >= vssMin;
+            var pasaRegion = regionesSeleccionadas.includes(p.region);
+            if (!(pasaCaudal && pasaPendiente && pasaVss && pasaRegion)) return;
+            
+            // Mejor turbina PAT/Cross Flow por CAPEX/VSS y menor CAPEX total (para el presupuesto)
+            var mejorCapexPorVss = Infinity;
+            var mejorTurbinaPriorizada = null;
+            var capexMinimo = Infinity;
+            var vssCapexMinimo = 0;
+            
+            if (p.turbinas && p.turbinas.length > 0) {{
+                for (var i = 0; i < p.turbinas.length; i++) {{
+                    var turb = p.turbinas[i];
+                    if (turb.tipo === 'PAT' || turb.tipo === 'Cross Flow') {{
+                        if (turb.capex_por_vss < mejorCapexPorVss) {{
+                            mejorCapexPorVss = turb.capex_por_vss;
+                            mejorTurbinaPriorizada = turb;
+                        }}
+                        if (turb.capex_total < capexMinimo) {{
+                            capexMinimo = turb.capex_total;
+                            vssCapexMinimo = turb.vss_abastecibles;
+                        }}
+                    }}
+                }}
+            }}
+            if (mejorTurbinaPriorizada === null) return;
+            
+            // Verificar CAPEX si hay filtro: alguna turbina PAT o Cross Flow debe cumplirlo
+            if (capexMax !== null && capexMinimo > capexMax) return;
+            
+            candidatos.push({{
+                punto: p,
+                capex_por_vss: mejorCapexPorVss,
+                turbina: mejorTurbinaPriorizada,
+                capex_presupuesto: capexMinimo,
+                vss_presupuesto: vssCapexMinimo,
+                puntuacion: 0,
+                orden: candidatos.length
+            }});
+        }});
+        
+        cacheRanking = {{
+            clave: clave,
+            candidatos: candidatos,
+            criterios: normalizarCriterios(candidatos),
+            clavePesos: null,  // Pesos con los que se puntuó
+            claveOrden: null,  // clave + pesos: identifica el orden del ranking
+            activos: [],       // Índices de criterios con peso > 0
+            pareto: null,      // Frente de Pareto (perezoso)
+            ordenados: null,   // Orden completo (perezoso)
+            prefijo: null,     // CAPEX acumulado del orden completo
+            parcial: null      // Último Top N obtenido con el montículo
+        }};
+        puntuarCandidatos(cacheRanking, pesos);
+        return cacheRanking;
+    }}
+    
+    // CAPEX acumulado: prefijo[j] = suma de los j primeros puntos de la lista
+    function acumularCapex(lista) {{
+        var prefijo = new Float64Array(lista.length + 1);
+        for (var i = 0; i < lista.length; i++) {{
+            prefijo[i + 1] = prefijo[i] + lista[i].capex_presupuesto;
+        }}
+        return prefijo;
+    }}
+    
+    function ordenarRankingCompleto(rk) {{
+        if (!rk.ordenados) {{
+            rk.ordenados = rk.candidatos.slice().sort(compararCandidatos);
+            rk.prefijo = acumularCapex(rk.ordenados);
+            
+            // Guardar todos los puntos priorizados CON SU RANKING antes de filtrar
+            puntosPriorizadosCompletos = rk.ordenados.map(function(item, index) {{
+                return {{
+                    punto: item.punto,
+                    capex_por_vss: item.capex_por_vss,
+                    turbina: item.turbina,
+                    ranking: index + 1
+                }};
+            }});
+        }}
+        return rk;
+    }}
+    
+    // Ranking completo (ordena solo si aún no se ha hecho para el estado actual)
+    function obtenerRankingCompleto() {{
+        if (!cacheRanking) return [];
+        ordenarRankingCompleto(cacheRanking);
+        return puntosPriorizadosCompletos;
+    }}
+    
+    // Los n mejores candidatos con un montículo de máximos acotado: O(m log n)
+    function seleccionarTopN(candidatos, n) {{
+        var heap = [];
+        
+        function subir(i) {{
+            while (i > 0) {{
+                var padre = (i - 1) >> 1;
+                if (compararCandidatos(heap[i], heap[padre]) <= 0) break;
+                var tmp = heap[i]; heap[i] = heap[padre]; heap[padre] = tmp;
+                i = padre;
+            }}
+        }}
+        
+        function bajar(i) {{
+            var len = heap.length;
+            while (true) {{
+                var izq = 2 * i + 1, der = izq + 1, mayor = i;
+                if (izq < len && compararCandidatos(heap[izq], heap[mayor]) > 0) mayor = izq;
+                if (der < len && compararCandidatos(heap[der], heap[mayor]) > 0) mayor = der;
+                if (mayor === i) break;
+                var tmp = heap[i]; heap[i] = heap[mayor]; heap[mayor] = tmp;
+                i = mayor;
+            }}
+        }}
+        
+        for (var i = 0; i < candidatos.length; i++) {{
+            if (heap.length < n) {{
+                heap.push(candidatos[i]);
+                subir(heap.length - 1);
+            }} else if (compararCandidatos(candidatos[i], heap[0]) < 0) {{
+                heap[0] = candidatos[i];
+                bajar(0);
+            }}
+        }}
+        
+        return heap.sort(compararCandidatos);
+    }}
+    
+    // Número de puntos (hasta limite) cuyo CAPEX acumulado cabe en el presupuesto
+    function contarDentroPresupuesto(prefijo, limite, presupuesto) {{
+        var lo = 0, hi = limite;
+        while (lo < hi) {{
+            var mid = (lo + hi + 1) >> 1;
+            if (prefijo[mid] <= presupuesto) {{
+                lo = mid;
+            }} else {{
+                hi = mid - 1;
+            }}
+        }}
+        return lo;
+    }}
+    
+    // Candidatos ordenados tras aplicar Top N: {{ lista, prefijo, limite }}
+    function candidatosTopN(rk, topN) {{
+        var usarTop = !isNaN(topN) && topN > 0;
+        
+        if (usarTop && !rk.ordenados && topN < rk.candidatos.length) {{
+            // Sin orden completo disponible: basta con los N mejores
+            if (!rk.parcial || rk.parcial.n !== topN) {{
+                var top = seleccionarTopN(rk.candidatos, topN);
+                rk.parcial = {{ n: topN, lista: top, prefijo: acumularCapex(top) }};
+            }}
+            return {{ lista: rk.parcial.lista, prefijo: rk.parcial.prefijo, limite: rk.parcial.lista.length }};
+        }}
+        
+        ordenarRankingCompleto(rk);
+        return {{
+            lista: rk.ordenados,
+            prefijo: rk.prefijo,
+            limite: usarTop ? Math.min(topN, rk.ordenados.length) : rk.ordenados.length
+        }};
+    }}
+    
+    // Aplicar Top N y presupuesto sobre el ranking en caché
+    function seleccionarPriorizados(rk, topN, budgetMax) {{
+        var seleccion = candidatosTopN(rk, topN);
+        var limite = seleccion.limite;
+        
+        // Filtro Budget (sumar CAPEX desde ranking #1)
+        if (!isNaN(budgetMax) && budgetMax > 0) {{
+            limite = contarDentroPresupuesto(seleccion.prefijo, limite, budgetMax);
+        }}
+        
+        return seleccion.lista.slice(0, limite);
+    }}
+    
+    // ================================================================
+    // CARTERA ÓPTIMA BAJO PRESUPUESTO
+    // El corte voraz del ranking se detiene en el primer punto que no
+    // cabe y deja presupuesto sin usar. Aquí se resuelve la mochila 0/1
+    // que maximiza las VSS abastecibles con CAPEX total <= presupuesto,
+    // sobre los mismos candidatos (tras Top N). Cada punto entra con su
+    // turbina PAT/Cross Flow de menor CAPEX, la misma que usa el
+    // presupuesto voraz. El cálculo corre en un Web Worker para no
+    // bloquear el mapa con miles de candidatos.
+    // ================================================================
+    var LIMITE_CELDAS_MOCHILA = 200000000; // Celdas máximas de la tabla DP (1 bit por celda)
+    var RESOLUCION_PRESUPUESTO = 100000;    // Pasos de presupuesto en la DP por coste
+    var MAX_ESTADOS_VALOR = 4000000;        // VSS totales máximas para la DP exacta por valor
+    
+    var trabajadorCartera = null;
+    var carteraPendiente = null; // Clave de la petición en curso
+    var carteraOptima = null;    // Último resultado recibido
+    
+    // Código del worker (se serializa a un Blob; no puede usar variables externas).
+    // Devuelve la función de cálculo para poder usarla también sin worker.
+    function codigoTrabajadorCartera() {{
+        // Tabla de decisiones: 1 bit por (item, estado)
+        function crearTabla(n, estados) {{
+            return new Uint32Array(Math.ceil(n * estados / 32));
+        }}
+        
+        // DP por valor: coste mínimo para alcanzar cada total de VSS. Exacta.
+        function mochilaPorValor(capex, valor, presupuesto) {{
+            var n = capex.length, total = 0;
+            for (var i = 0; i < n; i++) total += valor[i];
+            var estados = total + 1;
+            var coste = new Float64Array(estados).fill(Infinity);
+            var tabla = crearTabla(n, estados);
+            coste[0] = 0;
+            for (var i = 0; i < n; i++) {{
+                var v = valor[i], c = capex[i], base = i * estados;
+                for (var s = total; s >= v; s--) {{
+                    var candidato = coste[s - v] + c;
+                    if (candidato < coste[s]) {{
+                        coste[s] = candidato;
+                        tabla[(base + s) >>> 5] |= 1 << ((base + s) & 31);
+                    }}
+                }}
+            }}
+            var mejor = 0;
+            for (var s = total; s > 0; s--) {{
+                if (coste[s] <= presupuesto) {{ mejor = s; break; }}
+            }}
+            var elegidos = [];
+            for (var i = n - 1, s = mejor; i >= 0 && s > 0; i--) {{
+                var pos = i * estados + s;
+                if (tabla[pos >>> 5] & (1 << (pos & 31))) {{
+                    elegidos.push(i);
+                    s -= valor[i];
+                }}
+            }}
+            return elegidos;
+        }}
+        
+        // DP por coste con CAPEX redondeado hacia arriba a la resolución:
+        // la cartera siempre cabe en el presupuesto real.
+        function mochilaPorCoste(capex, valor, presupuesto, pasos) {{
+            var n = capex.length, estados = pasos + 1;
+            var unidad = presupuesto / pasos;
+            var peso = new Int32Array(n);
+            for (var i = 0; i < n; i++) peso[i] = Math.ceil(capex[i] / unidad - 1e-9);
+            var mejorValor = new Float64Array(estados);
+            var tabla = crearTabla(n, estados);
+            for (var i = 0; i < n; i++) {{
+                var w = peso[i], v = valor[i], base = i * estados;
+                for (var s = pasos; s >= w; s--) {{
+                    var candidato = mejorValor[s - w] + v;
+                    if (candidato > mejorValor[s]) {{
+                        mejorValor[s] = candidato;
+                        tabla[(base + s) >>> 5] |= 1 << ((base + s) & 31);
+                    }}
+                }}
+            }}
+            var elegidos = [];
+            for (var i = n - 1, s = pasos; i >= 0 && s > 0; i--) {{
+                var pos = i * estados + s;
+                if (tabla[pos >>> 5] & (1 << (pos & 31))) {{
+                    elegidos.push(i);
+                    s -= peso[i];
+                }}
+            }}
+            return elegidos;
+        }}
+        
+        function resolver(d) {{
+            var n = d.capex.length, total = 0;
+            for (var i = 0; i < n; i++) total += d.valor[i];
+            var elegidos, metodo;
+            if (n * (total + 1) <= d.limiteCeldas && total + 1 <= d.maxEstadosValor) {{
+                elegidos = mochilaPorValor(d.capex, d.valor, d.presupuesto);
+                metodo = 'exacto';
+            }} else {{
+                var pasos = Math.max(1, Math.min(d.resolucion, Math.floor(d.limiteCeldas / Math.max(n, 1)) - 1));
+                elegidos = mochilaPorCoste(d.capex, d.valor, d.presupuesto, pasos);
+                metodo = 'resolucion';
+            }}
+            return {{ clave: d.clave, elegidos: elegidos, metodo: metodo }};
+        }}
         
-        // INFORMACIÓN DEL PUNTO
-        html += '<table>';
-        html += '<tr><td colspan="2" class="header-morado">Información del punto</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">ID</td><td class="row-gris1 col-value">' + punto.id + '</td></tr>';
-        html += '<tr><td class="row-gris2 col-label">Municipio</td><td class="row-gris2 col-value">' + punto.municipio + '</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">Departamento</td><td class="row-gris1 col-value">' + punto.departamento + '</td></tr>';
-        html += '<tr><td class="row-gris2 col-label">Región</td><td class="row-gris2 col-value">' + punto.region + '</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">Coordenadas</td><td class="row-gris1 col-value">' + punto.lat.toFixed(6) + ', ' + punto.lon.toFixed(6) + '</td></tr>';
-        html += '<tr><td class="row-gris2 col-label">Capital más cercana</td><td class="row-gris2 col-value">' + punto.capital + ' (' + punto.depto_capital + ')</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">Distancia a capital</td><td class="row-gris1 col-value">' + formatNumber(punto.dist_punto_capital) + ' m</td></tr>';
-        html += '</table>';
+        if (typeof window === 'undefined') {{
+            self.onmessage = function(e) {{ self.postMessage(resolver(e.data)); }};
+        }}
+        return resolver;
+    }}
+    
+    function obtenerTrabajadorCartera() {{
+        if (!trabajadorCartera && typeof Worker !== 'undefined') {{
+            try {{
+                var blob = new Blob(['(' + codigoTrabajadorCartera.toString() + ')();'], {{ type: 'text/javascript' }});
+                trabajadorCartera = new Worker(URL.createObjectURL(blob));
+                trabajadorCartera.onmessage = recibirCarteraOptima;
+                trabajadorCartera.onerror = function(e) {{
+                    e.preventDefault();
+                    fallarCarteraOptima();
+                }};
+            }} catch (error) {{
+                trabajadorCartera = null; // Sin worker (p. ej. bloqueado en file://): hilo principal
+            }}
+        }}
+        return trabajadorCartera;
+    }}
+    
+    function calcularCarteraEnHiloPrincipal(mensaje) {{
+        if (!carteraPendiente || carteraPendiente.clave !== mensaje.clave) return; // Petición obsoleta
+        try {{
+            recibirCarteraOptima({{ data: codigoTrabajadorCartera()(mensaje) }});
+        }} catch (error) {{
+            fallarCarteraOptima();
+        }}
+    }}
+    
+    function resumirCartera(lista) {{
+        var capex = 0, vss = 0;
+        for (var i = 0; i < lista.length; i++) {{
+            capex += lista[i].capex_presupuesto;
+            vss += lista[i].vss_presupuesto;
+        }}
+        return {{ puntos: lista.length, capex: capex, vss: vss }};
+    }}
+    
+    // Devuelve la cartera óptima si ya está calculada para el estado actual;
+    // si no, lanza el cálculo en el worker y devuelve null (se muestra la voraz).
+    function obtenerCarteraOptima(rk, topN, budgetMax, voraz) {{
+        var clave = rk.claveOrden + '|' + topN + '|' + budgetMax;
+        if (carteraOptima && carteraOptima.clave === clave) {{
+            mostrarComparativaCartera(carteraOptima);
+            return carteraOptima.lista;
+        }}
+        if (carteraPendiente && carteraPendiente.clave === clave) {{
+            return null;
+        }}
         
-        // ENERGÍA Y DEMANDA
-        html += '<table>';
-        html += '<tr><td colspan="2" class="header-morado">Energía y Demanda</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">Caudal</td><td class="row-gris1 col-value">' + punto.caudal.toFixed(3) + ' m³/s (' + punto.caudal_cfs.toFixed(2) + ' cfs)</td></tr>';
-        html += '<tr><td class="row-gris2 col-label">Caída hidráulica</td><td class="row-gris2 col-value">' + punto.caida.toFixed(2) + ' m (' + punto.caida_ft.toFixed(2) + ' ft)</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">Pendiente</td><td class="row-gris1 col-value">' + punto.pendiente.toFixed(4) + '</td></tr>';
-        html += '<tr><td class="row-gris2 col-label">Viviendas sin servicio</td><td class="row-gris2 col-value">' + Math.floor(punto.vss) + ' viviendas</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">Zona climática</td><td class="row-gris1 col-value">' + punto.zona_clima + '</td></tr>';
-        html += '<tr><td class="row-gris2 col-label">Potencia pico</td><td class="row-gris2 col-value">' + punto.potencia_pico.toFixed(2) + ' kW/vivienda</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">Turbinas disponibles</td><td class="row-gris1 col-value">' + (punto.turbinas ? punto.turbinas.length : 0) + ' tipo(s)</td></tr>';
-        html += '</table>';
+        // Solo entran puntos que caben solos en el presupuesto y aportan VSS
+        var seleccion = candidatosTopN(rk, topN);
+        var items = [];
+        for (var i = 0; i < seleccion.limite; i++) {{
+            var item = seleccion.lista[i];
+            if (item.capex_presupuesto <= budgetMax && item.vss_presupuesto > 0) items.push(item);
+        }}
+        var capex = new Float64Array(items.length);
+        var valor = new Int32Array(items.length);
+        items.forEach(function(item, i) {{
+            capex[i] = item.capex_presupuesto;
+            valor[i] = item.vss_presupuesto;
+        }});
         
-        // TURBINAS
-        if (punto.turbinas && punto.turbinas.length > 0) {{
-            punto.turbinas.forEach(function(turb, idx) {{
-                html += '<table>';
-                html += '<tr><td colspan="2" class="header-morado">Turbina ' + (idx + 1) + ': ' + turb.tipo.toUpperCase() + '</td></tr>';
-                
-                // Potencias
-                html += '<tr><td class="row-gris1 col-label">Potencia máxima aprovechable</td><td class="row-gris1 col-value">' + turb.potencia_maxima.toFixed(2) + ' kW</td></tr>';
-                html += '<tr><td class="row-gris2 col-label">Potencia para abastecer VSS</td><td class="row-gris2 col-value">' + turb.potencia_abastecer_vss.toFixed(2) + ' kW</td></tr>';
-                html += '<tr><td class="row-gris1 col-label">Potencia usada para costes</td><td class="row-gris1 col-value">' + turb.potencia_usada_costes.toFixed(2) + ' kW</td></tr>';
-                html += '<tr><td class="row-gris2 col-label">VSS abastecidas</td><td class="row-gris2 col-value">' + turb.vss_abastecibles + ' de ' + Math.floor(punto.vss) + '</td></tr>';
-                
-                // Cobertura
-                var cobertura = turb.es_hibrida ? '⚠️ Híbrida recomendada' : '✓ Cobertura completa';
-                html += '<tr><td class="row-gris1 col-label">Cobertura</td><td class="row-gris1 col-value">' + cobertura + '</td></tr>';
-                html += '</table>';
-                
-                // Tabla CAPEX (3 columnas)
-                html += '<table>';
-                html += '<tr><td class="header-rosa">Partida</td><td class="header-rosa">USD</td><td class="header-rosa">COP</td></tr>';
-                html += '<tr><td class="row-gris1">Turbina y generador</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_turbina) + '</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_turbina * tasaCambio) + '</td></tr>';
-                html += '<tr><td class="row-gris2">Otros equipos</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.coste_equipos) + '</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.coste_equipos * tasaCambio) + '</td></tr>';
-                html += '<tr><td class="row-gris1">Obra civil</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_obra_civil) + '</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_obra_civil * tasaCambio) + '</td></tr>';
-                html += '<tr><td class="row-gris2">Instalación y puesta en marcha</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.coste_instalacion) + '</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.coste_instalacion * tasaCambio) + '</td></tr>';
-                html += '<tr><td class="row-gris1">Línea de conexión eléctrica</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_linea) + '</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_linea * tasaCambio) + '</td></tr>';
-                html += '<tr><td class="row-gris2">Costes ambientales</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.coste_ambiental) + '</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.coste_ambiental * tasaCambio) + '</td></tr>';
-                html += '<tr><td class="row-gris1">Transporte</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_transporte) + '</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.coste_transporte * tasaCambio) + '</td></tr>';
-                html += '<tr><td class="row-gris2">Otros costes</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.otros_costes) + '</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.otros_costes * tasaCambio) + '</td></tr>';
-                html += '<tr><td class="header-morado">CAPEX total</td><td class="header-morado" style="text-align:right;">$' + formatNumber(turb.capex_total) + '</td><td class="header-morado" style="text-align:right;">$' + formatNumber(turb.capex_total * tasaCambio) + '</td></tr>';
-                html += '<tr><td class="row-gris1">OPEX Anual (3%)</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.opex) + '</td><td class="row-gris1" style="text-align:right;">$' + formatNumber(turb.opex * tasaCambio) + '</td></tr>';
-                html += '<tr><td class="row-gris2">CAPEX Total / VSS</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.capex_por_vss) + '</td><td class="row-gris2" style="text-align:right;">$' + formatNumber(turb.capex_por_vss * tasaCambio) + '</td></tr>';
-                html += '</table>';
-            }});
+        // Una petición anterior aún en curso queda obsoleta: reiniciar el worker
+        if (carteraPendiente && trabajadorCartera) {{
+            trabajadorCartera.terminate();
+            trabajadorCartera = null;
+        }}
+        carteraPendiente = {{ clave: clave, items: items, voraz: voraz, presupuesto: budgetMax, inicio: performance.now() }};
+        var mensaje = {{
+            clave: clave,
+            capex: capex,
+            valor: valor,
+            presupuesto: budgetMax,
+            limiteCeldas: LIMITE_CELDAS_MOCHILA,
+            maxEstadosValor: MAX_ESTADOS_VALOR,
+            resolucion: RESOLUCION_PRESUPUESTO
+        }};
+        var trabajador = obtenerTrabajadorCartera();
+        if (trabajador) {{
+            trabajador.postMessage(mensaje, [capex.buffer, valor.buffer]);
+        }} else {{
+            // Ceder el hilo para que se pinte la cartera voraz antes de la DP
+            setTimeout(function() {{ calcularCarteraEnHiloPrincipal(mensaje); }}, 0);
         }}
         
-        // TABLA DE ATRIBUTOS DEL PUNTO (al final)
-        html += '<table>';
-        html += '<tr><td colspan="2" class="header-morado">Atributos del punto</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">ID</td><td class="row-gris1 col-value">' + punto.id + '</td></tr>';
-        html += '<tr><td class="row-gris2 col-label">Latitud</td><td class="row-gris2 col-value">' + punto.lat.toFixed(6) + '</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">Longitud</td><td class="row-gris1 col-value">' + punto.lon.toFixed(6) + '</td></tr>';
-        html += '<tr><td class="row-gris2 col-label">Caudal (m³/s)</td><td class="row-gris2 col-value">' + punto.caudal.toFixed(3) + '</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">Caudal (cfs)</td><td class="row-gris1 col-value">' + punto.caudal_cfs.toFixed(2) + '</td></tr>';
-        html += '<tr><td class="row-gris2 col-label">Caída (m)</td><td class="row-gris2 col-value">' + punto.caida.toFixed(2) + '</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">Caída (ft)</td><td class="row-gris1 col-value">' + punto.caida_ft.toFixed(2) + '</td></tr>';
-        html += '<tr><td class="row-gris2 col-label">Pendiente</td><td class="row-gris2 col-value">' + punto.pendiente.toFixed(4) + '</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">VSS</td><td class="row-gris1 col-value">' + Math.floor(punto.vss) + '</td></tr>';
-        html += '<tr><td class="row-gris2 col-label">Municipio</td><td class="row-gris2 col-value">' + punto.municipio + '</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">Departamento</td><td class="row-gris1 col-value">' + punto.departamento + '</td></tr>';
-        html += '<tr><td class="row-gris2 col-label">Región</td><td class="row-gris2 col-value">' + punto.region + '</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">Capital cercana</td><td class="row-gris1 col-value">' + punto.capital + '</td></tr>';
-        html += '<tr><td class="row-gris2 col-label">Depto. capital</td><td class="row-gris2 col-value">' + punto.depto_capital + '</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">Distancia capital (m)</td><td class="row-gris1 col-value">' + formatNumber(punto.dist_punto_capital) + '</td></tr>';
-        html += '<tr><td class="row-gris2 col-label">Zona climática</td><td class="row-gris2 col-value">' + punto.zona_clima + '</td></tr>';
-        html += '<tr><td class="row-gris1 col-label">Potencia pico (kW/viv)</td><td class="row-gris1 col-value">' + punto.potencia_pico.toFixed(2) + '</td></tr>';
-        if (ranking !== null) {{
-            html += '<tr><td class="header-rosa">Ranking priorización</td><td class="header-rosa">#' + ranking + '</td></tr>';
+        document.getElementById('comparativa-cartera').style.display = 'block';
+        document.getElementById('comparativa-cartera').innerHTML = '⏳ Calculando cartera óptima (' + items.length + ' candidatos)...';
+        return null;
+    }}
+    
+    function recibirCarteraOptima(e) {{
+        var d = e.data;
+        if (!carteraPendiente || carteraPendiente.clave !== d.clave) return; // Respuesta obsoleta
+        var peticion = carteraPendiente;
+        carteraPendiente = null;
+        
+        var lista = d.elegidos.map(function(i) {{ return peticion.items[i]; }});
+        var resumenVoraz = resumirCartera(peticion.voraz);
+        var resumenOptimo = resumirCartera(lista);
+        // Con la DP por resolución el óptimo es aproximado: nunca peor que la voraz
+        if (resumenOptimo.vss < resumenVoraz.vss) {{
+            lista = peticion.voraz.slice();
+            resumenOptimo = resumenVoraz;
         }}
+        lista.sort(compararCandidatos);
+        
+        carteraOptima = {{
+            clave: d.clave,
+            lista: lista,
+            metodo: d.metodo,
+            presupuesto: peticion.presupuesto,
+            voraz: resumenVoraz,
+            optima: resumenOptimo,
+            duracion: performance.now() - peticion.inicio
+        }};
+        actualizar();
+    }}
+    
+    // Si la DP falla (error o memoria agotada) se queda la cartera voraz y se
+    // reinicia el worker; el panel lo indica en lugar de seguir "calculando"
+    function fallarCarteraOptima() {{
+        if (trabajadorCartera) {{
+            trabajadorCartera.terminate();
+            trabajadorCartera = null;
+        }}
+        if (!carteraPendiente) return;
+        var peticion = carteraPendiente;
+        carteraPendiente = null;
+        
+        var resumenVoraz = resumirCartera(peticion.voraz);
+        carteraOptima = {{
+            clave: peticion.clave,
+            lista: peticion.voraz.slice().sort(compararCandidatos),
+            metodo: 'voraz',
+            presupuesto: peticion.presupuesto,
+            voraz: resumenVoraz,
+            optima: resumenVoraz,
+            duracion: performance.now() - peticion.inicio
+        }};
+        actualizar();
+    }}
+    
+    function mostrarComparativaCartera(cartera) {{
+        var fmt = function(x) {{ return Math.round(x).toLocaleString('es-CO'); }};
+        var v = cartera.voraz, o = cartera.optima;
+        var html = '<table style="width: 100%; border-collapse: collapse; font-size: 10px;">';
+        html += '<tr><th></th><th style="text-align: right;">Voraz</th><th style="text-align: right;">Óptima</th></tr>';
+        html += '<tr><td>Puntos</td><td style="text-align: right;">' + v.puntos + '</td><td style="text-align: right;">' + o.puntos + '</td></tr>';
+        html += '<tr><td>VSS abastecibles</td><td style="text-align: right;">' + fmt(v.vss) + '</td><td style="text-align: right;"><b>' + fmt(o.vss) + '</b></td></tr>';
+        html += '<tr><td>CAPEX (USD)</td><td style="text-align: right;">' + fmt(v.capex) + '</td><td style="text-align: right;">' + fmt(o.capex) + '</td></tr>';
+        html += '<tr><td>Sin usar (USD)</td><td style="text-align: right;">' + fmt(cartera.presupuesto - v.capex) + '</td><td style="text-align: right;">' + fmt(cartera.presupuesto - o.capex) + '</td></tr>';
         html += '</table>';
-        
-        html += '</body></html>';
-        
-        // Descargar como archivo .doc
-        var blob = new Blob(['\\ufeff' + html], {{ type: 'application/msword' }});
-        var link = document.createElement('a');
-        var fecha = new Date();
-        var nombreArchivo = 'Informe_Punto_' + punto.id + '_' + 
-                          fecha.getFullYear() + 
-                          String(fecha.getMonth()+1).padStart(2,'0') + 
-                          String(fecha.getDate()).padStart(2,'0') + '.doc';
-        
-        link.href = URL.createObjectURL(blob);
-        link.download = nombreArchivo;
-        document.body.appendChild(link);
-        link.click();
-        document.body.removeChild(link);
-        URL.revokeObjectURL(link.href);
+        html += '<div style="font-size: 9px; color: #666; margin-top: 4px;">' +
+                (cartera.metodo === 'exacto' ? 'Óptimo exacto' :
+                 cartera.metodo === 'voraz' ? '⚠️ Error al calcular el óptimo: se muestra la voraz' :
+                 'Óptimo a resolución de ' + fmt(cartera.presupuesto / RESOLUCION_PRESUPUESTO) + ' USD') +
+                ' · ' + Math.round(cartera.duracion) + ' ms</div>';
+        var panel = document.getElementById('comparativa-cartera');
+        panel.innerHTML = html;
+        panel.style.display = 'block';
     }}
-
+    
+    function ocultarComparativaCartera() {{
+        var panel = document.getElementById('comparativa-cartera');
+        panel.style.display = 'none';
+        panel.innerHTML = '';
+    }}
+    
     function priorizar() {{
         // Verificar que PAT o Cross Flow estén seleccionados
         var patSeleccionado = document.getElementById('turb-pat').checked;
@@ -2282,8 +5055,10 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
             return;
         }}
         
-        // Activar modo priorización
+        // Activar modo priorización (ranking con todos los puntos)
         modoPriorizacion = true;
+        todosLosBloques = true;
+        sincronizarBloques();
         
         // Mostrar botón despriorizar, multiescenario y filtros de priorización
         document.getElementById('btn-despriorizar').style.display = 'block';
@@ -2295,10 +5070,14 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
     }}
     
     function despriorizar() {{
-        // Desactivar modo priorización
+        // Desactivar modo priorización (vuelven a cargarse solo los bloques visibles)
         modoPriorizacion = false;
-        rankingPuntos = [];
+        todosLosBloques = false;
+        sincronizarBloques();
+        rankingPuntos = new Int32Array(puntos.length);
+        paretoPuntos = new Uint8Array(puntos.length);
         puntosPriorizadosCompletos = [];
+        cacheRanking = null;
         
         // Ocultar botón despriorizar, multiescenario y filtros de priorización
         document.getElementById('btn-despriorizar').style.display = 'none';
@@ -2309,6 +5088,14 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
         document.getElementById('ranking-top').value = '';
         document.getElementById('budget-max').value = '';
         document.getElementById('ranking-colores').checked = false;
+        document.getElementById('budget-optimo').checked = false;
+        document.getElementById('pareto-resaltar').checked = false;
+        CRITERIOS_RANKING.forEach(function(criterio) {{
+            document.getElementById('peso-' + criterio.id).value = criterio.id === 'capex' ? '1' : '0';
+        }});
+        carteraOptima = null;
+        carteraPendiente = null;
+        ocultarComparativaCartera();
         
         // Aplicar filtros normales
         actualizar();
@@ -2323,7 +5110,152 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
     // Variable global para la gráfica
     var graficaMultiescenario = null;
     
+    // ================================================================
+    // CURVA MULTIESCENARIO EN CACHÉ
+    // Los acumulados se calculan una vez por estado del ranking. Para
+    // dibujar, la curva se diezma con LTTB (Largest-Triangle-Three-
+    // Buckets): cada punto dibujado es un punto real del ranking, así que
+    // el tooltip muestra sus datos exactos. Colores y radios van en arrays
+    // precalculados en lugar de callbacks por punto.
+    // ================================================================
+    var MAX_PUNTOS_GRAFICA = 1500;
+    var cacheCurva = null;
+    
+    function obtenerCurvaMultiescenario() {{
+        var lista = puntosPriorizadosCompletos;
+        var clave = (cacheRanking ? cacheRanking.claveOrden : '') + '|' + lista.length + '|' +
+                    (document.getElementById('pareto-resaltar').checked ? 'pareto' : '');
+        if (cacheCurva && cacheCurva.clave === clave && cacheCurva.lista === lista) {{
+            return cacheCurva;
+        }}
+        
+        // puntosPriorizadosCompletos ya está en orden de ranking
+        var n = lista.length;
+        var vssAcumulado = new Float64Array(n);
+        var capexAcumulado = new Float64Array(n);
+        var esPareto = new Uint8Array(n);
+        var vss = 0, capex = 0;
+        for (var i = 0; i < n; i++) {{
+            var turbinaUsada = lista[i].turbina;
+            vss += turbinaUsada ? turbinaUsada.vss_abastecibles : 0;
+            capex += turbinaUsada ? turbinaUsada.capex_total : 0;
+            vssAcumulado[i] = vss;
+            capexAcumulado[i] = capex;
+            esPareto[i] = esPuntoPareto(lista[i].punto.id) ? 1 : 0;
+        }}
+        
+        cacheCurva = {{
+            clave: clave,
+            lista: lista,
+            total: n,
+            vssAcumulado: vssAcumulado,
+            capexAcumulado: capexAcumulado,
+            esPareto: esPareto
+        }};
+        cacheCurva.serie = construirSerieGrafica(cacheCurva);
+        return cacheCurva;
+    }}
+    
+    // Índices LTTB de una serie (x, y); conserva siempre el primero y el último
+    function diezmarLTTB(x, y, n, umbral) {{
+        if (umbral >= n || umbral < 3) {{
+            var todos = new Int32Array(n);
+            for (var i = 0; i < n; i++) todos[i] = i;
+            return todos;
+        }}
+        var indices = new Int32Array(umbral);
+        var tamCubo = (n - 2) / (umbral - 2);
+        var a = 0, k = 0;
+        indices[k++] = 0;
+        for (var c = 0; c < umbral - 2; c++) {{
+            // Media del cubo siguiente
+            var iniSig = Math.floor((c + 1) * tamCubo) + 1;
+            var finSig = Math.min(Math.floor((c + 2) * tamCubo) + 1, n);
+            var mx = 0, my = 0;
+            for (var j = iniSig; j < finSig; j++) {{ mx += x[j]; my += y[j]; }}
+            var m = finSig - iniSig || 1;
+            mx /= m; my /= m;
+            
+            // Punto del cubo actual con mayor área de triángulo
+            var ini = Math.floor(c * tamCubo) + 1;
+            var fin = Math.floor((c + 1) * tamCubo) + 1;
+            var maxArea = -1, elegido = ini;
+            for (var j = ini; j < fin; j++) {{
+                var area = Math.abs((x[a] - mx) * (y[j] - y[a]) - (x[a] - x[j]) * (my - y[a]));
+                if (area > maxArea) {{ maxArea = area; elegido = j; }}
+            }}
+            indices[k++] = elegido;
+            a = elegido;
+        }}
+        indices[k++] = n - 1;
+        return indices;
+    }}
+    
+    function construirSerieGrafica(curva) {{
+        var n = curva.total;
+        var indices = Array.prototype.slice.call(diezmarLTTB(curva.capexAcumulado, curva.vssAcumulado, n, MAX_PUNTOS_GRAFICA));
+        
+        // Los puntos del frente de Pareto se dibujan siempre
+        if (indices.length < n) {{
+            var incluidos = new Uint8Array(n);
+            indices.forEach(function(i) {{ incluidos[i] = 1; }});
+            for (var i = 0; i < n; i++) {{
+                if (curva.esPareto[i] && !incluidos[i]) indices.push(i);
+            }}
+            indices.sort(function(a, b) {{ return a - b; }});
+        }}
+        
+        var datos = new Array(indices.length);
+        var relleno = new Array(indices.length);
+        var borde = new Array(indices.length);
+        var radio = new Array(indices.length);
+        for (var k = 0; k < indices.length; k++) {{
+            var i = indices[k];
+            var siguiente = k + 1 < indices.length ? indices[k + 1] : n;
+            datos[k] = {{
+                x: curva.capexAcumulado[i],
+                y: curva.vssAcumulado[i],
+                indice: i,
+                representa: siguiente - i
+            }};
+            if (curva.esPareto[i]) {{
+                // Frente de Pareto en dorado
+                relleno[k] = 'rgba(255, 215, 0, 0.95)';
+                borde[k] = '#B8860B';
+                radio[k] = 6;
+            }} else {{
+                // Gradiente de azul oscuro a azul claro según el ranking
+                var t = i / (n - 1 || 1);
+                var r = Math.round(13 + t * (173 - 13));
+                var g = Math.round(59 + t * (216 - 59));
+                var b = Math.round(102 + t * (230 - 102));
+                relleno[k] = 'rgba(' + r + ',' + g + ',' + b + ', 0.8)';
+                borde[k] = 'rgb(' + r + ',' + g + ',' + b + ')';
+                radio[k] = 4;
+            }}
+        }}
+        return {{ datos: datos, relleno: relleno, borde: borde, radio: radio }};
+    }}
+    
+    // Datos exactos de un punto de la curva (para el tooltip)
+    function detallePuntoCurva(curva, i) {{
+        var item = curva.lista[i];
+        var turbinaUsada = item.turbina;
+        return {{
+            ranking: item.ranking,
+            municipio: item.punto.municipio,
+            turbina: turbinaUsada ? turbinaUsada.tipo : 'N/A',
+            vssIndividual: turbinaUsada ? turbinaUsada.vss_abastecibles : 0,
+            capexIndividual: turbinaUsada ? turbinaUsada.capex_total : 0,
+            pareto: curva.esPareto[i] === 1
+        }};
+    }}
+    
     function mostrarAnalisisMultiescenario() {{
+        if (modoPriorizacion) {{
+            obtenerResultadoFiltrado();
+            obtenerRankingCompleto();
+        }}
         if (!modoPriorizacion || puntosPriorizadosCompletos.length === 0) {{
             alert('⚠️ No hay puntos priorizados para analizar.\\n\\nPrimero activa la priorización y asegúrate de que hay puntos visibles.');
             return;
@@ -2332,47 +5264,17 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
         // Obtener la tasa de cambio actual
         var tasaCambio = parseFloat(document.getElementById('tasa-cambio').value) || 3711.71;
         
-        // Ordenar puntos por ranking (de menor a mayor = mejor a peor)
-        var puntosOrdenados = puntosPriorizadosCompletos.slice().sort(function(a, b) {{
-            return a.ranking - b.ranking;
-        }});
-        
-        // Calcular acumulados
-        var datosGrafica = [];
-        var vssAcumulado = 0;
-        var capexAcumulado = 0;
-        
-        puntosOrdenados.forEach(function(item, index) {{
-            var p = item.punto;
-            var turbinaUsada = item.turbina;
-            
-            // Obtener VSS abastecibles del punto
-            var vssAbastecibles = turbinaUsada ? turbinaUsada.vss_abastecibles : 0;
-            
-            // Obtener CAPEX de la turbina
-            var capexPunto = turbinaUsada ? turbinaUsada.capex_total : 0;
-            
-            // Acumular
-            vssAcumulado += vssAbastecibles;
-            capexAcumulado += capexPunto;
-            
-            datosGrafica.push({{
-                ranking: item.ranking,
-                puntoId: p.id,
-                municipio: p.municipio,
-                vss: vssAbastecibles,
-                capex: capexPunto,
-                vssAcumulado: vssAcumulado,
-                capexAcumulado: capexAcumulado,
-                turbina: turbinaUsada ? turbinaUsada.tipo : 'N/A'
-            }});
-        }});
-        
-        // Actualizar estadísticas
-        document.getElementById('stat-total-puntos').textContent = puntosOrdenados.length;
-        document.getElementById('stat-total-vss').textContent = formatNumber(vssAcumulado);
-        document.getElementById('stat-total-capex').textContent = '$' + formatNumber(capexAcumulado);
-        var costoPromedio = vssAcumulado > 0 ? Math.round(capexAcumulado / vssAcumulado) : 0;
+        // Curva acumulada en caché para el estado actual del ranking
+        var curva = obtenerCurvaMultiescenario();
+        
+        // Actualizar estadísticas (siempre sobre la curva completa)
+        var n = curva.total;
+        var vssTotal = n > 0 ? curva.vssAcumulado[n - 1] : 0;
+        var capexTotal = n > 0 ? curva.capexAcumulado[n - 1] : 0;
+        document.getElementById('stat-total-puntos').textContent = n;
+        document.getElementById('stat-total-vss').textContent = formatNumber(vssTotal);
+        document.getElementById('stat-total-capex').textContent = '$' + formatNumber(capexTotal);
+        var costoPromedio = vssTotal > 0 ? Math.round(capexTotal / vssTotal) : 0;
         document.getElementById('stat-costo-vss').textContent = '$' + formatNumber(costoPromedio);
         
         // Crear la gráfica
@@ -2383,56 +5285,24 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
             graficaMultiescenario.destroy();
         }}
         
-        // Preparar datos para Chart.js
-        var labels = datosGrafica.map(function(d) {{ return '#' + d.ranking; }});
-        var dataVSS = datosGrafica.map(function(d) {{ return d.vssAcumulado; }});
-        var dataCAPEX = datosGrafica.map(function(d) {{ return d.capexAcumulado; }});
-        
-        // Crear datos para gráfica de dispersión (scatter)
-        var scatterData = datosGrafica.map(function(d) {{
-            return {{
-                x: d.capexAcumulado,
-                y: d.vssAcumulado,
-                ranking: d.ranking,
-                municipio: d.municipio,
-                turbina: d.turbina,
-                vssIndividual: d.vss,
-                capexIndividual: d.capex
-            }};
-        }});
+        var serie = curva.serie;
+        var diezmada = serie.datos.length < n;
         
         graficaMultiescenario = new Chart(ctx, {{
             type: 'scatter',
             data: {{
                 datasets: [{{
-                    label: 'Acumulado VSS vs CAPEX',
-                    data: scatterData,
-                    backgroundColor: function(context) {{
-                        var index = context.dataIndex;
-                        var total = context.dataset.data.length;
-                        // Gradiente de azul oscuro a azul claro según el ranking
-                        var t = index / (total - 1 || 1);
-                        var r = Math.round(13 + t * (173 - 13));
-                        var g = Math.round(59 + t * (216 - 59));
-                        var b = Math.round(102 + t * (230 - 102));
-                        return 'rgba(' + r + ',' + g + ',' + b + ', 0.8)';
-                    }},
-                    borderColor: function(context) {{
-                        var index = context.dataIndex;
-                        var total = context.dataset.data.length;
-                        var t = index / (total - 1 || 1);
-                        var r = Math.round(13 + t * (173 - 13));
-                        var g = Math.round(59 + t * (216 - 59));
-                        var b = Math.round(102 + t * (230 - 102));
-                        return 'rgb(' + r + ',' + g + ',' + b + ')';
-                    }},
+                    label: 'Acumulado VSS vs CAPEX' + (diezmada ? ' (' + serie.datos.length + ' de ' + n + ' puntos)' : ''),
+                    data: serie.datos,
+                    backgroundColor: serie.relleno,
+                    borderColor: serie.borde,
                     borderWidth: 1,
-                    pointRadius: 4,
+                    pointRadius: serie.radio,
                     pointHoverRadius: 6
                 }},
                 {{
                     label: 'Línea de tendencia',
-                    data: scatterData,
+                    data: serie.datos,
                     type: 'line',
                     borderColor: 'rgba(52, 152, 219, 0.5)',
                     borderWidth: 2,
@@ -2444,6 +5314,7 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
             options: {{
                 responsive: true,
                 maintainAspectRatio: false,
+                animation: diezmada ? false : undefined,
                 plugins: {{
                     title: {{
                         display: true,
@@ -2454,14 +5325,19 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                     tooltip: {{
                         callbacks: {{
                             label: function(context) {{
-                                var punto = context.raw;
-                                return [
-                                    'Ranking: #' + punto.ranking,
+                                // Datos exactos del punto original representado
+                                var punto = detallePuntoCurva(curva, context.raw.indice);
+                                var lineas = [
+                                    'Ranking: #' + punto.ranking + (punto.pareto ? ' (Pareto)' : ''),
                                     'Municipio: ' + punto.municipio,
                                     'Turbina: ' + punto.turbina,
                                     'VSS: ' + punto.vssIndividual.toLocaleString(),
                                     'CAPEX: $' + punto.capexIndividual.toLocaleString()
                                 ];
+                                if (context.raw.representa > 1) {{
+                                    lineas.push('Representa ' + context.raw.representa + ' puntos del ranking');
+                                }}
+                                return lineas;
                             }}
                         }},
                         backgroundColor: 'rgba(44, 62, 80, 0.95)',
@@ -2532,39 +5408,273 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
         }}
     }}
     
-    function descargarDatos() {{
-        var cmin = parseFloat(document.getElementById('caudal-min').value);
-        var cmax = parseFloat(document.getElementById('caudal-max').value);
-        var pmin = parseFloat(document.getElementById('pend-min').value);
-        var vssMin = parseInt(document.getElementById('vss-min').value);
-        
-        // Obtener tipos de turbina seleccionados
-        var turbinasSeleccionadas = [];
-        if (document.getElementById('turb-francis').checked) turbinasSeleccionadas.push('Francis');
-        if (document.getElementById('turb-pat').checked) turbinasSeleccionadas.push('PAT');
-        if (document.getElementById('turb-pelton').checked) turbinasSeleccionadas.push('Pelton');
-        if (document.getElementById('turb-kaplan').checked) turbinasSeleccionadas.push('Kaplan');
-        if (document.getElementById('turb-lowhead').checked) turbinasSeleccionadas.push('Low Head');
-        if (document.getElementById('turb-turgo').checked) turbinasSeleccionadas.push('Turgo');
-        if (document.getElementById('turb-crossflow').checked) turbinasSeleccionadas.push('Cross Flow');
-        
-        // Obtener regiones seleccionadas
-        var regionesSeleccionadas = [];
-        if (document.getElementById('reg-pacifico').checked) regionesSeleccionadas.push('Región Pacífico');
-        if (document.getElementById('reg-eje-cafetero').checked) regionesSeleccionadas.push('Región Eje Cafetero – Antioquia');
-        if (document.getElementById('reg-centro-sur').checked) regionesSeleccionadas.push('Región Centro Sur');
-        if (document.getElementById('reg-centro-oriente').checked) regionesSeleccionadas.push('Región Centro Oriente');
-        if (document.getElementById('reg-caribe').checked) regionesSeleccionadas.push('Región Caribe');
-        if (document.getElementById('reg-llano').checked) regionesSeleccionadas.push('Región Llano');
-        if (document.getElementById('reg-sin-dato').checked) regionesSeleccionadas.push('');
-        
-        // Obtener CAPEX máximo y tasa de cambio
-        var capexMaxInput = document.getElementById('capex-max').value;
-        var capexMax = (capexMaxInput === '' || capexMaxInput === null) ? null : parseFloat(capexMaxInput);
-        var tasaCambio = parseFloat(document.getElementById('tasa-cambio').value) || 3711.71;
+    // Una fila del CSV por punto visible (cada dato en una columna)
+    function construirFilaCsv(v, priorizacion, tasaCambio) {{
+        var p = v.punto;
         
-        // Crear array de filas para construir el CSV
-        var filas = [];
+        var fila = [];
+        
+        // Si estamos en modo priorización, agregar el ranking como primera columna
+        if (priorizacion) {{
+            fila.push(v.ranking);
+        }}
+        
+        // Columna: ID_Punto
+        fila.push(p.id);
+        
+        // Columna: Latitud
+        fila.push(p.lat.toFixed(6));
+        
+        // Columna: Longitud
+        fila.push(p.lon.toFixed(6));
+        
+        // Columna: Municipio
+        fila.push(p.municipio);
+        
+        // Columna: Departamento
+        fila.push(p.departamento);
+        
+        // Columna: Capital_Mas_Cercana
+        fila.push(p.capital);
+        
+        // Columna: Departamento_Capital
+        fila.push(p.depto_capital);
+        
+        // Columna: Distancia_Punto_a_Capital_m
+        fila.push(p.dist_punto_capital);
+        
+        // Columna: Caudal_m3s
+        fila.push(p.caudal.toFixed(4));
+        
+        // Columna: Caida_Hidraulica_m
+        fila.push(p.caida.toFixed(2));
+        
+        // Columna: Pendiente
+        fila.push(p.pendiente.toFixed(4));
+        
+        // Columna: VSS_Viviendas_Sin_Servicio
+        fila.push(p.vss);
+        
+        // Columna: Zona_Climatica
+        fila.push(p.zona_clima);
+        
+        // Columna: Potencia_Pico_kW
+        fila.push(p.potencia_pico.toFixed(2));
+        
+        // Turbina recomendada (menor CAPEX), ya calculada en el resultado
+        var mejorTurbina = v.turbina;
+        var listaTurbinas = '';
+        
+        if (mejorTurbina) {{
+            // Crear lista de todas las turbinas
+            listaTurbinas = p.turbinas.map(function(t) {{ return t.tipo; }}).join(' | ');
+            
+            // Columna: Num_Turbinas_Aplicables
+            fila.push(p.turbinas.length);
+            
+            // Columna: Turbinas_Aplicables
+            fila.push(listaTurbinas);
+            
+            // Columna: Turbina_Recomendada
+            fila.push(mejorTurbina.tipo);
+            
+            // Columna: Potencia_Maxima_Aprovechable_kW
+            fila.push(mejorTurbina.potencia_maxima.toFixed(2));
+            
+            // Columna: Potencia_Abastecer_VSS_kW
+            fila.push(mejorTurbina.potencia_abastecer_vss.toFixed(2));
+            
+            // Columna: Potencia_Usada_Costes_kW
+            fila.push(mejorTurbina.potencia_usada_costes.toFixed(2));
+            
+            // Columna: Es_Opcion_Hibrida
+            fila.push(mejorTurbina.es_hibrida ? 'SÍ' : 'NO');
+            
+            // Columna: VSS_Abastecibles
+            fila.push(mejorTurbina.vss_abastecibles);
+            
+            // Columnas: CAPEX USD (8 partidas + total)
+            fila.push(mejorTurbina.coste_turbina.toFixed(2));
+            fila.push(mejorTurbina.coste_equipos.toFixed(2));
+            fila.push(mejorTurbina.coste_obra_civil.toFixed(2));
+            fila.push(mejorTurbina.coste_instalacion.toFixed(2));
+            fila.push(mejorTurbina.coste_linea.toFixed(2));
+            fila.push(mejorTurbina.coste_ambiental.toFixed(2));
+            fila.push(mejorTurbina.coste_transporte.toFixed(2));
+            fila.push(mejorTurbina.otros_costes.toFixed(2));
+            fila.push(mejorTurbina.capex_total.toFixed(2));
+            
+            // Columnas: CAPEX COP (8 partidas + total)
+            fila.push((mejorTurbina.coste_turbina * tasaCambio).toFixed(2));
+            fila.push((mejorTurbina.coste_equipos * tasaCambio).toFixed(2));
+            fila.push((mejorTurbina.coste_obra_civil * tasaCambio).toFixed(2));
+            fila.push((mejorTurbina.coste_instalacion * tasaCambio).toFixed(2));
+            fila.push((mejorTurbina.coste_linea * tasaCambio).toFixed(2));
+            fila.push((mejorTurbina.coste_ambiental * tasaCambio).toFixed(2));
+            fila.push((mejorTurbina.coste_transporte * tasaCambio).toFixed(2));
+            fila.push((mejorTurbina.otros_costes * tasaCambio).toFixed(2));
+            fila.push((mejorTurbina.capex_total * tasaCambio).toFixed(2));
+            
+            // Columnas: OPEX
+            fila.push(mejorTurbina.opex.toFixed(2));
+            fila.push((mejorTurbina.opex * tasaCambio).toFixed(2));
+            
+            // Columnas: Ratio por kW
+            var costoKw = mejorTurbina.capex_total / mejorTurbina.potencia_usada_costes;
+            fila.push(costoKw.toFixed(2));
+            fila.push((costoKw * tasaCambio).toFixed(2));
+            
+            // Columnas: CAPEX por VSS
+            fila.push(mejorTurbina.capex_por_vss.toFixed(2));
+            fila.push((mejorTurbina.capex_por_vss * tasaCambio).toFixed(2));
+            
+        }} else {{
+            // Sin turbinas aplicables - rellenar columnas con valores por defecto
+            fila.push(0); // Num_Turbinas_Aplicables
+            fila.push('Sin turbinas aplicables'); // Turbinas_Aplicables
+            fila.push('N/A'); // Turbina_Recomendada
+            fila.push(0); // Potencia_Maxima_Aprovechable_kW
+            fila.push(0); // Potencia_Abastecer_VSS_kW
+            fila.push(0); // Potencia_Usada_Costes_kW
+            fila.push('N/A'); // Es_Opcion_Hibrida
+            fila.push(0); // VSS_Abastecibles
+            
+            // Rellenar todas las columnas de costes con 0
+            for (var i = 0; i < 24; i++) {{
+                fila.push(0);
+            }}
+        }}
+        
+        return fila;
+    }}
+    
+    // ================================================================
+    // EXPORTACIÓN CSV POR BLOQUES
+    // En lugar de unir todas las filas en un único string, el CSV se
+    // escribe en bloques de FILAS_POR_BLOQUE_CSV filas: el hilo principal
+    // construye las filas de un bloque, un Web Worker las convierte a
+    // texto UTF-8 y el resultado se añade como una parte más del Blob.
+    // Solo hay un bloque de filas en memoria a la vez.
+    // ================================================================
+    var FILAS_POR_BLOQUE_CSV = 5000;
+    var exportacionCsvEnCurso = false;
+    var trabajadorCsv = null;
+    
+    // Filas -> texto CSV (separado por PUNTO Y COMA para Excel español)
+    function filasACsv(filas) {{
+        return filas.map(function(fila) {{
+            return fila.map(function(valor) {{
+                // Si el valor contiene punto y coma, encerrarlo entre comillas
+                if (typeof valor === 'string' && (valor.includes(';') || valor.includes('|'))) {{
+                    return '"' + valor + '"';
+                }}
+                return valor;
+            }}).join(';');
+        }}).join('\\n');
+    }}
+    
+    // Código del worker: recibe las filas de un bloque y devuelve sus bytes
+    function codigoTrabajadorCsv() {{
+        var codificador = new TextEncoder();
+        self.onmessage = function(e) {{
+            var texto = filasACsv(e.data.filas);
+            var bytes = codificador.encode(e.data.primero ? texto : '\\n' + texto);
+            self.postMessage({{ bytes: bytes }}, [bytes.buffer]);
+        }};
+    }}
+    
+    function obtenerTrabajadorCsv() {{
+        if (!trabajadorCsv && typeof Worker !== 'undefined') {{
+            var fuente = filasACsv.toString() + '\\n(' + codigoTrabajadorCsv.toString() + ')();';
+            trabajadorCsv = new Worker(URL.createObjectURL(new Blob([fuente], {{ type: 'text/javascript' }})));
+        }}
+        return trabajadorCsv;
+    }}
+    
+    function mostrarProgresoCsv(hechas, total) {{
+        var porcentaje = total > 0 ? Math.round(100 * hechas / total) : 100;
+        document.getElementById('progreso-csv').style.display = 'block';
+        document.getElementById('progreso-csv-barra').style.width = porcentaje + '%';
+        document.getElementById('progreso-csv-texto').textContent =
+            '📥 Generando CSV: ' + formatNumber(hechas) + ' de ' + formatNumber(total) + ' filas (' + porcentaje + '%)';
+    }}
+    
+    function ocultarProgresoCsv() {{
+        document.getElementById('progreso-csv').style.display = 'none';
+    }}
+    
+    function exportarCsvPorBloques(encabezados, resultado, tasaCambio, alTerminar) {{
+        var visibles = resultado.visibles;
+        var total = visibles.length;
+        var partes = ['\\uFEFF']; // BOM UTF-8 para que Excel lo reconozca correctamente
+        var siguiente = 0;
+        var trabajador = obtenerTrabajadorCsv();
+        exportacionCsvEnCurso = true;
+        mostrarProgresoCsv(0, total);
+        
+        function siguienteBloque() {{
+            var primero = siguiente === 0;
+            var fin = Math.min(siguiente + FILAS_POR_BLOQUE_CSV, total);
+            var filas = primero ? [encabezados] : [];
+            for (var i = siguiente; i < fin; i++) {{
+                filas.push(construirFilaCsv(visibles[i], resultado.priorizacion, tasaCambio));
+            }}
+            siguiente = fin;
+            return {{ filas: filas, primero: primero }};
+        }}
+        
+        function terminar() {{
+            exportacionCsvEnCurso = false;
+            ocultarProgresoCsv();
+            alTerminar(new Blob(partes, {{ type: 'text/csv;charset=utf-8;' }}));
+        }}
+        
+        function bloqueListo(parte) {{
+            partes.push(parte);
+            mostrarProgresoCsv(siguiente, total);
+            if (siguiente < total) {{
+                enviar();
+            }} else {{
+                terminar();
+            }}
+        }}
+        
+        function enviar() {{
+            var bloque = siguienteBloque();
+            if (trabajador) {{
+                trabajador.postMessage(bloque);
+            }} else {{
+                // Sin Web Workers: codificar aquí y ceder el hilo entre bloques
+                var texto = filasACsv(bloque.filas);
+                setTimeout(function() {{ bloqueListo(bloque.primero ? texto : '\\n' + texto); }}, 0);
+            }}
+        }}
+        
+        if (trabajador) {{
+            trabajador.onmessage = function(e) {{ bloqueListo(e.data.bytes); }};
+            trabajador.onerror = function() {{
+                exportacionCsvEnCurso = false;
+                ocultarProgresoCsv();
+                trabajadorCsv = null;
+                alert('❌ Error al generar el CSV');
+            }};
+        }}
+        enviar();
+    }}
+    
+    function descargarDatos() {{
+        // Mismos filtros que el mapa, pero sobre todos los puntos del país: se cargan
+        // todos los bloques para calcular el resultado y después se vuelve a los de la vista
+        var todosPrevio = todosLosBloques;
+        todosLosBloques = true;
+        var recargados = sincronizarBloques(true);
+        var estado = leerEstadoFiltros();
+        var resultado = obtenerResultadoFiltrado(estado);
+        var tasaCambio = estado.tasaCambio;
+        todosLosBloques = todosPrevio;
+        if (recargados && sincronizarBloques()) {{
+            actualizar();
+        }}
         
         // FILA 1: ENCABEZADOS (cada uno en una columna)
         var encabezados = [
@@ -2617,261 +5727,44 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
         ];
         
         // Si estamos en modo priorización, agregar Ranking como primera columna
-        if (modoPriorizacion) {{
+        if (resultado.priorizacion) {{
             encabezados.unshift('Ranking');
         }}
         
-        filas.push(encabezados);
-        
-        var count = 0;
-        var filasData = []; // Array temporal para almacenar filas con ranking
+        var count = resultado.visibles.length;
+        if (count === 0) {{
+            alert('No hay puntos visibles para descargar. Ajusta los filtros.');
+            return;
+        }}
+        if (exportacionCsvEnCurso) {{
+            alert('⏳ Ya hay una descarga CSV en curso. Espera a que termine.');
+            return;
+        }}
         
-        // Filtrar y exportar puntos (CADA PUNTO = UNA FILA)
-        puntos.forEach(function(p) {{
-            var pasaCaudal = p.caudal > cmin && p.caudal < cmax;
-            var pasaPendiente = p.pendiente > pmin;
-            var pasaVss = p.vss >= vssMin;
-            
-            // Verificar si la región del punto está seleccionada
-            var pasaRegion = regionesSeleccionadas.includes(p.region);
+        // Escribir el CSV por bloques (el navegador guarda las partes del Blob)
+        exportarCsvPorBloques(encabezados, resultado, tasaCambio, function(blob) {{
+            // Crear y descargar archivo CSV
+            var link = document.createElement('a');
+            var url = URL.createObjectURL(blob);
             
-            // Verificar si el punto tiene al menos una turbina seleccionada
-            var tieneTurbinaSeleccionada = false;
-            if (p.turbinas && p.turbinas.length > 0) {{
-                for (var i = 0; i < p.turbinas.length; i++) {{
-                    if (turbinasSeleccionadas.includes(p.turbinas[i].tipo)) {{
-                        tieneTurbinaSeleccionada = true;
-                        break;
-                    }}
-                }}
-            }}
+            var fecha = new Date().toISOString().slice(0,10).replace(/-/g,'');
+            var nombreArchivo = resultado.priorizacion ? 
+                'priorizacion_hidroelectrica_' + fecha + '_' + count + 'puntos.csv' :
+                'puntos_hidroelectricos_' + fecha + '_' + count + 'puntos.csv';
             
-            // Verificar CAPEX
-            var pasaCapex = true;
-            if (capexMax !== null && p.turbinas && p.turbinas.length > 0) {{
-                pasaCapex = false;
-                for (var i = 0; i < p.turbinas.length; i++) {{
-                    if (p.turbinas[i].capex_total <= capexMax) {{
-                        pasaCapex = true;
-                        break;
-                    }}
-                }}
-            }}
+            link.setAttribute('href', url);
+            link.setAttribute('download', nombreArchivo);
+            link.style.visibility = 'hidden';
+            document.body.appendChild(link);
+            link.click();
+            document.body.removeChild(link);
             
-            // En modo priorización, verificar que el punto tenga ranking asignado
-            if (modoPriorizacion && !rankingPuntos[p.id]) {{
-                return; // Saltar este punto si no tiene ranking
-            }}
+            var mensaje = resultado.priorizacion ?
+                '✓ Descargados ' + count + ' puntos PRIORIZADOS\\n\\nOrdenados por Ranking (mejor a peor).\\nLa columna Ranking indica la posición.\\nTurbinas: solo PAT y Cross Flow.\\n\\nArchivo: ' + nombreArchivo :
+                '✓ Descargados ' + count + ' puntos (cada punto = 1 fila)\\n\\nCada columna tiene un dato diferente.\\nLa turbina mostrada es la MÁS ECONÓMICA.\\nCostes calculados con potencia para abastecer VSS.\\nSe indica si requiere opción híbrida.\\n\\nArchivo: ' + nombreArchivo;
             
-            if (pasaCaudal && pasaPendiente && pasaVss && pasaRegion && tieneTurbinaSeleccionada && pasaCapex) {{
-                
-                // Crear FILA para este punto (cada dato en una columna)
-                var fila = [];
-                
-                // Si estamos en modo priorización, agregar el ranking como primera columna
-                var rankingActual = null;
-                if (modoPriorizacion) {{
-                    rankingActual = rankingPuntos[p.id] || 999999;
-                    fila.push(rankingActual);
-                }}
-                
-                // Columna: ID_Punto
-                fila.push(p.id);
-                
-                // Columna: Latitud
-                fila.push(p.lat.toFixed(6));
-                
-                // Columna: Longitud
-                fila.push(p.lon.toFixed(6));
-                
-                // Columna: Municipio
-                fila.push(p.municipio);
-                
-                // Columna: Departamento
-                fila.push(p.departamento);
-                
-                // Columna: Capital_Mas_Cercana
-                fila.push(p.capital);
-                
-                // Columna: Departamento_Capital
-                fila.push(p.depto_capital);
-                
-                // Columna: Distancia_Punto_a_Capital_m
-                fila.push(p.dist_punto_capital);
-                
-                // Columna: Caudal_m3s
-                fila.push(p.caudal.toFixed(4));
-                
-                // Columna: Caida_Hidraulica_m
-                fila.push(p.caida.toFixed(2));
-                
-                // Columna: Pendiente
-                fila.push(p.pendiente.toFixed(4));
-                
-                // Columna: VSS_Viviendas_Sin_Servicio
-                fila.push(p.vss);
-                
-                // Columna: Zona_Climatica
-                fila.push(p.zona_clima);
-                
-                // Columna: Potencia_Pico_kW
-                fila.push(p.potencia_pico.toFixed(2));
-                
-                // Determinar turbina recomendada (menor CAPEX)
-                var mejorTurbina = null;
-                var listaTurbinas = '';
-                
-                if (p.turbinas && p.turbinas.length > 0) {{
-                    // Crear lista de todas las turbinas
-                    listaTurbinas = p.turbinas.map(function(t) {{ return t.tipo; }}).join(' | ');
-                    
-                    // Encontrar la turbina con menor CAPEX
-                    mejorTurbina = p.turbinas[0];
-                    for (var i = 1; i < p.turbinas.length; i++) {{
-                        if (p.turbinas[i].capex_total < mejorTurbina.capex_total) {{
-                            mejorTurbina = p.turbinas[i];
-                        }}
-                    }}
-                    
-                    // Columna: Num_Turbinas_Aplicables
-                    fila.push(p.turbinas.length);
-                    
-                    // Columna: Turbinas_Aplicables
-                    fila.push(listaTurbinas);
-                    
-                    // Columna: Turbina_Recomendada
-                    fila.push(mejorTurbina.tipo);
-                    
-                    // Columna: Potencia_Maxima_Aprovechable_kW
-                    fila.push(mejorTurbina.potencia_maxima.toFixed(2));
-                    
-                    // Columna: Potencia_Abastecer_VSS_kW
-                    fila.push(mejorTurbina.potencia_abastecer_vss.toFixed(2));
-                    
-                    // Columna: Potencia_Usada_Costes_kW
-                    fila.push(mejorTurbina.potencia_usada_costes.toFixed(2));
-                    
-                    // Columna: Es_Opcion_Hibrida
-                    fila.push(mejorTurbina.es_hibrida ? 'SÍ' : 'NO');
-                    
-                    // Columna: VSS_Abastecibles
-                    fila.push(mejorTurbina.vss_abastecibles);
-                    
-                    // Columnas: CAPEX USD (8 partidas + total)
-                    fila.push(mejorTurbina.coste_turbina.toFixed(2));
-                    fila.push(mejorTurbina.coste_equipos.toFixed(2));
-                    fila.push(mejorTurbina.coste_obra_civil.toFixed(2));
-                    fila.push(mejorTurbina.coste_instalacion.toFixed(2));
-                    fila.push(mejorTurbina.coste_linea.toFixed(2));
-                    fila.push(mejorTurbina.coste_ambiental.toFixed(2));
-                    fila.push(mejorTurbina.coste_transporte.toFixed(2));
-                    fila.push(mejorTurbina.otros_costes.toFixed(2));
-                    fila.push(mejorTurbina.capex_total.toFixed(2));
-                    
-                    // Columnas: CAPEX COP (8 partidas + total)
-                    fila.push((mejorTurbina.coste_turbina * tasaCambio).toFixed(2));
-                    fila.push((mejorTurbina.coste_equipos * tasaCambio).toFixed(2));
-                    fila.push((mejorTurbina.coste_obra_civil * tasaCambio).toFixed(2));
-                    fila.push((mejorTurbina.coste_instalacion * tasaCambio).toFixed(2));
-                    fila.push((mejorTurbina.coste_linea * tasaCambio).toFixed(2));
-                    fila.push((mejorTurbina.coste_ambiental * tasaCambio).toFixed(2));
-                    fila.push((mejorTurbina.coste_transporte * tasaCambio).toFixed(2));
-                    fila.push((mejorTurbina.otros_costes * tasaCambio).toFixed(2));
-                    fila.push((mejorTurbina.capex_total * tasaCambio).toFixed(2));
-                    
-                    // Columnas: OPEX
-                    fila.push(mejorTurbina.opex.toFixed(2));
-                    fila.push((mejorTurbina.opex * tasaCambio).toFixed(2));
-                    
-                    // Columnas: Ratio por kW
-                    var costoKw = mejorTurbina.capex_total / mejorTurbina.potencia_usada_costes;
-                    fila.push(costoKw.toFixed(2));
-                    fila.push((costoKw * tasaCambio).toFixed(2));
-                    
-                    // Columnas: CAPEX por VSS
-                    fila.push(mejorTurbina.capex_por_vss.toFixed(2));
-                    fila.push((mejorTurbina.capex_por_vss * tasaCambio).toFixed(2));
-                    
-                }} else {{
-                    // Sin turbinas aplicables - rellenar columnas con valores por defecto
-                    fila.push(0); // Num_Turbinas_Aplicables
-                    fila.push('Sin turbinas aplicables'); // Turbinas_Aplicables
-                    fila.push('N/A'); // Turbina_Recomendada
-                    fila.push(0); // Potencia_Maxima_Aprovechable_kW
-                    fila.push(0); // Potencia_Abastecer_VSS_kW
-                    fila.push(0); // Potencia_Usada_Costes_kW
-                    fila.push('N/A'); // Es_Opcion_Hibrida
-                    fila.push(0); // VSS_Abastecibles
-                    
-                    // Rellenar todas las columnas de costes con 0
-                    for (var i = 0; i < 24; i++) {{
-                        fila.push(0);
-                    }}
-                }}
-                
-                // En modo priorización, guardar con ranking para ordenar después
-                if (modoPriorizacion) {{
-                    filasData.push({{ ranking: rankingActual, fila: fila }});
-                }} else {{
-                    filas.push(fila);
-                }}
-                count++;
-            }}
+            alert(mensaje);
         }});
-        
-        // Si estamos en modo priorización, ordenar por ranking (menor a mayor = mejor a peor)
-        if (modoPriorizacion) {{
-            filasData.sort(function(a, b) {{
-                return a.ranking - b.ranking;
-            }});
-            // Agregar las filas ordenadas
-            filasData.forEach(function(item) {{
-                filas.push(item.fila);
-            }});
-        }}
-        
-        if (count === 0) {{
-            alert('No hay puntos visibles para descargar. Ajusta los filtros.');
-            return;
-        }}
-        
-        // Convertir array de filas a CSV (cada elemento separado por PUNTO Y COMA para Excel español)
-        var csv = filas.map(function(fila) {{
-            return fila.map(function(valor) {{
-                // Si el valor contiene punto y coma, encerrarlo entre comillas
-                if (typeof valor === 'string' && (valor.includes(';') || valor.includes('|'))) {{
-                    return '"' + valor + '"';
-                }}
-                return valor;
-            }}).join(';');
-        }}).join('\\n');
-        
-        // Añadir BOM UTF-8 para que Excel lo reconozca correctamente
-        var BOM = '\\uFEFF';
-        csv = BOM + csv;
-        
-        // Crear y descargar archivo CSV
-        var blob = new Blob([csv], {{ type: 'text/csv;charset=utf-8;' }});
-        var link = document.createElement('a');
-        var url = URL.createObjectURL(blob);
-        
-        var fecha = new Date().toISOString().slice(0,10).replace(/-/g,'');
-        var nombreArchivo = modoPriorizacion ? 
-            'priorizacion_hidroelectrica_' + fecha + '_' + count + 'puntos.csv' :
-            'puntos_hidroelectricos_' + fecha + '_' + count + 'puntos.csv';
-        
-        link.setAttribute('href', url);
-        link.setAttribute('download', nombreArchivo);
-        link.style.visibility = 'hidden';
-        document.body.appendChild(link);
-        link.click();
-        document.body.removeChild(link);
-        
-        var mensaje = modoPriorizacion ?
-            '✓ Descargados ' + count + ' puntos PRIORIZADOS\\n\\nOrdenados por Ranking (mejor a peor).\\nLa columna Ranking indica la posición.\\nTurbinas: solo PAT y Cross Flow.\\n\\nArchivo: ' + nombreArchivo :
-            '✓ Descargados ' + count + ' puntos (cada punto = 1 fila)\\n\\nCada columna tiene un dato diferente.\\nLa turbina mostrada es la MÁS ECONÓMICA.\\nCostes calculados con potencia para abastecer VSS.\\nSe indica si requiere opción híbrida.\\n\\nArchivo: ' + nombreArchivo;
-        
-        alert(mensaje);
     }}
     
     function toggleTurbinas() {{
@@ -2902,6 +5795,167 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
         checkboxes.forEach(cb => cb.checked = !allChecked);
     }}
     
+    // ================================================================
+    // ESTADO DE FILTROS Y RESULTADO COMPARTIDO
+    // Mapa, CSV, gráfica multiescenario e informes leen el mismo
+    // resultado filtrado. Solo se recalcula cuando cambia alguna entrada
+    // real (filtros, priorización, parámetros de coste o cartera óptima).
+    // ================================================================
+    var TURBINAS_FILTRO = [
+        ['turb-francis', 'Francis'],
+        ['turb-pat', 'PAT'],
+        ['turb-pelton', 'Pelton'],
+        ['turb-kaplan', 'Kaplan'],
+        ['turb-lowhead', 'Low Head'],
+        ['turb-turgo', 'Turgo'],
+        ['turb-crossflow', 'Cross Flow']
+    ];
+    var REGIONES_FILTRO = [
+        ['reg-pacifico', 'Región Pacífico'],
+        ['reg-eje-cafetero', 'Región Eje Cafetero – Antioquia'],
+        ['reg-centro-sur', 'Región Centro Sur'],
+        ['reg-centro-oriente', 'Región Centro Oriente'],
+        ['reg-caribe', 'Región Caribe'],
+        ['reg-llano', 'Región Llano'],
+        ['reg-sin-dato', '']
+    ];
+    var cacheResultado = null;
+    
+    function leerEstadoFiltros() {{
+        var seleccionados = function(lista) {{
+            return lista.filter(function(par) {{ return document.getElementById(par[0]).checked; }})
+                        .map(function(par) {{ return par[1]; }});
+        }};
+        
+        // CAPEX máximo (si está vacío, no aplicar filtro)
+        var capexMaxInput = document.getElementById('capex-max').value;
+        
+        var estado = {{
+            cmin: parseFloat(document.getElementById('caudal-min').value),
+            cmax: parseFloat(document.getElementById('caudal-max').value),
+            pmin: parseFloat(document.getElementById('pend-min').value),
+            vssMin: parseInt(document.getElementById('vss-min').value),
+            turbinasSeleccionadas: seleccionados(TURBINAS_FILTRO),
+            regionesSeleccionadas: seleccionados(REGIONES_FILTRO),
+            capexMax: (capexMaxInput === '' || capexMaxInput === null) ? null : parseFloat(capexMaxInput),
+            priorizacion: modoPriorizacion,
+            versionCostes: versionCostes
+        }};
+        if (modoPriorizacion) {{
+            estado.topN = parseInt(document.getElementById('ranking-top').value);
+            estado.budgetMax = parseFloat(document.getElementById('budget-max').value);
+            estado.carteraOptima = document.getElementById('budget-optimo').checked;
+            estado.claveCartera = carteraOptima ? carteraOptima.clave : null;
+            estado.pesos = leerPesosRanking();
+            estado.pareto = document.getElementById('pareto-resaltar').checked;
+        }}
+        var clave = JSON.stringify(estado);
+        
+        // La tasa de cambio solo afecta a la presentación, no al filtrado
+        estado.clave = clave;
+        estado.tasaCambio = parseFloat(document.getElementById('tasa-cambio').value) || 3711.71;
+        return estado;
+    }}
+    
+    // Turbina de menor CAPEX entre todas las aplicables (la "recomendada")
+    function turbinaMenorCapex(p) {{
+        if (!p.turbinas || p.turbinas.length === 0) return null;
+        var mejor = p.turbinas[0];
+        for (var i = 1; i < p.turbinas.length; i++) {{
+            if (p.turbinas[i].capex_total < mejor.capex_total) {{
+                mejor = p.turbinas[i];
+            }}
+        }}
+        return mejor;
+    }}
+    
+    function calcularResultadoFiltrado(estado) {{
+        var visibles = [];
+        rankingPuntos = new Int32Array(puntos.length);
+        
+        if (estado.priorizacion) {{
+            // Ranking en caché: solo se recalcula si cambian sus entradas
+            var rk = obtenerRankingPriorizacion(estado.cmin, estado.cmax, estado.pmin, estado.vssMin,
+                                                estado.regionesSeleccionadas, estado.capexMax, estado.pesos);
+            marcarFrentePareto(rk);
+            
+            // APLICAR FILTROS DE PRIORIZACIÓN
+            var puntosPriorizables = seleccionarPriorizados(rk, estado.topN, estado.budgetMax);
+            
+            // Cartera óptima bajo presupuesto (calculada en segundo plano)
+            if (estado.carteraOptima && !isNaN(estado.budgetMax) && estado.budgetMax > 0) {{
+                var optima = obtenerCarteraOptima(rk, estado.topN, estado.budgetMax, puntosPriorizables);
+                if (optima) puntosPriorizables = optima;
+            }} else {{
+                ocultarComparativaCartera();
+            }}
+            
+            // Asignar ranking
+            puntosPriorizables.forEach(function(item, index) {{
+                rankingPuntos[filaDePunto(item.punto.id)] = index + 1;
+                visibles.push({{
+                    punto: item.punto,
+                    ranking: index + 1,
+                    turbina: turbinaMenorCapex(item.punto),
+                    turbinaPriorizada: item.turbina
+                }});
+            }});
+        }} else {{
+            // Modo normal (sin priorización)
+            puntos.forEach(function(p) {{
+                var pasaCaudal = p.caudal > estado.cmin && p.caudal < estado.cmax;
+                var pasaPendiente = p.pendiente > estado.pmin;
+                var pasaVss = p.vss >= estado.vssMin;
+                
+                // Verificar si la región del punto está seleccionada
+                var pasaRegion = estado.regionesSeleccionadas.includes(p.region);
+                
+                // Verificar si el punto tiene al menos una turbina seleccionada
+                var tieneTurbinaSeleccionada = false;
+                if (p.turbinas && p.turbinas.length > 0) {{
+                    for (var i = 0; i < p.turbinas.length; i++) {{
+                        if (estado.turbinasSeleccionadas.includes(p.turbinas[i].tipo)) {{
+                            tieneTurbinaSeleccionada = true;
+                            break;
+                        }}
+                    }}
+                }}
+                
+                // Verificar si el punto tiene al menos una turbina con CAPEX <= capexMax
+                var pasaCapex = true;  // Por defecto pasa si no hay filtro
+                if (estado.capexMax !== null && p.turbinas && p.turbinas.length > 0) {{
+                    pasaCapex = false;  // Cambiar a false, debe encontrar al menos una que cumpla
+                    for (var i = 0; i < p.turbinas.length; i++) {{
+                        if (p.turbinas[i].capex_total <= estado.capexMax) {{
+                            pasaCapex = true;
+                            break;
+                        }}
+                    }}
+                }}
+                
+                if (pasaCaudal && pasaPendiente && pasaVss && pasaRegion && tieneTurbinaSeleccionada && pasaCapex) {{
+                    visibles.push({{ punto: p, ranking: null, turbina: turbinaMenorCapex(p), turbinaPriorizada: null }});
+                }}
+            }});
+        }}
+        
+        return {{
+            clave: estado.clave,
+            priorizacion: estado.priorizacion,
+            visibles: visibles,
+            ranking: rankingPuntos
+        }};
+    }}
+    
+    function obtenerResultadoFiltrado(estado) {{
+        estado = estado || leerEstadoFiltros();
+        if (!cacheResultado || cacheResultado.clave !== estado.clave) {{
+            cacheResultado = calcularResultadoFiltrado(estado);
+        }}
+        rankingPuntos = cacheResultado.ranking;
+        return cacheResultado;
+    }}
+    
     function actualizarValores() {{
         document.getElementById('cmin').textContent = parseFloat(document.getElementById('caudal-min').value).toFixed(2);
         document.getElementById('cmax').textContent = parseFloat(document.getElementById('caudal-max').value).toFixed(2);
@@ -2910,37 +5964,13 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
     }}
     
     function actualizar() {{
-        var cmin = parseFloat(document.getElementById('caudal-min').value);
-        var cmax = parseFloat(document.getElementById('caudal-max').value);
-        var pmin = parseFloat(document.getElementById('pend-min').value);
-        var vssMin = parseInt(document.getElementById('vss-min').value);
-        
-        // Obtener tipos de turbina seleccionados
-        var turbinasSeleccionadas = [];
-        if (document.getElementById('turb-francis').checked) turbinasSeleccionadas.push('Francis');
-        if (document.getElementById('turb-pat').checked) turbinasSeleccionadas.push('PAT');
-        if (document.getElementById('turb-pelton').checked) turbinasSeleccionadas.push('Pelton');
-        if (document.getElementById('turb-kaplan').checked) turbinasSeleccionadas.push('Kaplan');
-        if (document.getElementById('turb-lowhead').checked) turbinasSeleccionadas.push('Low Head');
-        if (document.getElementById('turb-turgo').checked) turbinasSeleccionadas.push('Turgo');
-        if (document.getElementById('turb-crossflow').checked) turbinasSeleccionadas.push('Cross Flow');
-        
-        // Obtener regiones seleccionadas
-        var regionesSeleccionadas = [];
-        if (document.getElementById('reg-pacifico').checked) regionesSeleccionadas.push('Región Pacífico');
-        if (document.getElementById('reg-eje-cafetero').checked) regionesSeleccionadas.push('Región Eje Cafetero – Antioquia');
-        if (document.getElementById('reg-centro-sur').checked) regionesSeleccionadas.push('Región Centro Sur');
-        if (document.getElementById('reg-centro-oriente').checked) regionesSeleccionadas.push('Región Centro Oriente');
-        if (document.getElementById('reg-caribe').checked) regionesSeleccionadas.push('Región Caribe');
-        if (document.getElementById('reg-llano').checked) regionesSeleccionadas.push('Región Llano');
-        if (document.getElementById('reg-sin-dato').checked) regionesSeleccionadas.push('');
-        
-        // Obtener CAPEX máximo (si está vacío, no aplicar filtro)
-        var capexMaxInput = document.getElementById('capex-max').value;
-        var capexMax = (capexMaxInput === '' || capexMaxInput === null) ? null : parseFloat(capexMaxInput);
+        // Bloques de puntos necesarios para la vista y los filtros actuales
+        sincronizarBloques();
         
-        // Obtener tasa de cambio
-        var tasaCambio = parseFloat(document.getElementById('tasa-cambio').value) || 3711.71;
+        // Estado de filtros y resultado compartido (sin recalcular si nada cambió)
+        var estado = leerEstadoFiltros();
+        var resultado = obtenerResultadoFiltrado(estado);
+        var tasaCambio = estado.tasaCambio;
         
         actualizarValores();
         
@@ -2952,6 +5982,9 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
             if (ranking !== null) {{
                 popupHTML += '<div style="background: linear-gradient(135deg, #E54D9A 0%, #FF0066 100%); color: white; padding: 12px; border-radius: 8px; margin-bottom: 10px; text-align: center; box-shadow: 0 4px 8px rgba(255,0,102,0.3);">';
                 popupHTML += '<div style="font-size: 24px; font-weight: bold;">⭐ Ranking #' + ranking + '</div>';
+                if (esPuntoPareto(p.id)) {{
+                    popupHTML += '<div style="font-size: 12px; margin-top: 4px;">🥇 Frente de Pareto (no dominado)</div>';
+                }}
                 popupHTML += '</div>';
             }}
             
@@ -2997,7 +6030,7 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
                 
                 // BOTÓN COMPARAR TURBINAS (solo si hay más de una en las filtradas)
                 if (turbinasAMostrar.length > 1) {{
-                    popupHTML += '<button onclick="toggleComparativa_' + p.id + '()" style="width: 100%; padding: 10px; margin-bottom: 10px; background: linear-gradient(135deg, #5D0E41 0%, #E54D9A 100%); color: white; border: none; border-radius: 6px; cursor: pointer; font-weight: bold; font-size: 13px; box-shadow: 0 3px 6px rgba(229,77,154,0.4);">';
+                    popupHTML += '<button onclick="toggleComparativa(' + p.id + ')" style="width: 100%; padding: 10px; margin-bottom: 10px; background: linear-gradient(135deg, #5D0E41 0%, #E54D9A 100%); color: white; border: none; border-radius: 6px; cursor: pointer; font-weight: bold; font-size: 13px; box-shadow: 0 3px 6px rgba(229,77,154,0.4);">';
                     popupHTML += '🔍 Comparar ' + turbinasAMostrar.length + ' turbinas disponibles';
                     popupHTML += '</button>';
                     
@@ -3151,7 +6184,7 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
             }}
             
             // Atributos desplegables
-            popupHTML += '<button onclick="toggleAtributos_' + p.id + '()" style="width: 100%; padding: 8px; margin-top: 10px; margin-bottom: 5px; background: #5D5D4D; color: white; border: none; border-radius: 4px; cursor: pointer; font-weight: bold; font-size: 11px;">';
+            popupHTML += '<button onclick="toggleAtributos(' + p.id + ', this)" style="width: 100%; padding: 8px; margin-top: 10px; margin-bottom: 5px; background: #5D5D4D; color: white; border: none; border-radius: 4px; cursor: pointer; font-weight: bold; font-size: 11px;">';
             popupHTML += '📋 Ver todos los atributos';
             popupHTML += '</button>';
             
@@ -3169,192 +6202,52 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
             popupHTML += '</div>';
             popupHTML += '</div>';
             
-            popupHTML += '</div>';
-            
-            var colorMarcador = '#00FF00'; // Color por defecto (verde)
-            
-            if (soloPatCrossFlow) {{
-                // Estamos en modo priorización
-                var usarColoresRanking = document.getElementById('ranking-colores') && document.getElementById('ranking-colores').checked;
-                
-                if (usarColoresRanking && ranking !== null && totalPuntos > 0) {{
-                    // Usar color según ranking (amarillo mejor, magenta peor)
-                    colorMarcador = getColorPorRanking(ranking, totalPuntos);
-                }} else {{
-                    // Color fijo para priorización sin colores
-                    colorMarcador = '#f5576c';
-                }}
-            }}
-            
-            L.circleMarker([p.lat, p.lon], {{
-                radius: 2,
-                fillColor: colorMarcador,
-                color: colorMarcador,
-                weight: soloPatCrossFlow ? 3 : 2,
-                opacity: 0.8,
-                fillOpacity: 0.8
-            }}).bindPopup(popupHTML, {{maxWidth: 450}}).addTo(layer);
-        }}
-        
-        if (layer) layer.remove();
-        layer = L.layerGroup();
-        var count = 0;
-        
-        // Si estamos en modo priorización, calcular ranking
-        if (modoPriorizacion) {{
-            // Filtrar puntos que tengan PAT o Cross Flow y cumplan otros filtros
-            var puntosPriorizables = [];
-            
-            puntos.forEach(function(p) {{
-                var pasaCaudal = p.caudal > cmin && p.caudal < cmax;
-                var pasaPendiente = p.pendiente > pmin;
-                var pasaVss = p.vss >= vssMin;
-                var pasaRegion = regionesSeleccionadas.includes(p.region);
-                
-                // Verificar si tiene PAT o Cross Flow
-                var tienePAToCrossFlow = false;
-                var mejorCapexPorVss = Infinity;
-                var mejorTurbinaPriorizada = null;
-                
-                if (p.turbinas && p.turbinas.length > 0) {{
-                    for (var i = 0; i < p.turbinas.length; i++) {{
-                        var turb = p.turbinas[i];
-                        if (turb.tipo === 'PAT' || turb.tipo === 'Cross Flow') {{
-                            tienePAToCrossFlow = true;
-                            if (turb.capex_por_vss < mejorCapexPorVss) {{
-                                mejorCapexPorVss = turb.capex_por_vss;
-                                mejorTurbinaPriorizada = turb;
-                            }}
-                        }}
-                    }}
-                }}
-                
-                // Verificar CAPEX si hay filtro
-                var pasaCapex = true;
-                if (capexMax !== null && mejorCapexPorVss !== Infinity) {{
-                    // Buscar si alguna turbina PAT o Cross Flow cumple con CAPEX
-                    pasaCapex = false;
-                    for (var i = 0; i < p.turbinas.length; i++) {{
-                        var turb = p.turbinas[i];
-                        if ((turb.tipo === 'PAT' || turb.tipo === 'Cross Flow') && turb.capex_total <= capexMax) {{
-                            pasaCapex = true;
-                            break;
-                        }}
-                    }}
-                }}
-                
-                if (pasaCaudal && pasaPendiente && pasaVss && pasaRegion && tienePAToCrossFlow && pasaCapex) {{
-                    puntosPriorizables.push({{
-                        punto: p,
-                        capex_por_vss: mejorCapexPorVss,
-                        turbina: mejorTurbinaPriorizada
-                    }});
-                }}
-            }});
-            
-            // Ordenar por CAPEX por VSS (menor a mayor)
-            puntosPriorizables.sort(function(a, b) {{
-                return a.capex_por_vss - b.capex_por_vss;
-            }});
-            
-            // Guardar todos los puntos priorizados CON SU RANKING antes de filtrar
-            puntosPriorizadosCompletos = puntosPriorizables.map(function(item, index) {{
-                return {{
-                    punto: item.punto,
-                    capex_por_vss: item.capex_por_vss,
-                    turbina: item.turbina,
-                    ranking: index + 1
-                }};
-            }});
-            
-            // APLICAR FILTROS DE PRIORIZACIÓN
-            var topN = parseInt(document.getElementById('ranking-top').value);
-            var budgetMax = parseFloat(document.getElementById('budget-max').value);
-            
-            // Filtro Top N
-            if (!isNaN(topN) && topN > 0) {{
-                puntosPriorizables = puntosPriorizables.slice(0, topN);
-            }}
-            
-            // Filtro Budget (sumar CAPEX desde ranking #1)
-            if (!isNaN(budgetMax) && budgetMax > 0) {{
-                var sumaCapex = 0;
-                var puntosDentroBudget = [];
-                
-                for (var i = 0; i < puntosPriorizables.length; i++) {{
-                    var capexPunto = puntosPriorizables[i].punto.turbinas.reduce(function(min, turb) {{
-                        if (turb.tipo === 'PAT' || turb.tipo === 'Cross Flow') {{
-                            return Math.min(min, turb.capex_total);
-                        }}
-                        return min;
-                    }}, Infinity);
-                    
-                    if (sumaCapex + capexPunto <= budgetMax) {{
-                        puntosDentroBudget.push(puntosPriorizables[i]);
-                        sumaCapex += capexPunto;
-                    }} else {{
-                        break;
-                    }}
-                }}
-                
-                puntosPriorizables = puntosDentroBudget;
-            }}
-            
-            // Asignar ranking
-            rankingPuntos = [];
-            puntosPriorizables.forEach(function(item, index) {{
-                rankingPuntos[item.punto.id] = index + 1;
-            }});
-            
-            // Guardar total de puntos para colores
-            var totalPuntosRanking = puntosPriorizables.length;
-            
-            // Mostrar puntos priorizados
-            puntosPriorizables.forEach(function(item) {{
-                var p = item.punto;
-                var ranking = rankingPuntos[p.id];
-                
-                mostrarPuntoEnMapa(p, tasaCambio, ranking, true, totalPuntosRanking);
-                count++;
-            }});
-        }} else {{
-            // Modo normal (sin priorización)
-            puntos.forEach(function(p) {{
-            var pasaCaudal = p.caudal > cmin && p.caudal < cmax;
-            var pasaPendiente = p.pendiente > pmin;
-            var pasaVss = p.vss >= vssMin;
-            
-            // Verificar si la región del punto está seleccionada
-            var pasaRegion = regionesSeleccionadas.includes(p.region);
-            
-            // Verificar si el punto tiene al menos una turbina seleccionada
-            var tieneTurbinaSeleccionada = false;
-            if (p.turbinas && p.turbinas.length > 0) {{
-                for (var i = 0; i < p.turbinas.length; i++) {{
-                    if (turbinasSeleccionadas.includes(p.turbinas[i].tipo)) {{
-                        tieneTurbinaSeleccionada = true;
-                        break;
-                    }}
-                }}
-            }}
+            popupHTML += '</div>';
             
-            // Verificar si el punto tiene al menos una turbina con CAPEX <= capexMax
-            var pasaCapex = true;  // Por defecto pasa si no hay filtro
-            if (capexMax !== null && p.turbinas && p.turbinas.length > 0) {{
-                pasaCapex = false;  // Cambiar a false, debe encontrar al menos una que cumpla
-                for (var i = 0; i < p.turbinas.length; i++) {{
-                    if (p.turbinas[i].capex_total <= capexMax) {{
-                        pasaCapex = true;
-                        break;
-                    }}
+            var colorMarcador = '#00FF00'; // Color por defecto (verde)
+            
+            if (soloPatCrossFlow) {{
+                // Estamos en modo priorización
+                var usarColoresRanking = document.getElementById('ranking-colores') && document.getElementById('ranking-colores').checked;
+                
+                if (usarColoresRanking && ranking !== null && totalPuntos > 0) {{
+                    // Usar color según ranking (amarillo mejor, magenta peor)
+                    colorMarcador = getColorPorRanking(ranking, totalPuntos);
+                }} else {{
+                    // Color fijo para priorización sin colores
+                    colorMarcador = '#f5576c';
                 }}
             }}
             
-            if (pasaCaudal && pasaPendiente && pasaVss && pasaRegion && tieneTurbinaSeleccionada && pasaCapex) {{
-                mostrarPuntoEnMapa(p, tasaCambio, null, false, 0);
+            var enPareto = soloPatCrossFlow && esPuntoPareto(p.id);
+            
+            L.circleMarker([p.lat, p.lon], {{
+                radius: enPareto ? 4 : 2,
+                fillColor: colorMarcador,
+                color: enPareto ? '#FFD700' : colorMarcador,
+                weight: enPareto ? 4 : (soloPatCrossFlow ? 3 : 2),
+                opacity: 0.8,
+                fillOpacity: 0.8
+            }}).bindPopup(popupHTML, {{maxWidth: 450}}).addTo(layer);
+        }}
+        
+        if (layer) layer.remove();
+        layer = L.layerGroup();
+        var count = 0;
+        
+        if (vistaAgregada()) {{
+            // Zoom bajo: una marca por celda en lugar de una por punto
+            var zoom = Math.max(0, Math.floor(map_{mapa._id}.getZoom()));
+            var agregados = agregadosPrecalculadosVigentes(estado) ?
+                AGREGADOS_ZOOM[Math.min(zoom, ZOOM_PUNTOS_INDIVIDUALES - 1)] : agregarPorCelda(resultado.visibles, zoom);
+            count = mostrarAgregados(agregados, layer);
+        }} else {{
+            // Mostrar los puntos visibles (en modo priorización, en orden de ranking)
+            var totalPuntosRanking = resultado.priorizacion ? resultado.visibles.length : 0;
+            resultado.visibles.forEach(function(v) {{
+                mostrarPuntoEnMapa(v.punto, tasaCambio, v.ranking, resultado.priorizacion, totalPuntosRanking);
                 count++;
-            }}
-        }});
+            }});
         }}
         
         layer.addTo(map_{mapa._id});
@@ -3362,157 +6255,1748 @@ def crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original):
         
         layer.addTo(map_{mapa._id});
         document.getElementById('count').textContent = formatNumber(count);
+        mostrarAmbitoConteo(estado);
         
-        // Crear funciones toggleComparativa para cada punto con múltiples turbinas
-        puntos.forEach(function(p) {{
-            if (p.turbinas && p.turbinas.length > 1) {{
-                window['toggleComparativa_' + p.id] = function() {{
-                    var div = document.getElementById('comparativa_' + p.id);
-                    if (div) {{
-                        if (div.style.display === 'none') {{
-                            div.style.display = 'block';
-                        }} else {{
-                            div.style.display = 'none';
-                        }}
-                    }}
-                }};
+        // Resumen por territorio (el precalculado mientras rigen los agregados precalculados)
+        territorioPrecalculado = agregadosPrecalculadosVigentes(estado);
+        if (!territorioPrecalculado) actualizarTerritorio(resultado);
+        mostrarTerritorio();
+    }}
+    
+    // Mostrar/ocultar la comparativa de turbinas de un punto
+    function toggleComparativa(id) {{
+        var div = document.getElementById('comparativa_' + id);
+        if (div) {{
+            if (div.style.display === 'none') {{
+                div.style.display = 'block';
+            }} else {{
+                div.style.display = 'none';
             }}
-            
-            // Función para mostrar/ocultar atributos (para todos los puntos)
-            window['toggleAtributos_' + p.id] = function() {{
-                var div = document.getElementById('atributos_' + p.id);
-                var btn = event.target;
-                if (div) {{
-                    if (div.style.display === 'none') {{
-                        div.style.display = 'block';
-                        btn.textContent = '📋 Ocultar atributos';
-                    }} else {{
-                        div.style.display = 'none';
-                        btn.textContent = '📋 Ver todos los atributos';
-                    }}
-                }}
-            }};
-        }});
+        }}
+    }}
+    
+    // Mostrar/ocultar todos los atributos de un punto
+    function toggleAtributos(id, btn) {{
+        var div = document.getElementById('atributos_' + id);
+        if (div) {{
+            if (div.style.display === 'none') {{
+                div.style.display = 'block';
+                btn.textContent = '📋 Ocultar atributos';
+            }} else {{
+                div.style.display = 'none';
+                btn.textContent = '📋 Ver todos los atributos';
+            }}
+        }}
+    }}
+    
+    function resetear() {{
+        document.getElementById('caudal-min').value = {CAUDAL_MIN_INICIAL};
+        document.getElementById('caudal-max').value = {CAUDAL_MAX_INICIAL};
+        document.getElementById('pend-min').value = {PENDIENTE_MIN_INICIAL};
+        document.getElementById('vss-min').value = {vss_min_inicial};
+        
+        // Limpiar filtro de CAPEX
+        document.getElementById('capex-max').value = '';
+        
+        // Resetear tasa de cambio
+        document.getElementById('tasa-cambio').value = '3711.71';
+        
+        // Marcar todas las turbinas
+        document.getElementById('turb-francis').checked = true;
+        document.getElementById('turb-pat').checked = true;
+        document.getElementById('turb-pelton').checked = true;
+        document.getElementById('turb-kaplan').checked = true;
+        document.getElementById('turb-lowhead').checked = true;
+        document.getElementById('turb-turgo').checked = true;
+        document.getElementById('turb-crossflow').checked = true;
+        
+        // Marcar todas las regiones
+        document.getElementById('reg-pacifico').checked = true;
+        document.getElementById('reg-eje-cafetero').checked = true;
+        document.getElementById('reg-centro-sur').checked = true;
+        document.getElementById('reg-centro-oriente').checked = true;
+        document.getElementById('reg-caribe').checked = true;
+        document.getElementById('reg-llano').checked = true;
+        document.getElementById('reg-sin-dato').checked = true;
+        
+        actualizarValores();
+        actualizar();
     }}
     
-    function resetear() {{
-        document.getElementById('caudal-min').value = {CAUDAL_MIN_INICIAL};
-        document.getElementById('caudal-max').value = {CAUDAL_MAX_INICIAL};
-        document.getElementById('pend-min').value = {PENDIENTE_MIN_INICIAL};
-        document.getElementById('vss-min').value = {vss_min_inicial};
-        
-        // Limpiar filtro de CAPEX
-        document.getElementById('capex-max').value = '';
-        
-        // Resetear tasa de cambio
-        document.getElementById('tasa-cambio').value = '3711.71';
-        
-        // Marcar todas las turbinas
-        document.getElementById('turb-francis').checked = true;
-        document.getElementById('turb-pat').checked = true;
-        document.getElementById('turb-pelton').checked = true;
-        document.getElementById('turb-kaplan').checked = true;
-        document.getElementById('turb-lowhead').checked = true;
-        document.getElementById('turb-turgo').checked = true;
-        document.getElementById('turb-crossflow').checked = true;
-        
-        // Marcar todas las regiones
-        document.getElementById('reg-pacifico').checked = true;
-        document.getElementById('reg-eje-cafetero').checked = true;
-        document.getElementById('reg-centro-sur').checked = true;
-        document.getElementById('reg-centro-oriente').checked = true;
-        document.getElementById('reg-caribe').checked = true;
-        document.getElementById('reg-llano').checked = true;
-        document.getElementById('reg-sin-dato').checked = true;
-        
-        actualizarValores();
-        actualizar();
-    }}
+    setTimeout(function() {{
+        claveFiltrosIniciales = claveFiltros(leerEstadoFiltros());
+        zoomAnterior = map_{mapa._id}.getZoom();
+        map_{mapa._id}.on('moveend', alMoverMapa);
+        actualizarValores();
+        actualizar();
+    }}, 500);
+    </script>
+    '''
+    
+    mapa.get_root().html.add_child(folium.Element(controles_html))
+    mapa.get_root().html.add_child(folium.Element(bloques_html))
+    mapa.get_root().html.add_child(folium.Element(javascript))
+    if servidor:
+        mapa.get_root().html.add_child(folium.Element(javascript_servidor(mapa)))
+    
+    folium.LayerControl(collapsed=False).add_to(mapa)
+    plugins.Fullscreen().add_to(mapa)
+    plugins.MiniMap(toggle_display=True).add_to(mapa)
+    
+    print("✓ Mapa creado")
+    return mapa
+
+def generar_mapa(puntos_filtrados, capas_areas, total_original, puntos_data=None, nombre="mapa_final.html"):
+    """
+    Crea el mapa interactivo y lo guarda en HTML
+    
+    Returns:
+        Nombre del archivo HTML
+    """
+    mapa = crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original, puntos_data)
+    with etapa('guardado_mapa'):
+        mapa.save(nombre)
+    contar('bytes_html', os.path.getsize(nombre))
+    return nombre
+
+# ====================================================================
+# ANÁLISIS SIN MAPA (VECTORIZADO)
+# ====================================================================
+
+def calcular_costes_vectorizado(tipo_turbina, potencia_kw, dist_capital_m, m_region, parametros=None):
+    """
+    Versión vectorizada de calcular_costes_detallados() para un tipo de
+    turbina y arrays de puntos (mismas fórmulas y mismo orden de operaciones).
+    Los parámetros pueden ser escalares o arrays que se difunden con los de
+    los puntos (p.ej. una columna por muestra de Monte Carlo)
+    
+    Args:
+        tipo_turbina: Tipo de turbina
+        potencia_kw: Array de potencias en kW
+        dist_capital_m: Array de distancias a capital en metros
+        m_region: Array de multiplicadores por región
+        parametros: Parámetros del modelo (parametros_escenario()); None = valores base
+    
+    Returns:
+        Diccionario de arrays con los costes detallados
+    """
+    if parametros is None:
+        parametros = parametros_escenario()
+    P = parametros['PARAMETROS_COSTES']
+    costes = {}
+    
+    coste_turbina = potencia_kw * parametros['COSTOS_CAPEX'][tipo_turbina]
+    coste_equipos = coste_turbina * P['factor_equipos']
+    coste_obra_civil = P['obra_civil_kw'] * potencia_kw
+    coste_instalacion = (coste_equipos + coste_turbina) * COMPLEJIDAD_INSTALACION[tipo_turbina]
+    
+    menor_50 = potencia_kw < 50
+    coste_linea = (np.where(menor_50, P['linea_base_menor_50'], P['linea_base_mayor_50']) +
+                   potencia_kw * np.where(menor_50, P['linea_kw_menor_50'], P['linea_kw_mayor_50']))
+    coste_ambiental = (P['ambiental_base'] + P['ambiental_kw'] * potencia_kw) * MULTIPLICADOR_IMPACTO[tipo_turbina]
+    
+    D_real = dist_capital_m / 1000 * P['factor_topografia']
+    W = potencia_kw * np.where(menor_50, P['peso_t_kw_menor_50'], P['peso_t_kw_mayor_50'])
+    coste_transporte_base = P['transporte_usd_t_km'] * D_real * W * MULTIPLICADOR_TRANSPORTE[tipo_turbina] * m_region
+    C_movilizacion = P['movilizacion'] * DIFICULTAD_TURBINA[tipo_turbina] * m_region
+    C_logistica = P['logistica_kw'] * potencia_kw * m_region
+    coste_transporte = coste_transporte_base + C_movilizacion + C_logistica
+    
+    suma_parcial = (coste_turbina + coste_equipos + coste_obra_civil +
+                    coste_instalacion + coste_linea + coste_ambiental + coste_transporte)
+    otros_costes = suma_parcial * P['otros_costes']
+    capex_total = suma_parcial + otros_costes
+    
+    costes['coste_turbina'] = coste_turbina
+    costes['coste_equipos'] = coste_equipos
+    costes['coste_obra_civil'] = coste_obra_civil
+    costes['coste_instalacion'] = coste_instalacion
+    costes['coste_linea'] = coste_linea
+    costes['coste_ambiental'] = coste_ambiental
+    costes['coste_transporte'] = coste_transporte
+    costes['otros_costes'] = otros_costes
+    costes['capex_total'] = capex_total
+    costes['opex'] = capex_total * P['opex']
+    return costes
+
+def parametros_escenario(cambios=None):
+    """
+    Parámetros del modelo (eficiencias, CAPEX unitario, multiplicadores por
+    región y parámetros de costes) con los cambios de un escenario
+    
+    Args:
+        cambios: Diccionario {'TABLA.clave': valor}, p.ej.
+                 {'COSTOS_CAPEX.PAT': 120, 'PARAMETROS_COSTES.obra_civil_kw': 2000}
+    
+    Returns:
+        Diccionario con una copia de cada tabla
+    """
+    parametros = {
+        'EFICIENCIAS_TURBINAS': dict(EFICIENCIAS_TURBINAS),
+        'COSTOS_CAPEX': dict(COSTOS_CAPEX),
+        'MULTIPLICADOR_REGION': dict(MULTIPLICADOR_REGION),
+        'PARAMETROS_COSTES': dict(PARAMETROS_COSTES)
+    }
+    for clave, valor in (cambios or {}).items():
+        tabla, _, campo = clave.partition('.')
+        if tabla not in parametros or campo not in parametros[tabla]:
+            raise ValueError(f"Parámetro desconocido: {clave}")
+        parametros[tabla][campo] = valor
+    return parametros
+
+def multiplicadores_region(codigo_region, multiplicador_region):
+    """
+    Multiplicador por región de cada punto a partir de su código
+    (posición en MULTIPLICADOR_REGION; regiones desconocidas usan 1.2)
+    """
+    tabla = np.array([multiplicador_region[r] for r in MULTIPLICADOR_REGION] + [1.2])
+    return tabla[codigo_region.astype(int)]
+
+@etapa('preparacion_arrays')
+def preparar_arrays_puntos(puntos_filtrados):
+    """
+    Datos de todos los puntos en arrays: lo mismo que preparar_puntos() salvo
+    las turbinas, que no dependen de la posición sino de los parámetros
+    
+    Args:
+        puntos_filtrados: GeoDataFrame de puntos (EPSG:4326)
+    
+    Returns:
+        (tabla_puntos, arrays): DataFrame con una fila por punto y diccionario
+        de arrays numéricos para calcular_turbinas_vectorizado()
+    """
+    def numerica(columna):
+        if columna not in puntos_filtrados.columns:
+            return np.zeros(len(puntos_filtrados))
+        return pd.to_numeric(valores_float64(puntos_filtrados, columna), errors='coerce').fillna(0).to_numpy(dtype=float)
+    
+    def texto(columna):
+        if columna not in puntos_filtrados.columns:
+            return pd.Series('', index=puntos_filtrados.index)
+        serie = puntos_filtrados[columna]
+        return serie.astype(str).where(serie.notna(), '')
+    
+    lat = puntos_filtrados.geometry.y.to_numpy()
+    lon = puntos_filtrados.geometry.x.to_numpy()
+    
+    # Capital más cercana (primera en caso de empate)
+    dist_punto_capital = np.full(len(lat), np.inf)
+    indice_capital = np.zeros(len(lat), dtype=int)
+    for i, info in enumerate(CAPITALES_DEPARTAMENTOS.values()):
+        dist = calcular_distancia_haversine_vectorizada(lat, lon, info['lat'], info['lon'])
+        mas_cerca = dist < dist_punto_capital
+        dist_punto_capital[mas_cerca] = dist[mas_cerca]
+        indice_capital[mas_cerca] = i
+    
+    deptos = list(CAPITALES_DEPARTAMENTOS.keys())
+    distancia = numerica(COLUMNA_DISTANCIA)
+    caudal = numerica(COLUMNA_CAUDAL)
+    caida = numerica(COLUMNA_CAIDA)
+    potencia_k = numerica(COLUMNA_POTENCIA_K)
+    vss = numerica(COLUMNA_VSS)
+    region = texto(COLUMNA_REGION)
+    zona_clima = texto(COLUMNA_ZONA_CLIMA)
+    potencia_pico = np.where(zona_clima.to_numpy() == 'CÁLIDO HÚMEDO', 2.06, 1.54)
+    regiones = list(MULTIPLICADOR_REGION.keys())
+    codigo_region = region.map({r: i for i, r in enumerate(regiones)}).fillna(len(regiones)).to_numpy(dtype=float)
+    caudal_cfs = caudal * 35.3147
+    caida_ft = caida * 3.28084
+    
+    tabla_puntos = pd.DataFrame({
+        'id': puntos_filtrados.index.astype(int),
+        'lat': lat,
+        'lon': lon,
+        'caudal': caudal,
+        'caida': caida,
+        'potencia_k': potencia_k,
+        'caudal_cfs': np.round(caudal_cfs, 2),
+        'caida_ft': np.round(caida_ft, 2),
+        'pendiente': numerica(COLUMNA_PENDIENTE),
+        'municipio': texto(COLUMNA_MUNICIPIO).to_numpy(),
+        'departamento': texto('Departamen').to_numpy(),
+        'region': region.to_numpy(),
+        'zona_clima': zona_clima.to_numpy(),
+        'potencia_pico': potencia_pico,
+        'vss': vss,
+        'distancia': distancia,
+        'capital': [CAPITALES_DEPARTAMENTOS[deptos[i]]['capital'] for i in indice_capital],
+        'depto_capital': [deptos[i] for i in indice_capital],
+        'dist_punto_capital': np.round(dist_punto_capital, 0),
+        'dist_nucleo_capital': np.round(np.maximum(0, dist_punto_capital - distancia), 0)
+    })
+    # Distancias a capas (calcular_distancias_capas()), disponibles para nuevos costes
+    for columna in puntos_filtrados.attrs.get('columnas_distancia', []):
+        tabla_puntos[columna] = puntos_filtrados[columna].to_numpy()
+    
+    arrays = {
+        'id': tabla_puntos['id'].to_numpy(dtype=float),
+        'caudal_cfs': caudal_cfs,
+        'caida_ft': caida_ft,
+        'potencia_k': potencia_k,
+        'vss': vss,
+        'potencia_pico': potencia_pico,
+        'dist_punto_capital': dist_punto_capital,
+        'codigo_region': codigo_region
+    }
+    for columna in puntos_filtrados.attrs.get('columnas_distancia', []):
+        if columna.startswith('dist_'):
+            arrays[columna] = tabla_puntos[columna].to_numpy(dtype=float)
+    return tabla_puntos, arrays
+
+def dentro_de_turbina(arrays, tipo):
+    """
+    Puntos dentro del polígono de selección de un tipo de turbina
+    """
+    caudal_cfs = arrays['caudal_cfs']
+    caida_ft = arrays['caida_ft']
+    dentro = np.zeros(len(caudal_cfs), dtype=bool)
+    for qmin, qmax, hmin, hmax in RECTANGULOS_TURBINAS[tipo]:
+        dentro |= (caudal_cfs > qmin) & (caudal_cfs < qmax) & (caida_ft > hmin) & (caida_ft < hmax)
+    return dentro
+
+def potencias_turbina(arrays, filas, eficiencia):
+    """
+    Potencia máxima, potencia para abastecer las VSS, caso híbrido, potencia
+    usada para costes y VSS abastecidas de una turbina en los puntos indicados
+    """
+    potencia_pico = arrays['potencia_pico'][filas]
+    vss = arrays['vss'][filas]
+    potencia_maxima = arrays['potencia_k'][filas] * 0.9 * eficiencia
+    abastecer = vss * potencia_pico
+    es_hibrida = potencia_maxima < abastecer
+    potencia_para_costes = np.where(es_hibrida, potencia_maxima, abastecer)
+    vss_abastecibles = np.where(es_hibrida, np.trunc(potencia_maxima / potencia_pico),
+                                np.trunc(vss)).astype(int)
+    return potencia_maxima, abastecer, es_hibrida, potencia_para_costes, vss_abastecibles
+
+def calcular_turbinas_vectorizado(arrays, parametros=None):
+    """
+    Turbinas aplicables y costes de todos los puntos con unos parámetros
+    
+    Args:
+        arrays: Arrays de preparar_arrays_puntos()
+        parametros: Parámetros del modelo (parametros_escenario()); None = valores base
+    
+    Returns:
+        DataFrame con una fila por punto y turbina aplicable ('fila' es la
+        posición del punto)
+    """
+    if parametros is None:
+        parametros = parametros_escenario()
+    
+    m_region = multiplicadores_region(arrays['codigo_region'], parametros['MULTIPLICADOR_REGION'])
+    
+    partes = []
+    for orden_tipo, tipo in enumerate(RECTANGULOS_TURBINAS):
+        filas = np.flatnonzero(dentro_de_turbina(arrays, tipo))
+        if len(filas) == 0:
+            continue
+        
+        potencia_maxima, abastecer, es_hibrida, potencia_para_costes, vss_abastecibles = \
+            potencias_turbina(arrays, filas, parametros['EFICIENCIAS_TURBINAS'][tipo])
+        
+        costes = calcular_costes_vectorizado(tipo, potencia_para_costes, arrays['dist_punto_capital'][filas],
+                                             m_region[filas], parametros)
+        capex_por_vss = np.divide(costes['capex_total'], vss_abastecibles,
+                                  out=np.zeros(len(filas)), where=vss_abastecibles > 0)
+        
+        parte = pd.DataFrame({
+            'fila': filas,
+            'orden_tipo': orden_tipo,
+            'tipo': tipo,
+            'potencia_maxima': np.round(potencia_maxima, 2),
+            'potencia_abastecer_vss': np.round(abastecer, 2),
+            'potencia_usada_costes': np.round(potencia_para_costes, 2),
+            'vss_abastecibles': vss_abastecibles,
+            'es_hibrida': es_hibrida,
+            'capex_simple': np.round(potencia_maxima * parametros['COSTOS_CAPEX'][tipo], 2)
+        })
+        for campo, valores in costes.items():
+            parte[campo] = np.round(valores, 2)
+        parte['capex_por_vss'] = np.round(capex_por_vss, 2)
+        partes.append(parte)
+    
+    if partes:
+        tabla_turbinas = pd.concat(partes, ignore_index=True).sort_values(['fila', 'orden_tipo'], kind='mergesort')
+    else:
+        tabla_turbinas = pd.DataFrame({'fila': np.zeros(0, dtype=int), 'orden_tipo': np.zeros(0, dtype=int),
+                                       'tipo': np.zeros(0, dtype=object), 'vss_abastecibles': np.zeros(0, dtype=int),
+                                       'capex_total': np.zeros(0), 'capex_por_vss': np.zeros(0)})
+    return tabla_turbinas.reset_index(drop=True)
+
+def calcular_tablas_vectorizado(puntos_filtrados):
+    """
+    Calcula para todos los puntos a la vez lo mismo que preparar_puntos():
+    capital más cercana, turbinas aplicables y costes
+    
+    Args:
+        puntos_filtrados: GeoDataFrame de puntos (EPSG:4326)
+    
+    Returns:
+        (tabla_puntos, tabla_turbinas): DataFrame con una fila por punto y
+        DataFrame con una fila por punto y turbina aplicable
+    """
+    tabla_puntos, arrays = preparar_arrays_puntos(puntos_filtrados)
+    tabla_turbinas = calcular_turbinas_vectorizado(arrays)
+    
+    print(f"✓ {len(tabla_puntos):,} puntos y {len(tabla_turbinas):,} turbinas calculados")
+    return tabla_puntos, tabla_turbinas
+
+def mascara_filtros(tabla_puntos, caudal_min=CAUDAL_MIN_INICIAL, caudal_max=CAUDAL_MAX_INICIAL,
+                    pendiente_min=PENDIENTE_MIN_INICIAL, vss_min=0, regiones=None):
+    """
+    Puntos que pasan los filtros de caudal, pendiente, VSS y región del mapa
+    (no dependen de los parámetros de costes)
+    """
+    if regiones is None:
+        regiones = list(MULTIPLICADOR_REGION.keys())
+    return ((tabla_puntos['caudal'] > caudal_min) & (tabla_puntos['caudal'] < caudal_max) &
+            (tabla_puntos['pendiente'] > pendiente_min) & (tabla_puntos['vss'] >= vss_min) &
+            tabla_puntos['region'].isin(regiones)).to_numpy()
+
+def ordenar_priorizacion(tabla_turbinas, pasa, capex_max=None):
+    """
+    Ranking de priorización sin cortes: puntos que pasan los filtros con
+    PAT/Cross Flow, ordenados por CAPEX/VSS de forma estable
+    
+    Args:
+        tabla_turbinas: Tabla de calcular_turbinas_vectorizado()
+        pasa: Máscara de mascara_filtros()
+        capex_max: CAPEX máximo en USD de la turbina PAT/Cross Flow más barata (None = sin filtro)
+    
+    Returns:
+        (filas, mejor, capex_presupuesto): posiciones de los puntos en orden
+        de ranking, turbina priorizada por punto ('indice_turbina' es su fila
+        en tabla_turbinas) y CAPEX mínimo PAT/Cross Flow por punto
+    """
+    priorizables = tabla_turbinas[tabla_turbinas['tipo'].isin(TURBINAS_PRIORIZABLES)]
+    grupos = priorizables.groupby('fila')
+    mejor = priorizables.loc[grupos['capex_por_vss'].idxmin()]
+    mejor = mejor.assign(indice_turbina=mejor.index).set_index('fila')
+    capex_presupuesto = grupos['capex_total'].min()
+    
+    filas = mejor.index[pasa[mejor.index]]
+    if capex_max is not None:
+        filas = filas[(capex_presupuesto.loc[filas] <= capex_max).to_numpy()]
+    
+    # Orden estable por CAPEX/VSS (empates: orden original de los puntos)
+    filas = mejor.loc[filas].sort_values('capex_por_vss', kind='mergesort').index
+    return filas, mejor, capex_presupuesto
+
+def cortar_priorizacion(filas, capex_presupuesto, top_n=None, presupuesto=None):
+    """
+    Aplica Top N y presupuesto acumulado desde el ranking #1 (se detiene en
+    el primer punto que no cabe, como en el mapa)
+    """
+    if top_n is not None and top_n > 0:
+        filas = filas[:top_n]
+    if presupuesto is not None and presupuesto > 0:
+        acumulado = capex_presupuesto.loc[filas].cumsum().to_numpy()
+        filas = filas[acumulado <= presupuesto]
+    return filas
+
+def filtrar_y_priorizar(tabla_puntos, tabla_turbinas, caudal_min=CAUDAL_MIN_INICIAL,
+                        caudal_max=CAUDAL_MAX_INICIAL, pendiente_min=PENDIENTE_MIN_INICIAL,
+                        vss_min=0, turbinas=None, regiones=None, capex_max=None,
+                        priorizacion=False, top_n=None, presupuesto=None):
+    """
+    Aplica los mismos filtros y el mismo ranking que el mapa sobre las
+    tablas de calcular_tablas_vectorizado()
+    
+    Args:
+        tabla_puntos, tabla_turbinas: Tablas de calcular_tablas_vectorizado()
+        caudal_min, caudal_max, pendiente_min, vss_min: Filtros del mapa
+        turbinas: Tipos de turbina seleccionados (None = todos; no aplica en priorización)
+        regiones: Regiones seleccionadas (None = todas)
+        capex_max: CAPEX máximo en USD (None = sin filtro)
+        priorizacion: True para el modo ⭐ Priorización (PAT/Cross Flow por CAPEX/VSS)
+        top_n: Top N del ranking (solo priorización)
+        presupuesto: Presupuesto máximo en USD (solo priorización)
+    
+    Returns:
+        DataFrame con una fila por punto visible, con la turbina recomendada
+        (menor CAPEX) y, en priorización, el ranking y la turbina priorizada
+    """
+    pasa = mascara_filtros(tabla_puntos, caudal_min, caudal_max, pendiente_min, vss_min, regiones)
+    
+    # Turbina recomendada: menor CAPEX total (la primera en caso de empate)
+    recomendada = tabla_turbinas.loc[tabla_turbinas.groupby('fila')['capex_total'].idxmin()].set_index('fila')
+    
+    if priorizacion:
+        filas, mejor, capex_presupuesto = ordenar_priorizacion(tabla_turbinas, pasa, capex_max)
+        filas = cortar_priorizacion(filas, capex_presupuesto, top_n, presupuesto)
+        
+        resultado = tabla_puntos.iloc[filas].reset_index(drop=True)
+        resultado.insert(0, 'ranking', np.arange(1, len(filas) + 1))
+        resultado['turbina_priorizada'] = mejor.loc[filas, 'tipo'].to_numpy()
+        resultado['capex_por_vss_priorizada'] = mejor.loc[filas, 'capex_por_vss'].to_numpy()
+        resultado['capex_total_priorizada'] = mejor.loc[filas, 'capex_total'].to_numpy()
+        resultado['capex_presupuesto'] = capex_presupuesto.loc[filas].to_numpy()
+    else:
+        # Al menos una turbina seleccionada y al menos una con CAPEX <= capex_max
+        n = len(tabla_puntos)
+        fila = tabla_turbinas['fila'].to_numpy()
+        seleccion = tabla_turbinas['tipo'].isin(turbinas).to_numpy() if turbinas is not None \
+            else np.ones(len(fila), dtype=bool)
+        pasa = pasa & (np.bincount(fila[seleccion], minlength=n) > 0)
+        if capex_max is not None:
+            pasa = pasa & (np.bincount(fila[tabla_turbinas['capex_total'].to_numpy() <= capex_max], minlength=n) > 0)
+        
+        filas = np.flatnonzero(pasa)
+        resultado = tabla_puntos.iloc[filas].reset_index(drop=True)
+    
+    # Turbinas aplicables y turbina recomendada de cada punto visible
+    tipos = tabla_turbinas.groupby('fila')['tipo'].agg(', '.join)
+    resultado['turbinas'] = tipos.loc[filas].to_numpy()
+    resultado['turbina_recomendada'] = recomendada.loc[filas, 'tipo'].to_numpy()
+    for campo in ['potencia_maxima', 'potencia_usada_costes', 'vss_abastecibles', 'es_hibrida',
+                  'capex_total', 'opex', 'capex_por_vss']:
+        resultado[campo] = recomendada.loc[filas, campo].to_numpy()
+    
+    return resultado
+
+def agregar_por_territorio(resultado):
+    """
+    Resumen por departamento y por municipio en una sola agrupación (las
+    filas se apilan una vez por nivel)
+    
+    Args:
+        resultado: Una fila por punto visible con departamento, municipio, vss
+            y vss_abastecibles, capex_total y capex_por_vss de la turbina
+            recomendada (como filtrar_y_priorizar())
+    
+    Returns:
+        DataFrame con una fila por territorio: nivel ('departamento' o
+        'municipio'), departamento, municipio ('' en el nivel departamento),
+        puntos, vss, vss_abastecibles, capex_por_vss_min, capex_por_vss_mediana
+        (sin las turbinas que no abastecen VSS) y capex_total, ordenado por
+        VSS abastecibles
+    """
+    base = resultado[['departamento', 'municipio', 'vss', 'vss_abastecibles', 'capex_total', 'capex_por_vss']]
+    base = base.assign(capex_por_vss=base['capex_por_vss'].where(base['capex_por_vss'] > 0))
+    apilada = pd.concat([base.assign(nivel='departamento', municipio=''), base.assign(nivel='municipio')],
+                        ignore_index=True)
+    agregados = apilada.groupby(['nivel', 'departamento', 'municipio'], sort=False).agg(
+        puntos=('vss', 'size'), vss=('vss', 'sum'), vss_abastecibles=('vss_abastecibles', 'sum'),
+        capex_por_vss_min=('capex_por_vss', 'min'), capex_por_vss_mediana=('capex_por_vss', 'median'),
+        capex_total=('capex_total', 'sum'))
+    return agregados.reset_index().sort_values(
+        ['nivel', 'vss_abastecibles', 'departamento', 'municipio'], ascending=[True, False, True, True],
+        kind='mergesort', ignore_index=True)
+
+def guardar_resultados(resultado, ruta):
+    """
+    Guarda la tabla de resultados en Parquet o CSV según la extensión (CSV si
+    no hay motor de Parquet instalado)
+    
+    Returns:
+        Ruta del archivo guardado
+    """
+    import importlib.util
+    if ruta.lower().endswith('.parquet') and not any(importlib.util.find_spec(m) for m in ('pyarrow', 'fastparquet')):
+        ruta = ruta[:-len('.parquet')] + '.csv'
+        print("⚠️  pyarrow no está instalado: los resultados se guardan en CSV (pip install pyarrow)")
+    if ruta.lower().endswith('.parquet'):
+        resultado.to_parquet(ruta, index=False)
+    else:
+        resultado.to_csv(ruta, index=False, encoding='utf-8-sig')
+    contar('filas_guardadas', len(resultado))
+    print(f"✓ {len(resultado):,} filas guardadas en {ruta}")
+    return ruta
+
+# ====================================================================
+# BARRIDO DE ESCENARIOS DE PARÁMETROS
+# ====================================================================
+
+# Arrays de puntos compartidos en memoria (se asignan en cada proceso del barrido)
+CAMPOS_BARRIDO = ['id', 'caudal_cfs', 'caida_ft', 'potencia_k', 'vss', 'potencia_pico',
+                  'dist_punto_capital', 'codigo_region', 'pasa_filtros']
+ARRAYS_BARRIDO = None
+
+def leer_escenarios(ruta):
+    """
+    Lee los escenarios del barrido desde un JSON con una de estas formas:
+      - Lista de escenarios: [{"nombre": "base"}, {"nombre": "PAT caro", "COSTOS_CAPEX.PAT": 150}]
+      - Rejilla: {"rejilla": {"COSTOS_CAPEX.PAT": [80, 100, 120],
+                              "PARAMETROS_COSTES.obra_civil_kw": [2000, 2200]}}
+    
+    Returns:
+        Lista de tuplas (nombre, cambios)
+    """
+    import itertools
+    
+    with open(ruta, 'r', encoding='utf-8') as f:
+        datos = json.load(f)
+    
+    if isinstance(datos, dict) and 'rejilla' in datos:
+        claves = list(datos['rejilla'].keys())
+        escenarios = []
+        for valores in itertools.product(*(datos['rejilla'][c] for c in claves)):
+            cambios = dict(zip(claves, valores))
+            escenarios.append((' | '.join(f"{c}={v}" for c, v in cambios.items()), cambios))
+    else:
+        escenarios = []
+        for i, esc in enumerate(datos):
+            cambios = {c: v for c, v in esc.items() if c != 'nombre'}
+            escenarios.append((esc.get('nombre', f"escenario_{i + 1}"), cambios))
+    
+    # Validar antes de repartir el trabajo
+    for _, cambios in escenarios:
+        parametros_escenario(cambios)
+    return escenarios
+
+def conectar_arrays_barrido(nombre_memoria, forma):
+    """
+    Inicializador de cada proceso: se conecta al bloque de memoria compartida
+    con los arrays de los puntos (solo lectura, sin copiarlos)
+    """
+    from multiprocessing import shared_memory
+    global ARRAYS_BARRIDO
+    
+    memoria = shared_memory.SharedMemory(name=nombre_memoria)
+    matriz = np.ndarray(forma, dtype=np.float64, buffer=memoria.buf)
+    matriz.flags.writeable = False
+    ARRAYS_BARRIDO = (memoria, {campo: matriz[i] for i, campo in enumerate(CAMPOS_BARRIDO)})
+
+def evaluar_escenario(tarea):
+    """
+    Evalúa selección de turbinas, costes y ranking de todos los puntos con
+    los parámetros de un escenario (se ejecuta en un proceso hijo)
+    
+    Args:
+        tarea: Tupla (escenario, nombre, cambios, capex_max, top_n, presupuesto)
+    
+    Returns:
+        (tabla, resumen): DataFrame escenario × punto × turbina y
+        diccionario con las métricas del escenario
+    """
+    escenario, nombre, cambios, capex_max, top_n, presupuesto = tarea
+    arrays = ARRAYS_BARRIDO[1]
+    
+    tabla_turbinas = calcular_turbinas_vectorizado(arrays, parametros_escenario(cambios))
+    filas, mejor, capex_presupuesto = ordenar_priorizacion(tabla_turbinas, arrays['pasa_filtros'] > 0, capex_max)
+    seleccion = cortar_priorizacion(filas, capex_presupuesto, top_n, presupuesto)
+    
+    ranking = np.zeros(len(arrays['id']), dtype=int)
+    ranking[filas.to_numpy()] = np.arange(1, len(filas) + 1)
+    priorizada = np.zeros(len(tabla_turbinas), dtype=bool)
+    priorizada[mejor.loc[filas, 'indice_turbina'].to_numpy()] = True
+    
+    fila = tabla_turbinas['fila'].to_numpy()
+    tabla = pd.DataFrame({
+        'escenario': escenario,
+        'id': arrays['id'][fila].astype(int),
+        'tipo': tabla_turbinas['tipo'].to_numpy(),
+        'potencia_maxima': tabla_turbinas['potencia_maxima'].to_numpy(),
+        'potencia_usada_costes': tabla_turbinas['potencia_usada_costes'].to_numpy(),
+        'vss_abastecibles': tabla_turbinas['vss_abastecibles'].to_numpy(),
+        'es_hibrida': tabla_turbinas['es_hibrida'].to_numpy(),
+        'capex_total': tabla_turbinas['capex_total'].to_numpy(),
+        'opex': tabla_turbinas['opex'].to_numpy(),
+        'capex_por_vss': tabla_turbinas['capex_por_vss'].to_numpy(),
+        'ranking': ranking[fila],  # 0 = fuera del ranking de priorización
+        'priorizada': priorizada
+    })
+    
+    capex_por_vss = mejor.loc[filas, 'capex_por_vss']
+    resumen = {
+        'escenario': escenario,
+        'nombre': nombre,
+        **cambios,
+        'turbinas': len(tabla_turbinas),
+        'puntos_con_turbina': tabla_turbinas['fila'].nunique(),
+        'candidatos': len(filas),
+        'capex_por_vss_min': capex_por_vss.min() if len(filas) else np.nan,
+        'capex_por_vss_mediana': capex_por_vss.median() if len(filas) else np.nan,
+        'seleccionados': len(seleccion),
+        'capex_seleccion': capex_presupuesto.loc[seleccion].sum(),
+        'vss_seleccion': int(mejor.loc[seleccion, 'vss_abastecibles'].sum()),
+        'ids_top10': ' '.join(str(int(i)) for i in arrays['id'][filas[:10].to_numpy()])
+    }
+    return tabla, resumen
+
+@etapa('barrido', "BARRIDO DE ESCENARIOS")
+def ejecutar_barrido(tabla_puntos, arrays, escenarios, pasa, capex_max=None, top_n=None,
+                     presupuesto=None, procesos=None, ruta_salida=RUTA_RESULTADOS_BARRIDO):
+    """
+    Evalúa todos los escenarios repartiéndolos entre varios procesos; los
+    arrays de los puntos se comparten en memoria de solo lectura
+    
+    Args:
+        tabla_puntos, arrays: Resultado de preparar_arrays_puntos()
+        escenarios: Lista de (nombre, cambios) de leer_escenarios()
+        pasa: Máscara de mascara_filtros()
+        capex_max, top_n, presupuesto: Filtros de priorización
+        procesos: Número de procesos (None = todos los núcleos)
+        ruta_salida: Tabla escenario × punto × turbina (.parquet o .csv)
     
-    setTimeout(function() {{
-        actualizarValores();
-        actualizar();
-    }}, 500);
-    </script>
-    '''
+    Returns:
+        (tabla, resumen): DataFrames con los resultados y las métricas por escenario
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
     
-    mapa.get_root().html.add_child(folium.Element(controles_html))
-    mapa.get_root().html.add_child(folium.Element(javascript))
+    procesos = min(procesos or os.cpu_count() or 1, len(escenarios))
+    print(f"  Escenarios: {len(escenarios):,} | Puntos: {len(tabla_puntos):,} | Procesos: {procesos}")
     
-    folium.LayerControl(collapsed=False).add_to(mapa)
-    plugins.Fullscreen().add_to(mapa)
-    plugins.MiniMap(toggle_display=True).add_to(mapa)
+    forma = (len(CAMPOS_BARRIDO), len(tabla_puntos))
+    memoria = shared_memory.SharedMemory(create=True, size=max(1, forma[0] * forma[1] * 8))
+    try:
+        matriz = np.ndarray(forma, dtype=np.float64, buffer=memoria.buf)
+        for i, campo in enumerate(CAMPOS_BARRIDO):
+            matriz[i] = pasa if campo == 'pasa_filtros' else arrays[campo]
+        
+        tareas = [(i + 1, nombre, cambios, capex_max, top_n, presupuesto)
+                  for i, (nombre, cambios) in enumerate(escenarios)]
+        tablas = []
+        resumenes = []
+        paso = max(1, len(tareas) // 10)
+        with ProcessPoolExecutor(max_workers=procesos, initializer=conectar_arrays_barrido,
+                                 initargs=(memoria.name, forma)) as pool:
+            for i, (tabla, resumen) in enumerate(pool.map(evaluar_escenario, tareas), 1):
+                tablas.append(tabla)
+                resumenes.append(resumen)
+                if i % paso == 0 or i == len(tareas):
+                    print(f"  ✓ {i:,}/{len(tareas):,} escenarios")
+        del matriz
+    finally:
+        memoria.close()
+        memoria.unlink()
     
-    print("✓ Mapa creado")
-    return mapa
+    tabla = pd.concat(tablas, ignore_index=True)
+    resumen = pd.DataFrame(resumenes)
+    
+    base, extension = os.path.splitext(ruta_salida)
+    guardar_resultados(tabla, ruta_salida)
+    guardar_resultados(resumen, f"{base}_resumen{extension}")
+    return tabla, resumen
+
+# ====================================================================
+# MONTE CARLO DE COSTES
+# ====================================================================
+
+def muestrear_parametros(distribuciones, n_muestras, semilla=None):
+    """
+    Extrae N muestras de cada parámetro incierto
+    
+    Args:
+        distribuciones: Diccionario {'TABLA.clave': distribución} (ver DISTRIBUCIONES_MONTECARLO)
+        n_muestras: Número de muestras
+        semilla: Semilla del generador (None = aleatoria)
+    
+    Returns:
+        Diccionario {'TABLA.clave': array de n_muestras valores}
+    """
+    rng = np.random.default_rng(semilla)
+    muestras = {}
+    
+    for clave, distribucion in distribuciones.items():
+        if clave.startswith('EFICIENCIAS_TURBINAS.'):
+            raise ValueError(f"{clave}: las eficiencias cambian la selección de turbinas (usar --barrido)")
+        tipo, *valores = distribucion
+        if tipo == 'uniforme':
+            muestras[clave] = rng.uniform(valores[0], valores[1], n_muestras)
+        elif tipo == 'triangular':
+            muestras[clave] = rng.triangular(valores[0], valores[1], valores[2], n_muestras)
+        elif tipo == 'normal':
+            muestras[clave] = np.maximum(0, rng.normal(valores[0], valores[1], n_muestras))
+        elif tipo == 'lognormal':
+            muestras[clave] = valores[0] * np.exp(rng.normal(0, valores[1], n_muestras))
+        else:
+            raise ValueError(f"{clave}: distribución desconocida '{tipo}'")
+    
+    parametros_escenario({clave: 0 for clave in muestras})  # Valida las claves
+    return muestras
+
+def preparar_montecarlo(arrays, pasa, capex_max=None):
+    """
+    Parte fija del Monte Carlo: la selección de turbinas y las potencias no
+    dependen de los parámetros de costes, así que se calculan una sola vez
+    para los candidatos a priorización (pasan los filtros y admiten PAT o
+    Cross Flow)
+    
+    Args:
+        arrays: Resultado de preparar_arrays_puntos()
+        pasa: Máscara de mascara_filtros()
+        capex_max: CAPEX máximo en USD de la turbina PAT/Cross Flow más barata
+            con los parámetros base, como en ordenar_priorizacion() (None = sin filtro)
+    
+    Returns:
+        Diccionario con las posiciones de los candidatos, su distancia a la
+        capital, su código de región y, por turbina priorizable, la máscara
+        de aplicabilidad, la potencia para costes y las VSS abastecidas
+    """
+    eficiencias = parametros_escenario()['EFICIENCIAS_TURBINAS']
+    dentro = {tipo: dentro_de_turbina(arrays, tipo)
+              for tipo in RECTANGULOS_TURBINAS if tipo in TURBINAS_PRIORIZABLES}
+    filas = np.flatnonzero(pasa & np.logical_or.reduce(list(dentro.values())))
+    
+    # Mismo orden de turbinas que el mapa (en empate gana la primera)
+    turbinas = []
+    for tipo, mascara in dentro.items():
+        _, _, _, potencia, vss_abastecibles = potencias_turbina(arrays, filas, eficiencias[tipo])
+        turbinas.append((tipo, mascara[filas], potencia, vss_abastecibles))
+    
+    dist_punto_capital = arrays['dist_punto_capital'][filas]
+    codigo_region = arrays['codigo_region'][filas].astype(int)
+    if capex_max is not None:
+        parametros = parametros_escenario()
+        regiones = parametros['MULTIPLICADOR_REGION']
+        m_region = np.array([regiones[r] for r in MULTIPLICADOR_REGION] + [1.2])[codigo_region]
+        capex_presupuesto = np.full(len(filas), np.inf)
+        for tipo, valida, potencia, _ in turbinas:
+            capex = calcular_costes_vectorizado(tipo, potencia, dist_punto_capital, m_region, parametros)['capex_total']
+            capex_presupuesto = np.where(valida, np.minimum(capex_presupuesto, capex), capex_presupuesto)
+        quedan = capex_presupuesto <= capex_max
+        filas, dist_punto_capital, codigo_region = filas[quedan], dist_punto_capital[quedan], codigo_region[quedan]
+        turbinas = [(tipo, valida[quedan], potencia[quedan], vss_abastecibles[quedan])
+                    for tipo, valida, potencia, vss_abastecibles in turbinas]
+    
+    return {
+        'filas': filas,
+        'dist_punto_capital': dist_punto_capital,
+        'codigo_region': codigo_region,
+        'turbinas': turbinas
+    }
+
+def costes_muestras(datos, muestras, inicio, fin, puntos=slice(None)):
+    """
+    CAPEX total y CAPEX/VSS de la turbina priorizada (menor CAPEX/VSS entre
+    PAT y Cross Flow) para un bloque de muestras y de candidatos
+    
+    Args:
+        datos: Resultado de preparar_montecarlo()
+        muestras: Resultado de muestrear_parametros() ({} = valores base)
+        inicio, fin: Bloque de muestras
+        puntos: Bloque de candidatos (slice)
+    
+    Returns:
+        (capex, capex_por_vss): arrays muestras × candidatos
+    """
+    n = fin - inicio
+    parametros = parametros_escenario()
+    for clave, valores in muestras.items():
+        tabla, _, campo = clave.partition('.')
+        parametros[tabla][campo] = valores[inicio:fin, None]
+    
+    # Multiplicador por región de cada muestra y candidato
+    regiones = parametros['MULTIPLICADOR_REGION']
+    tabla_region = np.column_stack([np.broadcast_to(regiones[r], (n, 1))[:, 0] for r in MULTIPLICADOR_REGION] +
+                                   [np.full(n, 1.2)])
+    m_region = tabla_region[:, datos['codigo_region'][puntos]]
+    dist = datos['dist_punto_capital'][puntos]
+    
+    capex = capex_por_vss = None
+    for tipo, valida, potencia, vss_abastecibles in datos['turbinas']:
+        capex_turbina = calcular_costes_vectorizado(tipo, potencia[puntos], dist, m_region, parametros)['capex_total']
+        capex_turbina = np.broadcast_to(capex_turbina, (n, len(dist)))
+        vss_turbina = vss_abastecibles[puntos]
+        por_vss = np.divide(capex_turbina, vss_turbina, out=np.zeros(capex_turbina.shape), where=vss_turbina > 0)
+        por_vss = np.where(valida[puntos], por_vss, np.inf)
+        
+        if capex is None:
+            capex, capex_por_vss = capex_turbina, por_vss
+        else:
+            mejor = por_vss < capex_por_vss
+            capex = np.where(mejor, capex_turbina, capex)
+            capex_por_vss = np.where(mejor, por_vss, capex_por_vss)
+    
+    return capex, capex_por_vss
+
+def rangos_por_muestra(capex_por_vss):
+    """
+    Posición en el ranking de cada candidato en cada muestra (1 = mejor;
+    empates en el orden original, como el ranking del mapa)
+    """
+    orden = np.argsort(capex_por_vss, axis=1, kind='stable')
+    rangos = np.empty_like(orden)
+    np.put_along_axis(rangos, orden, np.arange(1, orden.shape[1] + 1)[None, :], axis=1)
+    return rangos
+
+@etapa('montecarlo', "MONTE CARLO DE COSTES")
+def ejecutar_montecarlo(tabla_puntos, arrays, pasa, n_muestras, capex_max=None, distribuciones=None,
+                        top_n=TOP_N_MONTECARLO, semilla=None, ruta_salida=RUTA_RESULTADOS_MONTECARLO):
+    """
+    Monte Carlo de costes: evalúa todos los candidatos × muestras en bloques
+    y resume por punto los percentiles de CAPEX y la estabilidad del ranking
+    
+    Args:
+        tabla_puntos, arrays: Resultado de preparar_arrays_puntos()
+        pasa: Máscara de mascara_filtros()
+        n_muestras: Número de muestras
+        capex_max: CAPEX máximo en USD de los candidatos con los parámetros base (None = sin filtro)
+        distribuciones: Distribuciones de los parámetros (None = DISTRIBUCIONES_MONTECARLO)
+        top_n: Top N para la probabilidad de entrar en el ranking
+        semilla: Semilla del generador
+        ruta_salida: Archivo de resultados (.parquet o .csv)
+    
+    Returns:
+        DataFrame con una fila por candidato
+    """
+    datos = preparar_montecarlo(arrays, pasa, capex_max)
+    candidatos = len(datos['filas'])
+    if candidatos == 0:
+        print("⚠️  No hay candidatos a priorización con los filtros indicados")
+        return None
+    
+    muestras = muestrear_parametros(distribuciones or DISTRIBUCIONES_MONTECARLO, n_muestras, semilla)
+    print(f"  Muestras: {n_muestras:,} | Candidatos: {candidatos:,} | Parámetros inciertos: {len(muestras)}")
+    
+    _, por_vss_base = costes_muestras(datos, {}, 0, 1)
+    ranking_base = rangos_por_muestra(por_vss_base)[0]
+    
+    # Paso 1: bloques de muestras con todos los candidatos (rankings por muestra)
+    en_top = np.zeros(candidatos)
+    suma_rango = np.zeros(candidatos)
+    suma_rango2 = np.zeros(candidatos)
+    rango_min = np.full(candidatos, candidatos)
+    rango_max = np.zeros(candidatos, dtype=int)
+    
+    bloque = max(1, LIMITE_CELDAS_MONTECARLO // candidatos)
+    paso = max(1, n_muestras // 10)
+    for inicio in range(0, n_muestras, bloque):
+        fin = min(n_muestras, inicio + bloque)
+        _, por_vss = costes_muestras(datos, muestras, inicio, fin)
+        rangos = rangos_por_muestra(por_vss)
+        
+        en_top += (rangos <= top_n).sum(axis=0)
+        suma_rango += rangos.sum(axis=0)
+        suma_rango2 += (rangos.astype(float)**2).sum(axis=0)
+        rango_min = np.minimum(rango_min, rangos.min(axis=0))
+        rango_max = np.maximum(rango_max, rangos.max(axis=0))
+        
+        if fin // paso > inicio // paso or fin == n_muestras:
+            print(f"  ✓ Rankings: {fin:,}/{n_muestras:,} muestras")
+    
+    # Paso 2: bloques de candidatos con todas las muestras (percentiles)
+    capex_p = np.zeros((3, candidatos))
+    por_vss_p = np.zeros((3, candidatos))
+    bloque = max(1, LIMITE_CELDAS_MONTECARLO // n_muestras)
+    for inicio in range(0, candidatos, bloque):
+        fin = min(candidatos, inicio + bloque)
+        capex, por_vss = costes_muestras(datos, muestras, 0, n_muestras, slice(inicio, fin))
+        capex_p[:, inicio:fin] = np.percentile(capex, [10, 50, 90], axis=0)
+        por_vss_p[:, inicio:fin] = np.percentile(por_vss, [10, 50, 90], axis=0)
+    print(f"  ✓ Percentiles: {candidatos:,} candidatos")
+    
+    rango_medio = suma_rango / n_muestras
+    resultado = tabla_puntos.iloc[datos['filas']][['id', 'lat', 'lon', 'municipio', 'departamento', 'region']]
+    resultado = resultado.reset_index(drop=True)
+    resultado['ranking_base'] = ranking_base
+    resultado['capex_p10'] = capex_p[0]
+    resultado['capex_p50'] = capex_p[1]
+    resultado['capex_p90'] = capex_p[2]
+    resultado['capex_por_vss_p10'] = por_vss_p[0]
+    resultado['capex_por_vss_p50'] = por_vss_p[1]
+    resultado['capex_por_vss_p90'] = por_vss_p[2]
+    resultado[f'prob_top_{top_n}'] = en_top / n_muestras
+    resultado['rango_medio'] = rango_medio
+    resultado['rango_desv'] = np.sqrt(np.maximum(0, suma_rango2 / n_muestras - rango_medio**2))
+    resultado['rango_min'] = rango_min
+    resultado['rango_max'] = rango_max
+    resultado = resultado.sort_values('rango_medio', kind='mergesort').reset_index(drop=True)
+    
+    guardar_resultados(resultado, ruta_salida)
+    return resultado
+
+# ====================================================================
+# PRIORIZACIÓN E INFORMES POR LOTES
+# ====================================================================
+
+def tablas_priorizacion(puntos_data):
+    """
+    Tablas de puntos y de turbinas (las columnas que usan mascara_filtros() y
+    ordenar_priorizacion()) a partir de la lista de preparar_puntos()
+    
+    Returns:
+        (tabla_puntos, tabla_turbinas)
+    """
+    tabla_puntos = pd.DataFrame({
+        campo: [p[campo] for p in puntos_data] for campo in ('caudal', 'pendiente', 'vss', 'region')
+    })
+    turbinas = [(fila, t['tipo'], t['capex_total'], t['capex_por_vss'])
+                for fila, p in enumerate(puntos_data) for t in p['turbinas']]
+    tabla_turbinas = pd.DataFrame(turbinas, columns=['fila', 'tipo', 'capex_total', 'capex_por_vss'])
+    return tabla_puntos, tabla_turbinas
+
+def seleccionar_puntos_priorizados(puntos_data, top_n=None, presupuesto=None,
+                                   caudal_min=CAUDAL_MIN_INICIAL, caudal_max=CAUDAL_MAX_INICIAL,
+                                   pendiente_min=PENDIENTE_MIN_INICIAL, vss_min=0):
+    """
+    Ranking de priorización igual al del mapa (botón ⭐ Priorización): puntos
+    con PAT o Cross Flow ordenados por CAPEX/VSS, con Top N y presupuesto
+    acumulado desde el ranking #1. Usa ordenar_priorizacion() y
+    cortar_priorizacion(), como el análisis sin mapa
+    
+    Args:
+        puntos_data: Lista de puntos de preparar_puntos()
+        top_n: Número máximo de puntos (None = todos)
+        presupuesto: Presupuesto máximo en USD (None = sin límite)
+        caudal_min, caudal_max, pendiente_min, vss_min: Filtros del mapa
+    
+    Returns:
+        Lista de tuplas (ranking, punto, turbina_priorizada)
+    """
+    tabla_puntos, tabla_turbinas = tablas_priorizacion(puntos_data)
+    if not (tabla_turbinas['tipo'].isin(TURBINAS_PRIORIZABLES)).any():
+        return []
+    
+    pasa = mascara_filtros(tabla_puntos, caudal_min, caudal_max, pendiente_min, vss_min)
+    filas, mejor, capex_presupuesto = ordenar_priorizacion(tabla_turbinas, pasa)
+    filas = cortar_priorizacion(filas, capex_presupuesto, top_n, presupuesto)
+    
+    # La turbina priorizada es una fila de tabla_turbinas: su posición en el punto
+    inicio = tabla_turbinas.groupby('fila').cumcount().to_numpy()
+    seleccion = []
+    for ranking, (fila, indice) in enumerate(zip(filas, mejor.loc[filas, 'indice_turbina']), start=1):
+        punto = puntos_data[fila]
+        seleccion.append((ranking, punto, punto['turbinas'][inicio[indice]]))
+    return seleccion
+
+def formatear_numero(num):
+    """
+    Formato numérico de los informes: entero redondeado con espacios de miles
+    (igual que formatNumber en el mapa)
+    """
+    return f"{math.floor(num + 0.5):,}".replace(',', ' ')
+
+ESTILOS_INFORME = (
+    'body { font-family: Calibri, Arial, sans-serif; margin: 30px; font-size: 11pt; }'
+    'h1 { text-align: center; font-size: 14pt; font-weight: normal; margin-bottom: 20px; }'
+    'table { border-collapse: collapse; width: 100%; margin-bottom: 15px; }'
+    'td, th { border: 1px solid #ccc; padding: 6px 10px; font-size: 10pt; }'
+    '.header-rosa { background: #ED1782; color: white; text-align: center; font-weight: bold; }'
+    '.header-morado { background: #4F062A; color: white; text-align: center; font-weight: bold; }'
+    '.row-gris1 { background: #D0CEC1; }'
+    '.row-gris2 { background: #E3E2DA; }'
+    '.col-label { width: 45%; }'
+    '.col-value { width: 55%; text-align: center; }'
+    '.ranking-box { background: #ED1782; color: white; text-align: center; padding: 15px; font-size: 16pt; font-weight: bold; margin-bottom: 15px; }'
+)
+
+def renderizar_cuerpo_informe(tarea):
+    """
+    HTML del informe técnico de un punto, con las mismas secciones que el
+    informe Word del mapa (descargarInforme)
+    
+    Args:
+        tarea: Tupla (punto, ranking, tasa_cambio, fecha_generacion)
+    
+    Returns:
+        Fragmento HTML (sin cabecera del documento)
+    """
+    from html import escape
+    
+    punto, ranking, tasa_cambio, fecha_generacion = tarea
+    fn = formatear_numero
+    vss = math.floor(punto['vss'])
+    
+    def fila(clase, etiqueta, valor):
+        return (f'<tr><td class="{clase} col-label">{etiqueta}</td>'
+                f'<td class="{clase} col-value">{valor}</td></tr>')
+    
+    def tabla(titulo, filas):
+        html = f'<table><tr><td colspan="2" class="header-morado">{titulo}</td></tr>'
+        for i, (etiqueta, valor) in enumerate(filas):
+            html += fila('row-gris1' if i % 2 == 0 else 'row-gris2', etiqueta, valor)
+        return html + '</table>'
+    
+    municipio = escape(punto['municipio'])
+    departamento = escape(punto['departamento'])
+    region = escape(punto['region'])
+    capital = escape(str(punto['capital']))
+    depto_capital = escape(punto['depto_capital'])
+    zona_clima = escape(punto['zona_clima'])
+    
+    # Título y ranking
+    html = '<h1>Informe Técnico – Punto hidroeléctrico</h1>'
+    if ranking is not None:
+        html += f'<div class="ranking-box">⭐ RANKING #{ranking}</div>'
+    
+    # Fecha de generación
+    html += ('<table><tr><td class="header-rosa col-label">Fecha de generación del informe</td>'
+             f'<td class="row-gris1 col-value">{fecha_generacion}</td></tr></table>')
+    
+    # INFORMACIÓN DEL PUNTO
+    html += tabla('Información del punto', [
+        ('ID', punto['id']),
+        ('Municipio', municipio),
+        ('Departamento', departamento),
+        ('Región', region),
+        ('Coordenadas', f"{punto['lat']:.6f}, {punto['lon']:.6f}"),
+        ('Capital más cercana', f'{capital} ({depto_capital})'),
+        ('Distancia a capital', f"{fn(punto['dist_punto_capital'])} m"),
+    ])
+    
+    # ENERGÍA Y DEMANDA
+    html += tabla('Energía y Demanda', [
+        ('Caudal', f"{punto['caudal']:.3f} m³/s ({punto['caudal_cfs']:.2f} cfs)"),
+        ('Caída hidráulica', f"{punto['caida']:.2f} m ({punto['caida_ft']:.2f} ft)"),
+        ('Pendiente', f"{punto['pendiente']:.4f}"),
+        ('Viviendas sin servicio', f'{vss} viviendas'),
+        ('Zona climática', zona_clima),
+        ('Potencia pico', f"{punto['potencia_pico']:.2f} kW/vivienda"),
+        ('Turbinas disponibles', f"{len(punto['turbinas'])} tipo(s)"),
+    ])
+    
+    # TURBINAS
+    partidas = [
+        ('Turbina y generador', 'coste_turbina'),
+        ('Otros equipos', 'coste_equipos'),
+        ('Obra civil', 'coste_obra_civil'),
+        ('Instalación y puesta en marcha', 'coste_instalacion'),
+        ('Línea de conexión eléctrica', 'coste_linea'),
+        ('Costes ambientales', 'coste_ambiental'),
+        ('Transporte', 'coste_transporte'),
+        ('Otros costes', 'otros_costes'),
+    ]
+    for idx, turb in enumerate(punto['turbinas']):
+        cobertura = '⚠️ Híbrida recomendada' if turb['es_hibrida'] else '✓ Cobertura completa'
+        html += tabla(f"Turbina {idx + 1}: {turb['tipo'].upper()}", [
+            ('Potencia máxima aprovechable', f"{turb['potencia_maxima']:.2f} kW"),
+            ('Potencia para abastecer VSS', f"{turb['potencia_abastecer_vss']:.2f} kW"),
+            ('Potencia usada para costes', f"{turb['potencia_usada_costes']:.2f} kW"),
+            ('VSS abastecidas', f"{turb['vss_abastecibles']} de {vss}"),
+            ('Cobertura', cobertura),
+        ])
+        
+        # Tabla CAPEX (3 columnas)
+        def fila_coste(clase, etiqueta, valor):
+            return (f'<tr><td class="{clase}">{etiqueta}</td>'
+                    f'<td class="{clase}" style="text-align:right;">${fn(valor)}</td>'
+                    f'<td class="{clase}" style="text-align:right;">${fn(valor * tasa_cambio)}</td></tr>')
+        
+        html += ('<table><tr><td class="header-rosa">Partida</td><td class="header-rosa">USD</td>'
+                 '<td class="header-rosa">COP</td></tr>')
+        for i, (etiqueta, campo) in enumerate(partidas):
+            html += fila_coste('row-gris1' if i % 2 == 0 else 'row-gris2', etiqueta, turb[campo])
+        html += fila_coste('header-morado', 'CAPEX total', turb['capex_total'])
+        html += fila_coste('row-gris1', 'OPEX Anual (3%)', turb['opex'])
+        html += fila_coste('row-gris2', 'CAPEX Total / VSS', turb['capex_por_vss'])
+        html += '</table>'
+    
+    # TABLA DE ATRIBUTOS DEL PUNTO (al final)
+    atributos = tabla('Atributos del punto', [
+        ('ID', punto['id']),
+        ('Latitud', f"{punto['lat']:.6f}"),
+        ('Longitud', f"{punto['lon']:.6f}"),
+        ('Caudal (m³/s)', f"{punto['caudal']:.3f}"),
+        ('Caudal (cfs)', f"{punto['caudal_cfs']:.2f}"),
+        ('Caída (m)', f"{punto['caida']:.2f}"),
+        ('Caída (ft)', f"{punto['caida_ft']:.2f}"),
+        ('Pendiente', f"{punto['pendiente']:.4f}"),
+        ('VSS', vss),
+        ('Municipio', municipio),
+        ('Departamento', departamento),
+        ('Región', region),
+        ('Capital cercana', capital),
+        ('Depto. capital', depto_capital),
+        ('Distancia capital (m)', fn(punto['dist_punto_capital'])),
+        ('Zona climática', zona_clima),
+        ('Potencia pico (kW/viv)', f"{punto['potencia_pico']:.2f}"),
+    ])
+    if ranking is not None:
+        atributos = atributos[:-len('</table>')] + (
+            f'<tr><td class="header-rosa">Ranking priorización</td>'
+            f'<td class="header-rosa">#{ranking}</td></tr></table>')
+    html += atributos
+    
+    return html
+
+def envolver_documento_informe(cuerpos):
+    """
+    Documento Word (HTML .doc, como el informe del mapa) con uno o varios
+    informes separados por salto de página
+    """
+    separador = '<br clear="all" style="page-break-before: always">'
+    return ('\ufeff<!DOCTYPE html><html><head><meta charset="UTF-8"><style>' + ESTILOS_INFORME +
+            '</style></head><body>' + separador.join(cuerpos) + '</body></html>')
+
+def escribir_informe(tarea):
+    """
+    Renderiza y guarda el informe de un punto (se ejecuta en un proceso hijo)
+    
+    Args:
+        tarea: Tupla (ruta, punto, ranking, tasa_cambio, fecha_generacion)
+    
+    Returns:
+        Ruta del archivo escrito
+    """
+    ruta = tarea[0]
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write(envolver_documento_informe([renderizar_cuerpo_informe(tarea[1:])]))
+    return ruta
+
+@etapa('informes', "INFORMES POR LOTES")
+def generar_informes_lote(seleccion, carpeta=CARPETA_INFORMES, tasa_cambio=TASA_CAMBIO_INFORMES,
+                          procesos=None, documento_unico=False):
+    """
+    Genera los informes Word de los puntos priorizados repartiendo el
+    renderizado entre varios procesos
+    
+    Args:
+        seleccion: Lista de (ranking, punto, turbina) de seleccionar_puntos_priorizados()
+        carpeta: Carpeta de salida
+        tasa_cambio: COP por USD
+        procesos: Número de procesos (None = todos los núcleos)
+        documento_unico: True para un solo documento con una sección por punto
+    
+    Returns:
+        Lista de rutas generadas
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from datetime import datetime
+    
+    if len(seleccion) == 0:
+        print("⚠️  No hay puntos priorizados con los criterios indicados")
+        return []
+    
+    os.makedirs(carpeta, exist_ok=True)
+    ahora = datetime.now()
+    fecha_generacion = ahora.strftime('%d/%m/%Y, %H:%M:%S')
+    fecha = ahora.strftime('%Y%m%d')
+    procesos = procesos or os.cpu_count() or 1
+    total = len(seleccion)
+    bloque = max(1, total // (procesos * 4))
+    
+    print(f"  Puntos: {total:,} | Procesos: {procesos} | Carpeta: {carpeta}")
+    
+    if documento_unico:
+        tareas = [(punto, ranking, tasa_cambio, fecha_generacion) for ranking, punto, _ in seleccion]
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            cuerpos = list(pool.map(renderizar_cuerpo_informe, tareas, chunksize=bloque))
+        ruta = os.path.join(carpeta, f"Informes_Priorizacion_{fecha}_{total}puntos.doc")
+        with open(ruta, 'w', encoding='utf-8') as f:
+            f.write(envolver_documento_informe(cuerpos))
+        rutas = [ruta]
+    else:
+        digitos = len(str(total))
+        tareas = [(os.path.join(carpeta, f"Informe_R{ranking:0{digitos}d}_Punto_{punto['id']}_{fecha}.doc"),
+                   punto, ranking, tasa_cambio, fecha_generacion)
+                  for ranking, punto, _ in seleccion]
+        rutas = []
+        paso = max(1, total // 10)
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            for i, ruta in enumerate(pool.map(escribir_informe, tareas, chunksize=bloque), 1):
+                rutas.append(ruta)
+                if i % paso == 0 or i == total:
+                    print(f"  ✓ {i:,}/{total:,} informes")
+    
+    capex = sum(t['capex_total'] for _, _, t in seleccion)
+    contar('informes_generados', len(rutas))
+    print(f"✓ {len(rutas):,} archivo(s) en {carpeta} | CAPEX (turbina priorizada): ${formatear_numero(capex)} USD")
+    return rutas
+
+# ====================================================================
+# SERVIDOR LOCAL DE DATOS DEL MAPA
+# ====================================================================
+
+# Tablas e índice de los puntos en memoria (se asignan en iniciar_servidor())
+DATOS_SERVIDOR = None
+
+def construir_indice_rejilla(lat, lon, tamaño_celda=TAMAÑO_CELDA_INDICE):
+    """
+    Índice espacial de rejilla regular: las posiciones de los puntos quedan
+    ordenadas por celda (fila a fila), de modo que cada fila de celdas de un
+    bbox es un único tramo contiguo de 'orden'
+    
+    Args:
+        lat, lon: Arrays de coordenadas de los puntos
+        tamaño_celda: Lado de cada celda en grados
+    
+    Returns:
+        Diccionario con el origen, las dimensiones de la rejilla, 'orden'
+        (posiciones por celda) e 'inicio' (primer elemento de cada celda)
+    """
+    oeste = float(lon.min()) if len(lon) else 0.0
+    sur = float(lat.min()) if len(lat) else 0.0
+    columnas = int((lon.max() - oeste) // tamaño_celda) + 1 if len(lon) else 1
+    filas = int((lat.max() - sur) // tamaño_celda) + 1 if len(lat) else 1
+    
+    celda = ((lat - sur) // tamaño_celda).astype(np.int64) * columnas + ((lon - oeste) // tamaño_celda).astype(np.int64)
+    orden = np.argsort(celda, kind='stable')
+    inicio = np.searchsorted(celda[orden], np.arange(columnas * filas + 1))
+    
+    return {'oeste': oeste, 'sur': sur, 'tamaño': tamaño_celda, 'columnas': columnas, 'filas': filas,
+            'orden': orden, 'inicio': inicio, 'lat': lat, 'lon': lon}
+
+def consultar_indice_rejilla(indice, bbox):
+    """
+    Posiciones (ordenadas) de los puntos dentro de bbox = (oeste, sur, este, norte)
+    """
+    oeste, sur, este, norte = bbox
+    tamaño, columnas = indice['tamaño'], indice['columnas']
+    c0 = max(int((oeste - indice['oeste']) // tamaño), 0)
+    c1 = min(int((este - indice['oeste']) // tamaño), columnas - 1)
+    f0 = max(int((sur - indice['sur']) // tamaño), 0)
+    f1 = min(int((norte - indice['sur']) // tamaño), indice['filas'] - 1)
+    if c0 > c1 or f0 > f1:
+        return np.zeros(0, dtype=np.int64)
+    
+    inicio = indice['inicio']
+    tramos = [indice['orden'][inicio[f * columnas + c0]:inicio[f * columnas + c1 + 1]] for f in range(f0, f1 + 1)]
+    candidatos = np.concatenate(tramos)
+    lat, lon = indice['lat'][candidatos], indice['lon'][candidatos]
+    dentro = (lon >= oeste) & (lon <= este) & (lat >= sur) & (lat <= norte)
+    return np.sort(candidatos[dentro])
+
+def leer_consulta(parametros):
+    """
+    Convierte los parámetros de /api/puntos en claves normalizadas para la caché
+    
+    Parámetros (todos opcionales): bbox=oeste,sur,este,norte; caudal_min,
+    caudal_max, pendiente_min, vss_min (por defecto los del mapa); turbinas y
+    regiones separadas por comas ('Sin dato' = sin región); capex_max;
+    priorizacion=1; top; presupuesto; formato=json|binario; detalle=1
+    (puntos completos, como en el mapa); limite
+    
+    Returns:
+        (clave_filtros, clave_consulta)
+    """
+    def valor(nombre, tipo, defecto=None):
+        texto = parametros.get(nombre, [''])[0].strip()
+        return tipo(texto) if texto != '' else defecto
+    
+    def lista(nombre):
+        texto = parametros.get(nombre, [''])[0]
+        if texto.strip() == '':
+            return None
+        return tuple(sorted('' if x.strip().lower() == 'sin dato' else x.strip() for x in texto.split(',')))
+    
+    bbox = valor('bbox', str)
+    if bbox is None:
+        bbox = (-180.0, -90.0, 180.0, 90.0)
+    else:
+        oeste, sur, este, norte = (float(x) for x in bbox.split(','))
+        if not all(math.isfinite(x) for x in (oeste, sur, este, norte)):
+            raise ValueError("bbox debe tener valores finitos")
+        if oeste > este or sur > norte:
+            raise ValueError("bbox debe cumplir oeste <= este y sur <= norte")
+        # Se redondea hacia fuera para que vistas casi iguales compartan caché
+        bbox = (math.floor(oeste * 1e4) / 1e4, math.floor(sur * 1e4) / 1e4,
+                math.ceil(este * 1e4) / 1e4, math.ceil(norte * 1e4) / 1e4)
+    
+    formato = valor('formato', str, 'json')
+    if formato not in ('json', 'binario'):
+        raise ValueError(f"Formato desconocido: {formato}")
+    
+    clave_filtros = (valor('caudal_min', float, CAUDAL_MIN_INICIAL), valor('caudal_max', float, CAUDAL_MAX_INICIAL),
+                     valor('pendiente_min', float, PENDIENTE_MIN_INICIAL), valor('vss_min', float, 0),
+                     lista('turbinas'), lista('regiones'), valor('capex_max', float),
+                     valor('priorizacion', int, 0) == 1, valor('top', int), valor('presupuesto', float))
+    limite = valor('limite', int, LIMITE_PUNTOS_CONSULTA)
+    if limite < 0:
+        raise ValueError("limite no puede ser negativo")
+    limite = min(limite, LIMITE_PUNTOS_CONSULTA)
+    clave_consulta = (clave_filtros, bbox, formato, valor('detalle', int, 0) == 1, limite)
+    return clave_filtros, clave_consulta
+
+@functools.lru_cache(maxsize=32)
+def resultado_filtros(clave_filtros):
+    """
+    Filtros y ranking sobre todos los puntos (el ranking es global, no del
+    área visible). Se guarda en caché por combinación de filtros
+    
+    Returns:
+        (resultado, posiciones): tabla de filtrar_y_priorizar() y posición de
+        cada fila en la tabla de puntos del servidor
+    """
+    caudal_min, caudal_max, pendiente_min, vss_min, turbinas, regiones, capex_max, priorizacion, top_n, presupuesto = clave_filtros
+    resultado = filtrar_y_priorizar(
+        DATOS_SERVIDOR['tabla_puntos'], DATOS_SERVIDOR['tabla_turbinas'],
+        caudal_min, caudal_max, pendiente_min, vss_min,
+        list(turbinas) if turbinas is not None else None,
+        list(regiones) if regiones is not None else None,
+        capex_max, priorizacion, top_n, presupuesto
+    )
+    posiciones = DATOS_SERVIDOR['posicion_por_id'].get_indexer(resultado['id'])
+    return resultado, posiciones
+
+def registros_puntos(posiciones):
+    """
+    Puntos completos con el mismo formato que preparar_puntos() (turbinas con
+    costes y todos los atributos), a partir de las tablas del servidor
+    
+    Args:
+        posiciones: Posiciones en la tabla de puntos del servidor
+    
+    Returns:
+        Lista de diccionarios, uno por punto
+    """
+    tabla_puntos = DATOS_SERVIDOR['tabla_puntos']
+    tabla_turbinas = DATOS_SERVIDOR['tabla_turbinas']
+    inicio = DATOS_SERVIDOR['inicio_turbinas']
+    campos_turbina = [c for c in tabla_turbinas.columns if c not in ('fila', 'orden_tipo')]
+    
+    puntos = tabla_puntos.iloc[posiciones].to_dict('records')
+    cuantas = inicio[posiciones + 1] - inicio[posiciones]
+    filas_turbinas = np.concatenate([np.arange(inicio[p], inicio[p + 1]) for p in posiciones]) if len(posiciones) \
+        else np.zeros(0, dtype=np.int64)
+    turbinas = tabla_turbinas.iloc[filas_turbinas][campos_turbina].to_dict('records')
+    
+    atributos = restaurar_tipos_puntos(DATOS_SERVIDOR['puntos'].iloc[posiciones])
+    columnas = [col for col in atributos.columns if col != 'geometry']
+    
+    registros = []
+    desde = 0
+    for punto, n, valores in zip(puntos, cuantas, atributos[columnas].itertuples(index=False, name=None)):
+        registro = {campo: punto[campo] for campo in ['lat', 'lon', 'id', 'caudal', 'caida', 'potencia_k',
+                                                      'caudal_cfs', 'caida_ft']}
+        registro['turbinas'] = turbinas[desde:desde + n]
+        desde += n
+        for campo in ['pendiente', 'municipio', 'departamento', 'region', 'zona_clima', 'potencia_pico', 'vss',
+                      'distancia', 'capital', 'depto_capital', 'dist_punto_capital', 'dist_nucleo_capital']:
+            registro[campo] = punto[campo]
+        registro['todos_atributos'] = {col: str(v) if pd.notna(v) else 'N/A' for col, v in zip(columnas, valores)}
+        registros.append(registro)
+    return registros
+
+def codificar_binario(resultado, total):
+    """
+    Respuesta binaria compacta (little-endian): 'PCH1', uint32 devueltos,
+    uint32 total y después, columna a columna, id uint32, lat float32,
+    lon float32, ranking uint32 (0 = sin ranking), capex_por_vss float32 y
+    turbina uint8 (posición en RECTANGULOS_TURBINAS; 255 = ninguna)
+    """
+    n = len(resultado)
+    tipos = {tipo: i for i, tipo in enumerate(RECTANGULOS_TURBINAS)}
+    priorizado = 'ranking' in resultado.columns
+    turbina = resultado['turbina_priorizada' if priorizado else 'turbina_recomendada']
+    capex_por_vss = resultado['capex_por_vss_priorizada' if priorizado else 'capex_por_vss']
+    ranking = resultado['ranking'].to_numpy() if priorizado else np.zeros(n)
+    
+    partes = [
+        b'PCH1', np.array([n, total], dtype='<u4').tobytes(),
+        resultado['id'].to_numpy().astype('<u4').tobytes(),
+        resultado['lat'].to_numpy().astype('<f4').tobytes(),
+        resultado['lon'].to_numpy().astype('<f4').tobytes(),
+        ranking.astype('<u4').tobytes(),
+        capex_por_vss.to_numpy().astype('<f4').tobytes(),
+        turbina.map(tipos).fillna(255).to_numpy().astype('u1').tobytes()
+    ]
+    return b''.join(partes)
+
+@functools.lru_cache(maxsize=TAMAÑO_CACHE_CONSULTAS)
+def responder_consulta(clave_consulta):
+    """
+    Respuesta de /api/puntos: puntos del bbox que pasan los filtros, en el
+    orden del ranking (priorización) o de la tabla. Se guarda en caché LRU
+    
+    Returns:
+        (contenido, tipo MIME)
+    """
+    clave_filtros, bbox, formato, detalle, limite = clave_consulta
+    contar('consultas_calculadas')
+    resultado, posiciones = resultado_filtros(clave_filtros)
+    
+    en_bbox = np.zeros(len(DATOS_SERVIDOR['tabla_puntos']), dtype=bool)
+    en_bbox[consultar_indice_rejilla(DATOS_SERVIDOR['indice'], bbox)] = True
+    visibles = en_bbox[posiciones]
+    total = int(visibles.sum())
+    resultado = resultado[visibles].iloc[:limite]
+    posiciones = posiciones[visibles][:limite]
+    
+    if formato == 'binario':
+        return codificar_binario(resultado, total), 'application/octet-stream'
+    
+    respuesta = {'total': total, 'devueltos': len(resultado), 'truncado': total > len(resultado)}
+    if detalle:
+        respuesta['puntos'] = registros_puntos(posiciones)
+        if 'ranking' in resultado.columns:
+            respuesta['ranking'] = resultado['ranking'].tolist()
+    else:
+        respuesta['columnas'] = list(resultado.columns)
+        respuesta['filas'] = resultado.to_numpy(dtype=object).tolist()
+    return json.dumps(respuesta, separators=(',', ':'), default=str).encode('utf-8'), 'application/json'
+
+class ManejadorDatosMapa(SimpleHTTPRequestHandler):
+    """
+    /api/puntos: consulta por bbox, filtros y ranking (ver leer_consulta())
+    /api/estado: puntos en memoria y uso de la caché
+    / y /NOMBRE_MAPA_SERVIDOR: el mapa; /CARPETA_TESELAS/...: teselas de las
+    capas. Nada más de la carpeta de trabajo (cachés, manifiestos, datos) se sirve
+    """
+    def do_GET(self):
+        ruta = urlparse(self.path)
+        # Misma normalización que translate_path(), para que '..' o %2e%2e no
+        # salgan de la carpeta de teselas
+        archivo = posixpath.normpath(unquote(ruta.path))
+        if ruta.path == '/api/puntos':
+            try:
+                _, clave_consulta = leer_consulta(parse_qs(ruta.query))
+            except ValueError as e:
+                self.enviar(json.dumps({'error': str(e)}).encode('utf-8'), 'application/json', 400)
+                return
+            contar('consultas')
+            self.enviar(*responder_consulta(clave_consulta))
+        elif ruta.path == '/api/estado':
+            cache = responder_consulta.cache_info()
+            estado = {'puntos': len(DATOS_SERVIDOR['tabla_puntos']),
+                      'turbinas': len(DATOS_SERVIDOR['tabla_turbinas']),
+                      'cache': {'aciertos': cache.hits, 'fallos': cache.misses,
+                                'tamaño': cache.currsize, 'maximo': cache.maxsize}}
+            self.enviar(json.dumps(estado).encode('utf-8'), 'application/json')
+        elif archivo in ('/', '/' + NOMBRE_MAPA_SERVIDOR):
+            self.path = '/' + NOMBRE_MAPA_SERVIDOR
+            super().do_GET()
+        elif archivo.startswith('/' + CARPETA_TESELAS + '/'):
+            super().do_GET()
+        else:
+            self.send_error(404)
+    
+    def enviar(self, contenido, tipo, estado=200):
+        self.send_response(estado)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(contenido)))
+        self.end_headers()
+        self.wfile.write(contenido)
+    
+    def log_message(self, formato, *args):
+        pass
+
+def iniciar_servidor(puntos_filtrados, capas_areas, total_original, puerto=PUERTO_SERVIDOR):
+    """
+    Carga los puntos en memoria con un índice de rejilla, guarda el mapa sin
+    puntos embebidos (NOMBRE_MAPA_SERVIDOR) y atiende las consultas en
+    http://127.0.0.1:puerto/ hasta Ctrl+C. No usa servicios externos
+    """
+    global DATOS_SERVIDOR
+    
+    with etapa('preparacion_servidor', "PREPARANDO SERVIDOR DE DATOS"):
+        tabla_puntos, tabla_turbinas = calcular_tablas_vectorizado(puntos_filtrados)
+        DATOS_SERVIDOR = {
+            'puntos': puntos_filtrados,
+            'tabla_puntos': tabla_puntos,
+            'tabla_turbinas': tabla_turbinas,
+            'posicion_por_id': pd.Index(tabla_puntos['id']),
+            'inicio_turbinas': np.searchsorted(tabla_turbinas['fila'].to_numpy(), np.arange(len(tabla_puntos) + 1)),
+            'indice': construir_indice_rejilla(tabla_puntos['lat'].to_numpy(), tabla_puntos['lon'].to_numpy())
+        }
+        resultado_filtros.cache_clear()
+        responder_consulta.cache_clear()
+        
+        mapa = crear_mapa_interactivo(puntos_filtrados, capas_areas, total_original, puntos_data=[], servidor=True)
+        mapa.save(NOMBRE_MAPA_SERVIDOR)
+    
+    servidor = ThreadingHTTPServer(('127.0.0.1', puerto),
+                                   functools.partial(ManejadorDatosMapa, directory=os.getcwd()))
+    print(f"\n🌐 Servidor de datos en http://127.0.0.1:{puerto}/ (Ctrl+C para detener)")
+    print("   API: /api/puntos?bbox=oeste,sur,este,norte&priorizacion=1&formato=json|binario")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  Servidor detenido")
+    finally:
+        servidor.server_close()
+        cache = responder_consulta.cache_info()
+        contar('cache_aciertos', cache.hits)
 
 # ====================================================================
 # PROGRAMA PRINCIPAL
 # ====================================================================
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Mapa de potencial hidroeléctrico a pequeña escala en Colombia")
+    parser.add_argument('--analisis', action='store_true',
+                        help="Aplicar filtros y ranking sin crear el mapa y guardar la tabla (Parquet/CSV)")
+    parser.add_argument('--barrido', default=None, metavar='ESCENARIOS_JSON',
+                        help="Evaluar costes y ranking para cada escenario de parámetros (lista o rejilla en JSON)")
+    parser.add_argument('--montecarlo', type=int, default=None, metavar='N',
+                        help="Monte Carlo de costes con N muestras (percentiles de CAPEX y estabilidad del ranking)")
+    parser.add_argument('--distribuciones', default=None,
+                        help="JSON con las distribuciones de los parámetros (por defecto DISTRIBUCIONES_MONTECARLO)")
+    parser.add_argument('--semilla', type=int, default=None, help="Semilla del Monte Carlo")
+    parser.add_argument('--salida', default=None,
+                        help=f"Archivo de resultados (por defecto {RUTA_RESULTADOS_ANALISIS}, "
+                             f"{RUTA_RESULTADOS_BARRIDO} o {RUTA_RESULTADOS_MONTECARLO})")
+    parser.add_argument('--caudal-min', type=float, default=CAUDAL_MIN_INICIAL)
+    parser.add_argument('--caudal-max', type=float, default=CAUDAL_MAX_INICIAL)
+    parser.add_argument('--pendiente-min', type=float, default=PENDIENTE_MIN_INICIAL)
+    parser.add_argument('--vss-min', type=int, default=0)
+    parser.add_argument('--turbinas', default=None, help="Tipos separados por comas (por defecto, todos)")
+    parser.add_argument('--regiones', default=None,
+                        help="Regiones separadas por comas; 'Sin dato' para puntos sin región (por defecto, todas)")
+    parser.add_argument('--capex-max', type=float, default=None, help="CAPEX máximo en USD")
+    parser.add_argument('--priorizacion', action='store_true',
+                        help="Ranking de priorización (PAT/Cross Flow por CAPEX/VSS)")
+    parser.add_argument('--informes', action='store_true',
+                        help="Generar informes Word de los puntos priorizados (sin crear el mapa)")
+    parser.add_argument('--top', type=int, default=None, help="Top N del ranking de priorización")
+    parser.add_argument('--presupuesto', type=float, default=None,
+                        help="Presupuesto máximo en USD (suma CAPEX desde el ranking #1)")
+    parser.add_argument('--carpeta-informes', default=CARPETA_INFORMES, help="Carpeta de salida de los informes")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos para informes, barrido y distancias (por defecto, todos los núcleos)")
+    parser.add_argument('--documento-unico', action='store_true',
+                        help="Un solo documento con una sección por punto")
+    parser.add_argument('--tasa-cambio', type=float, default=TASA_CAMBIO_INFORMES, help="COP por USD")
+    parser.add_argument('--servidor', action='store_true',
+                        help=f"Servidor local de datos: el mapa ({NOMBRE_MAPA_SERVIDOR}) pide solo los puntos visibles")
+    parser.add_argument('--puerto', type=int, default=PUERTO_SERVIDOR, help="Puerto del servidor local")
+    parser.add_argument('--manifiesto', default=None,
+                        help=f"Archivo JSON del manifiesto (por defecto {CARPETA_MANIFIESTOS}/ejecucion_<fecha>.json)")
+    parser.add_argument('--recalcular', action='store_true',
+                        help=f"Ignorar los puntos de control ({CARPETA_CACHE_PIPELINE}/) y las cachés de puntos "
+                             f"({RUTA_CACHE_PUNTOS}, {RUTA_CACHE_DISTANCIAS}) y recalcular todo")
+    parser.add_argument('--perfil', action='store_true',
+                        help="Perfilar la ejecución con cProfile (.prof junto al manifiesto; ver con snakeviz o flameprof)")
+    args = parser.parse_args()
+    
+    modo = ('servidor' if args.servidor else 'montecarlo' if args.montecarlo else 'barrido' if args.barrido else
+            'analisis' if args.analisis else 'informes' if args.informes else 'mapa')
+    iniciar_ejecucion(modo, vars(args))
+    perfil = None
+    if args.perfil:
+        import cProfile
+        perfil = cProfile.Profile()
+        perfil.enable()
+    
     try:
-        puntos = cargar_shapefile_puntos(RUTA_SHAPEFILE_PUNTOS)
+        # Etapas con punto de control en CARPETA_CACHE_PIPELINE: cada una se reutiliza
+        # mientras no cambien sus entradas ni las de las etapas de las que depende
+        recalcular = args.recalcular
+        puntos, clave_puntos = etapa_pipeline(
+            'puntos', lambda: cargar_shapefile_puntos(RUTA_SHAPEFILE_PUNTOS),
+            [RUTA_SHAPEFILE_PUNTOS, huella_archivo(RUTA_SHAPEFILE_PUNTOS), OPTIMIZAR_TIPOS_PUNTOS,
+             MAX_DECIMALES_FLOAT32, COLUMNAS_CATEGORICAS],
+            [cargar_shapefile_puntos, optimizar_tipos_puntos], recalcular)
         if puntos is None:
             exit(1)
         
         total_original = len(puntos)
         
-        capas = {}
-        capas_exitosas = 0
-        capas_fallidas = 0
+        # Las capas remotas caducan cada VIGENCIA_CAPAS_HORAS; las etapas siguientes
+        # dependen de su contenido, no del periodo en que se descargaron
+        capas, _ = etapa_pipeline(
+            'capas', descargar_capas, [DESCARGAR_CAPAS, BASE_URL, CAPAS_CONFIG, periodo_vigencia_capas()],
+            [descargar_capas, descargar_capa_desde_api, leer_capa_geojson],
+            recalcular or (DESCARGAR_CAPAS and VIGENCIA_CAPAS_HORAS <= 0),
+            guardar_si=lambda capas: not DESCARGAR_CAPAS or len(capas) == len(CAPAS_CONFIG))
+        clave_capas = huella_capas(capas)
+        
+        # Con USAR_CACHE_PUNTOS las distancias se guardan por punto (solo se calculan
+        # las de puntos nuevos o movidos) y la etapa no guarda punto de control
+        distancias, clave_distancias = etapa_pipeline(
+            'distancias', lambda: calcular_distancias_con_cache(puntos, capas, args.procesos, recalcular),
+            [clave_puntos, huella_capas_distancia(capas), USAR_CACHE_PUNTOS],
+            [calcular_distancias_con_cache], recalcular, guardar_si=lambda _: not USAR_CACHE_PUNTOS)
+        puntos = unir_distancias(puntos, distancias)
+        
+        # Filtro y preparación: con USAR_CACHE_PUNTOS la caché de puntos es su única
+        # caché (incremental por punto) y no se guarda punto de control de la etapa
+        estado_puntos = {}
+        puntos_filtrados, clave_filtro = etapa_pipeline(
+            'filtro', lambda: filtrar_puntos_con_cache(puntos, capas, estado_puntos, recalcular),
+            [clave_distancias, clave_capas, CAPAS_RESTRICTIVAS, USAR_CACHE_PUNTOS],
+            [filtrar_puntos_con_cache, filtrar_puntos_incremental, filtrar_puntos_fuera_de_areas,
+             restaurar_tipos_puntos, comparar_con_cache, claves_puntos, huellas_puntos, huella_capas_restrictivas,
+             guardar_cache_puntos],
+            recalcular, guardar_si=lambda _: not USAR_CACHE_PUNTOS)
+        
+        if modo in ('mapa', 'informes'):
+            # Enriquecimiento y costes por punto (formato del mapa y de los informes)
+            puntos_data, clave_preparacion = etapa_pipeline(
+                'preparacion', lambda: preparar_puntos_con_cache(puntos_filtrados, estado_puntos),
+                [clave_filtro, huella_parametros_puntos(), USAR_CACHE_PUNTOS],
+                [preparar_puntos_con_cache, preparar_puntos_incremental, preparar_puntos, guardar_cache_puntos],
+                recalcular, guardar_si=lambda _: not USAR_CACHE_PUNTOS)
+        elif modo in ('montecarlo', 'barrido', 'analisis'):
+            # Enriquecimiento vectorizado (capital más cercana, región, potencia pico)
+            (tabla_puntos, arrays), clave_enriquecimiento = etapa_pipeline(
+                'enriquecimiento', lambda: preparar_arrays_puntos(puntos_filtrados),
+                [clave_filtro, CAPITALES_DEPARTAMENTOS, MULTIPLICADOR_REGION],
+                [preparar_arrays_puntos, calcular_distancia_haversine_vectorizada], recalcular)
+        
+        turbinas = [t.strip() for t in args.turbinas.split(',')] if args.turbinas else None
+        regiones = None
+        if args.regiones:
+            regiones = [r.strip() for r in args.regiones.split(',')]
+            regiones = ['' if r.lower() == 'sin dato' else r for r in regiones]
+        
+        if args.servidor:
+            iniciar_servidor(puntos_filtrados, capas, total_original, args.puerto)
+        elif args.montecarlo:
+            distribuciones = None
+            if args.distribuciones:
+                with open(args.distribuciones, 'r', encoding='utf-8') as f:
+                    distribuciones = json.load(f)
+            pasa = mascara_filtros(tabla_puntos, args.caudal_min, args.caudal_max,
+                                   args.pendiente_min, args.vss_min, regiones)
+            ejecutar_montecarlo(tabla_puntos, arrays, pasa, args.montecarlo, args.capex_max, distribuciones,
+                                args.top or TOP_N_MONTECARLO, args.semilla,
+                                args.salida or RUTA_RESULTADOS_MONTECARLO)
+        elif args.barrido:
+            escenarios = leer_escenarios(args.barrido)
+            pasa = mascara_filtros(tabla_puntos, args.caudal_min, args.caudal_max,
+                                   args.pendiente_min, args.vss_min, regiones)
+            ejecutar_barrido(tabla_puntos, arrays, escenarios, pasa, args.capex_max, args.top,
+                             args.presupuesto, args.procesos, args.salida or RUTA_RESULTADOS_BARRIDO)
+        elif args.analisis:
+            tabla_turbinas, _ = etapa_pipeline(
+                'costes', lambda: calcular_turbinas_vectorizado(arrays),
+                [clave_enriquecimiento, RECTANGULOS_TURBINAS, EFICIENCIAS_TURBINAS, COSTOS_CAPEX,
+                 COMPLEJIDAD_INSTALACION, MULTIPLICADOR_IMPACTO, MULTIPLICADOR_TRANSPORTE, DIFICULTAD_TURBINA,
+                 PARAMETROS_COSTES],
+                [calcular_turbinas_vectorizado, calcular_costes_vectorizado, dentro_de_turbina, potencias_turbina],
+                recalcular)
+            print(f"✓ {len(tabla_puntos):,} puntos y {len(tabla_turbinas):,} turbinas calculados")
+            with etapa('analisis', "ANÁLISIS SIN MAPA"):
+                resultado = filtrar_y_priorizar(
+                    tabla_puntos, tabla_turbinas,
+                    args.caudal_min, args.caudal_max, args.pendiente_min, args.vss_min,
+                    turbinas, regiones, args.capex_max,
+                    args.priorizacion, args.top, args.presupuesto
+                )
+                guardar_resultados(resultado, args.salida or RUTA_RESULTADOS_ANALISIS)
+                guardar_resultados(agregar_por_territorio(resultado), RUTA_AGREGADOS_TERRITORIO)
+        elif args.informes:
+            seleccion = seleccionar_puntos_priorizados(puntos_data, args.top, args.presupuesto)
+            generar_informes_lote(seleccion, args.carpeta_informes, args.tasa_cambio,
+                                  args.procesos, args.documento_unico)
+        else:
+            # El HTML depende de todo el script (plantilla, JavaScript y configuración)
+            nombre, _ = etapa_pipeline(
+                'render', lambda: generar_mapa(puntos_filtrados, capas, total_original, puntos_data),
+                [clave_preparacion, clave_capas, total_original, huella_archivo(os.path.abspath(__file__))],
+                [], recalcular, vigente=os.path.exists)
         
-        if DESCARGAR_CAPAS:
             print("\n" + "="*70)
-            print("DESCARGANDO CAPAS")
+            print("✅ VERSIÓN CON FILTROS SELECTIVOS")
+            print("="*70)
+            print(f"\n📂 {nombre}")
+            print(f"\n🎨 ICONOS:")
+            print(f"   • VSS: 🏠 (Viviendas Sin Servicio)")
+            print(f"   • Distancia: 🏘️ (Distancia al municipio)")
+            print(f"\n🚫 CAPAS RESTRICTIVAS (excluyen puntos):")
+            print(f"   • Parques Arqueológicos")
+            print(f"   • Parques Nacionales (PNN)")
+            print(f"\n👁️  CAPAS SOLO VISUALES (NO excluyen puntos):")
+            print(f"   • Tierras Comunidades Negras")
+            print(f"   • Resguardos Indígenas")
+            print(f"   • Complejos de Páramo")
+            print(f"   • Áreas Protección Local")
+            print(f"   • Áreas Protección Regional")
+            print(f"   • Reservas Naturales (RNSC)")
+            print(f"   • Áreas Protegidas (RUNAP)")
+            print(f"   • Reservas Forestales")
+            print(f"\n⚙️ FILTROS:")
+            print(f"   • Caudal: {CAUDAL_MIN_INICIAL} - {CAUDAL_MAX_INICIAL}")
+            print(f"   • Pendiente: > {PENDIENTE_MIN_INICIAL}")
+            print(f"   • VSS: >= 0 (slider empieza en 0)")
+            print(f"   • Distancia: <= máximo (slider empieza en máximo)")
             print("="*70 + "\n")
-            
-            for key, cfg in CAPAS_CONFIG.items():
-                gdf = descargar_capa_desde_api(cfg['id'], cfg['nombre'])
-                if gdf is not None:
-                    capas[key] = {'geodataframe': gdf, 'config': cfg}
-                    capas_exitosas += 1
-                else:
-                    capas_fallidas += 1
-            
-            print(f"\n📊 Resumen de capas: {capas_exitosas} exitosas, {capas_fallidas} fallidas")
-        else:
-            print("\n⚠️  DESCARGA DE CAPAS DESHABILITADA")
-            print("   Para habilitar, cambia DESCARGAR_CAPAS = True en la configuración\n")
-        
-        puntos_filtrados = filtrar_puntos_fuera_de_areas(puntos, capas)
-        mapa = crear_mapa_interactivo(puntos_filtrados, capas, total_original)
-        
-        nombre = "mapa_final.html"
-        mapa.save(nombre)
-        
-        print("\n" + "="*70)
-        print("✅ VERSIÓN CON FILTROS SELECTIVOS")
-        print("="*70)
-        print(f"\n📂 {nombre}")
-        print(f"\n🎨 ICONOS:")
-        print(f"   • VSS: 🏠 (Viviendas Sin Servicio)")
-        print(f"   • Distancia: 🏘️ (Distancia al municipio)")
-        print(f"\n🚫 CAPAS RESTRICTIVAS (excluyen puntos):")
-        print(f"   • Parques Arqueológicos")
-        print(f"   • Parques Nacionales (PNN)")
-        print(f"\n👁️  CAPAS SOLO VISUALES (NO excluyen puntos):")
-        print(f"   • Tierras Comunidades Negras")
-        print(f"   • Resguardos Indígenas")
-        print(f"   • Complejos de Páramo")
-        print(f"   • Áreas Protección Local")
-        print(f"   • Áreas Protección Regional")
-        print(f"   • Reservas Naturales (RNSC)")
-        print(f"   • Áreas Protegidas (RUNAP)")
-        print(f"   • Reservas Forestales")
-        print(f"\n⚙️ FILTROS:")
-        print(f"   • Caudal: {CAUDAL_MIN_INICIAL} - {CAUDAL_MAX_INICIAL}")
-        print(f"   • Pendiente: > {PENDIENTE_MIN_INICIAL}")
-        print(f"   • VSS: >= 0 (slider empieza en 0)")
-        print(f"   • Distancia: <= máximo (slider empieza en máximo)")
-        print("="*70 + "\n")
         
+        EJECUCION['estado'] = 'ok'
+    
     except Exception as e:
+        EJECUCION['estado'] = 'error'
+        EJECUCION['error'] = f"{type(e).__name__}: {e}"
         print(f"\n❌ Error: {e}")
         import traceback
         traceback.print_exc()
+    
+    finally:
+        if perfil is not None:
+            perfil.disable()
+        guardar_manifiesto(args.manifiesto, perfil)
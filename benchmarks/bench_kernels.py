@@ -0,0 +1,295 @@
+"""
+Micro-benchmark de los núcleos por punto de Hydro.py
+- calcular_distancia_haversine, determinar_tipo_turbina y
+  calcular_costes_detallados (versión escalar, una llamada por punto)
+- Sus versiones con arrays: calcular_distancia_haversine_vectorizada,
+  dentro_de_turbina + potencias y calcular_costes_vectorizado
+- Comprueba que las versiones con arrays dan lo mismo que las escalares
+- Compara el rendimiento con la baseline de este equipo y termina con error
+  si algún núcleo baja más del umbral. La baseline depende del hardware: se
+  guarda por equipo en benchmarks/resultados/ y se registra en la primera
+  ejecución. Con una baseline de otro equipo (--baseline) solo se comparan
+  las aceleraciones vectorizado/escalar, que no dependen tanto del hardware
+
+Uso:
+    python benchmarks/bench_kernels.py
+    python benchmarks/bench_kernels.py --actualizar-baseline
+    python benchmarks/bench_kernels.py --baseline otra_maquina.json
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import platform
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_REPO)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import Hydro
+from bench_pipeline import generar_puntos, metadatos
+
+CARPETA_BASELINE = os.path.join(RAIZ_REPO, "benchmarks", "resultados")
+UMBRAL_REGRESION = 0.30        # Caída de rendimiento tolerada respecto a la baseline
+PUNTOS_ESCALAR = 20000         # Llamadas por medición en los núcleos escalares
+PUNTOS_VECTORIZADO = 1000000   # Puntos por medición en los núcleos con arrays
+REPETICIONES = 3               # Se toma la mejor de las repeticiones
+TOLERANCIA_PARIDAD = 1e-9      # Tolerancia relativa en la comprobación de paridad
+
+# ====================================================================
+# BASELINE POR EQUIPO
+# ====================================================================
+
+def huella_equipo():
+    """
+    Identificador del equipo (nombre, CPU, núcleos y versión de Python): las
+    mediciones absolutas solo son comparables dentro del mismo equipo
+    """
+    datos = (platform.node(), platform.machine(), platform.processor(), os.cpu_count(),
+             platform.python_version_tuple()[:2])
+    return hashlib.sha256(repr(datos).encode('utf-8')).hexdigest()[:12]
+
+def ruta_baseline_equipo():
+    return os.path.join(CARPETA_BASELINE, f"baseline_kernels_{huella_equipo()}.json")
+
+def aceleraciones(kernels):
+    """
+    Puntos/s de cada núcleo vectorizado dividido entre los de su versión escalar
+
+    Returns:
+        {nombre base: aceleración}, p. ej. {'haversine': 52.5}
+    """
+    resultado = {}
+    for nombre, r in kernels.items():
+        base = nombre.rsplit('_', 1)[0]
+        escalar = kernels.get(f"{base}_escalar")
+        if r['forma'] == 'vectorizado' and escalar:
+            resultado[base] = r['puntos_por_segundo'] / escalar['puntos_por_segundo']
+    return resultado
+
+# ====================================================================
+# DATOS DE ENTRADA
+# ====================================================================
+
+def preparar_entradas(n):
+    """
+    Entradas de los núcleos a partir de n puntos sintéticos
+
+    Returns:
+        Diccionario de arrays (caudal, caida, potencia_k, lat, lon, dist,
+        región y su multiplicador, tipo y potencia para costes)
+    """
+    puntos = generar_puntos(n)
+    tipos = list(Hydro.RECTANGULOS_TURBINAS.keys())
+    rng = np.random.default_rng(1)
+    region = puntos[Hydro.COLUMNA_REGION].fillna('').to_numpy(dtype=object)
+    return {
+        'caudal': puntos[Hydro.COLUMNA_CAUDAL].to_numpy(dtype=float),
+        'caida': puntos[Hydro.COLUMNA_CAIDA].to_numpy(dtype=float),
+        'potencia_k': puntos[Hydro.COLUMNA_POTENCIA_K].to_numpy(dtype=float),
+        'lat': puntos.geometry.y.to_numpy(),
+        'lon': puntos.geometry.x.to_numpy(),
+        'dist': rng.uniform(1000, 600000, n),
+        'region': region,
+        'm_region': np.array([Hydro.MULTIPLICADOR_REGION.get(r, 1.2) for r in region]),
+        'tipo': np.array(tipos, dtype=object)[rng.integers(0, len(tipos), n)],
+        'potencia': rng.lognormal(np.log(40), 1.0, n)
+    }
+
+def subconjunto(entradas, n):
+    return {clave: valores[:n] for clave, valores in entradas.items()}
+
+# ====================================================================
+# NÚCLEOS (escalar y con arrays)
+# ====================================================================
+
+CAPITAL = Hydro.CAPITALES_DEPARTAMENTOS['CUNDINAMARCA']
+
+def haversine_escalar(e):
+    lat_c, lon_c = CAPITAL['lat'], CAPITAL['lon']
+    return np.array([Hydro.calcular_distancia_haversine(la, lo, lat_c, lon_c)
+                     for la, lo in zip(e['lat'], e['lon'])])
+
+def haversine_vectorizado(e):
+    return Hydro.calcular_distancia_haversine_vectorizada(e['lat'], e['lon'], CAPITAL['lat'], CAPITAL['lon'])
+
+def turbinas_escalar(e):
+    """
+    Lista de (punto, tipo, potencia, capex) con determinar_tipo_turbina()
+    """
+    filas = []
+    for i, (q, h, pk) in enumerate(zip(e['caudal'], e['caida'], e['potencia_k'])):
+        turbinas, _, _ = Hydro.determinar_tipo_turbina(q, h, pk)
+        filas.extend((i, t['tipo'], t['potencia'], t['capex']) for t in turbinas)
+    return filas
+
+def turbinas_vectorizado(e):
+    """
+    Mismo resultado que turbinas_escalar() con dentro_de_turbina()
+    """
+    arrays = {'caudal_cfs': e['caudal'] * 35.3147, 'caida_ft': e['caida'] * 3.28084}
+    partes = []
+    for orden, tipo in enumerate(Hydro.RECTANGULOS_TURBINAS):
+        filas = np.flatnonzero(Hydro.dentro_de_turbina(arrays, tipo))
+        potencia = e['potencia_k'][filas] * 0.9 * Hydro.EFICIENCIAS_TURBINAS[tipo]
+        partes.append((filas, np.full(len(filas), orden), tipo, potencia, potencia * Hydro.COSTOS_CAPEX[tipo]))
+    filas = np.concatenate([p[0] for p in partes])
+    orden = np.lexsort((np.concatenate([p[1] for p in partes]), filas))
+    tipos = np.concatenate([np.full(len(p[0]), p[2], dtype=object) for p in partes])
+    return (filas[orden], tipos[orden],
+            np.concatenate([p[3] for p in partes])[orden], np.concatenate([p[4] for p in partes])[orden])
+
+def costes_escalar(e):
+    return np.array([Hydro.calcular_costes_detallados(t, p, 0, d, r)['capex_total']
+                     for t, p, d, r in zip(e['tipo'], e['potencia'], e['dist'], e['region'])])
+
+def costes_vectorizado(e):
+    parametros = Hydro.parametros_escenario()
+    capex = np.empty(len(e['tipo']))
+    for tipo in Hydro.RECTANGULOS_TURBINAS:
+        filas = np.flatnonzero(e['tipo'] == tipo)
+        capex[filas] = Hydro.calcular_costes_vectorizado(tipo, e['potencia'][filas], e['dist'][filas],
+                                                         e['m_region'][filas], parametros)['capex_total']
+    return capex
+
+KERNELS = [
+    ('haversine_escalar', haversine_escalar, 'escalar'),
+    ('haversine_vectorizado', haversine_vectorizado, 'vectorizado'),
+    ('turbinas_escalar', turbinas_escalar, 'escalar'),
+    ('turbinas_vectorizado', turbinas_vectorizado, 'vectorizado'),
+    ('costes_escalar', costes_escalar, 'escalar'),
+    ('costes_vectorizado', costes_vectorizado, 'vectorizado'),
+]
+
+# ====================================================================
+# PARIDAD Y MEDICIÓN
+# ====================================================================
+
+def comprobar_paridad(e):
+    """
+    Las versiones con arrays deben dar lo mismo que las escalares
+
+    Returns:
+        Lista de errores (vacía si todo coincide)
+    """
+    errores = []
+
+    if not np.allclose(haversine_vectorizado(e), haversine_escalar(e), rtol=TOLERANCIA_PARIDAD, atol=0):
+        errores.append("haversine: distancias distintas")
+
+    escalar = turbinas_escalar(e)
+    filas, tipos, potencia, capex = turbinas_vectorizado(e)
+    if [(f, t) for f, t, _, _ in escalar] != list(zip(filas.tolist(), tipos.tolist())):
+        errores.append("turbinas: tipos aplicables distintos")
+    elif not (np.allclose(potencia, [x[2] for x in escalar], rtol=TOLERANCIA_PARIDAD, atol=0) and
+              np.allclose(capex, [x[3] for x in escalar], rtol=TOLERANCIA_PARIDAD, atol=0)):
+        errores.append("turbinas: potencia o CAPEX distintos")
+
+    if not np.allclose(costes_vectorizado(e), costes_escalar(e), rtol=TOLERANCIA_PARIDAD, atol=0):
+        errores.append("costes: CAPEX total distinto")
+
+    return errores
+
+def medir(funcion, entradas, n):
+    """
+    Puntos por segundo (mejor de REPETICIONES)
+    """
+    mejor = float('inf')
+    for _ in range(REPETICIONES):
+        inicio = time.perf_counter()
+        funcion(entradas)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return n / mejor
+
+# ====================================================================
+# PROGRAMA PRINCIPAL
+# ====================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark de los núcleos por punto de Hydro.py")
+    parser.add_argument('--baseline', default=None,
+                        help="Archivo JSON de la baseline (por defecto la de este equipo en benchmarks/resultados/)")
+    parser.add_argument('--actualizar-baseline', action='store_true', help="Guardar los resultados como nueva baseline")
+    parser.add_argument('--umbral', type=float, default=None,
+                        help=f"Caída tolerada (por defecto la de la baseline o {UMBRAL_REGRESION})")
+    parser.add_argument('--salida', default=None, help="Guardar también los resultados en este JSON")
+    args = parser.parse_args()
+
+    print("\n" + "="*70)
+    print("MICRO-BENCHMARK DE NÚCLEOS")
+    print("="*70)
+
+    entradas = preparar_entradas(PUNTOS_VECTORIZADO)
+    escalares = subconjunto(entradas, PUNTOS_ESCALAR)
+
+    errores = comprobar_paridad(subconjunto(entradas, 5000))
+    if errores:
+        for error in errores:
+            print(f"  ✗ Paridad: {error}")
+    else:
+        print("  ✓ Paridad: las versiones con arrays coinciden con las escalares")
+
+    resultados = {}
+    for nombre, funcion, forma in KERNELS:
+        datos, n = (escalares, PUNTOS_ESCALAR) if forma == 'escalar' else (entradas, PUNTOS_VECTORIZADO)
+        resultados[nombre] = {'forma': forma, 'puntos': n, 'puntos_por_segundo': round(medir(funcion, datos, n))}
+
+    ruta_baseline = args.baseline or ruta_baseline_equipo()
+    baseline = None
+    if os.path.exists(ruta_baseline):
+        with open(ruta_baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    umbral = args.umbral if args.umbral is not None else (baseline or {}).get('umbral', UMBRAL_REGRESION)
+    mismo_equipo = baseline is not None and baseline.get('equipo') == huella_equipo()
+
+    regresiones = []
+    print(f"\n  {'Núcleo':<24}{'puntos/s':>14}{'baseline':>14}{'cambio':>10}")
+    for nombre, r in resultados.items():
+        previo = (baseline or {}).get('kernels', {}).get(nombre) if mismo_equipo else None
+        linea = f"  {nombre:<24}{r['puntos_por_segundo']:>14,}"
+        if previo:
+            cambio = r['puntos_por_segundo'] / previo['puntos_por_segundo'] - 1
+            linea += f"{previo['puntos_por_segundo']:>14,}{cambio * 100:>+9.1f}%"
+            if cambio < -umbral:
+                regresiones.append(nombre)
+                linea += "  ⚠️"
+        print(linea)
+
+    if baseline is not None and not mismo_equipo:
+        # Otro equipo: los puntos/s absolutos no son comparables, las
+        # aceleraciones vectorizado/escalar sí (aproximadamente)
+        print(f"\n  Baseline de otro equipo ({baseline.get('metadatos', {}).get('plataforma')}): "
+              f"se comparan las aceleraciones vectorizado/escalar")
+        previas = aceleraciones(baseline.get('kernels', {}))
+        print(f"  {'Núcleo':<24}{'aceleración':>14}{'baseline':>14}{'cambio':>10}")
+        for base, actual in aceleraciones(resultados).items():
+            linea = f"  {base:<24}{actual:>13.1f}x"
+            if base in previas:
+                cambio = actual / previas[base] - 1
+                linea += f"{previas[base]:>13.1f}x{cambio * 100:>+9.1f}%"
+                if cambio < -umbral:
+                    regresiones.append(f"{base} (aceleración)")
+                    linea += "  ⚠️"
+            print(linea)
+
+    datos_salida = {'metadatos': metadatos(), 'equipo': huella_equipo(), 'umbral': umbral, 'kernels': resultados}
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(datos_salida, f, indent=2, ensure_ascii=False)
+    if args.actualizar_baseline or baseline is None:
+        os.makedirs(os.path.dirname(os.path.abspath(ruta_baseline)), exist_ok=True)
+        with open(ruta_baseline, 'w', encoding='utf-8') as f:
+            json.dump(datos_salida, f, indent=2, ensure_ascii=False)
+        if baseline is None:
+            print(f"\n✓ Primera ejecución en este equipo: baseline registrada en {ruta_baseline}")
+        else:
+            print(f"\n✓ Baseline actualizada en {ruta_baseline}")
+
+    if errores or regresiones:
+        if regresiones:
+            print(f"\n❌ Regresión de rendimiento (> {umbral:.0%}): {', '.join(regresiones)}")
+        sys.exit(1)
+    print("\n✅ Sin regresiones")
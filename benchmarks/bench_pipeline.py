@@ -0,0 +1,339 @@
+"""
+Benchmark de extremo a extremo de Hydro.py con datos sintéticos
+- Genera puntos con distribuciones parecidas a las de VSS (caudal, caída,
+  Potencia_k, VSS, regiones...) y polígonos sintéticos de áreas protegidas
+- Mide cada etapa por separado: carga, ingesta de capas, filtro espacial,
+  preparación de puntos, serialización JSON, construcción y guardado del mapa
+- Cada tamaño se ejecuta en un proceso nuevo para que el pico de RSS sea
+  el de ese tamaño
+- Escribe los resultados en JSON y, opcionalmente, los compara con otro
+  archivo de resultados para ver regresiones
+
+Uso:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --tamaños 10000 100000 --comparar benchmarks/resultados/anterior.json
+"""
+import os
+import sys
+import io
+import json
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+import multiprocessing
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ_REPO)
+
+TAMAÑOS_POR_DEFECTO = [10000, 100000, 1000000]
+CARPETA_RESULTADOS = os.path.join(RAIZ_REPO, "benchmarks", "resultados")
+SEMILLA = 2024
+
+# Límites aproximados de Colombia continental (lon_min, lon_max, lat_min, lat_max)
+LIMITES_COLOMBIA = (-79.0, -67.0, -4.2, 12.4)
+
+# Proporciones de región en los datos (incluye puntos sin región)
+PESOS_REGION = {
+    'Región Pacífico': 0.18,
+    'Región Eje Cafetero – Antioquia': 0.22,
+    'Región Centro Sur': 0.14,
+    'Región Centro Oriente': 0.18,
+    'Región Caribe': 0.12,
+    'Región Llano': 0.11,
+    None: 0.05
+}
+
+PESOS_ZONA_CLIMA = {
+    'CÁLIDO HÚMEDO': 0.35,
+    'CÁLIDO SECO': 0.15,
+    'TEMPLADO': 0.30,
+    'FRÍO': 0.20
+}
+
+# Capas sintéticas: (número de polígonos, radio mínimo y máximo en grados, vértices)
+CAPAS_SINTETICAS = {
+    'parque_arqueologico': (20, 0.02, 0.10, 64),
+    'limite_pnn': (60, 0.10, 0.60, 256),
+    'resguardo_indigena': (150, 0.05, 0.40, 128),
+    'complejos_paramo': (40, 0.05, 0.25, 128),
+}
+
+# ====================================================================
+# DATOS SINTÉTICOS
+# ====================================================================
+
+def generar_puntos(n, semilla=SEMILLA):
+    """
+    Genera n puntos con atributos parecidos a los del shapefile VSS
+
+    Args:
+        n: Número de puntos
+        semilla: Semilla del generador
+
+    Returns:
+        GeoDataFrame EPSG:4326
+    """
+    import numpy as np
+    import geopandas as gpd
+    import Hydro
+
+    rng = np.random.default_rng(semilla)
+    lon_min, lon_max, lat_min, lat_max = LIMITES_COLOMBIA
+
+    caudal = rng.lognormal(np.log(0.25), 1.0, n)
+    caida = rng.lognormal(np.log(30), 0.9, n)
+    vss = np.floor(rng.lognormal(3.0, 1.2, n))
+    vss[rng.random(n) < 0.3] = 0
+
+    regiones = list(PESOS_REGION.keys())
+    zonas = list(PESOS_ZONA_CLIMA.keys())
+    deptos = list(Hydro.CAPITALES_DEPARTAMENTOS.keys())
+    municipios = np.array([f"MUNICIPIO {i}" for i in range(1100)])
+
+    datos = {
+        Hydro.COLUMNA_CAUDAL: caudal,
+        Hydro.COLUMNA_PENDIENTE: rng.lognormal(np.log(0.06), 1.0, n),
+        Hydro.COLUMNA_MUNICIPIO: municipios[rng.integers(0, len(municipios), n)],
+        'Departamen': np.array(deptos)[rng.integers(0, len(deptos), n)],
+        Hydro.COLUMNA_VSS: vss,
+        Hydro.COLUMNA_DISTANCIA: rng.lognormal(np.log(5000), 0.8, n),
+        Hydro.COLUMNA_CAIDA: caida,
+        Hydro.COLUMNA_POTENCIA_K: 9.81 * caudal * caida,
+        Hydro.COLUMNA_REGION: rng.choice(np.array(regiones, dtype=object), n, p=list(PESOS_REGION.values())),
+        Hydro.COLUMNA_ZONA_CLIMA: rng.choice(zonas, n, p=list(PESOS_ZONA_CLIMA.values())),
+    }
+    geometria = gpd.points_from_xy(rng.uniform(lon_min, lon_max, n), rng.uniform(lat_min, lat_max, n))
+    return gpd.GeoDataFrame(datos, geometry=geometria, crs="EPSG:4326")
+
+def generar_poligonos(rng, n, radio_min, radio_max, vertices):
+    """
+    Polígonos irregulares (radio con ruido) repartidos por Colombia
+    """
+    import numpy as np
+    from shapely.geometry import Polygon
+
+    lon_min, lon_max, lat_min, lat_max = LIMITES_COLOMBIA
+    angulos = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    poligonos = []
+    for _ in range(n):
+        cx, cy = rng.uniform(lon_min, lon_max), rng.uniform(lat_min, lat_max)
+        radio = rng.uniform(radio_min, radio_max) * (1 + 0.25 * np.sin(angulos * rng.integers(2, 7)) +
+                                                      0.05 * rng.standard_normal(vertices))
+        poligonos.append(Polygon(zip(cx + radio * np.cos(angulos), cy + radio * np.sin(angulos))).buffer(0))
+    return poligonos
+
+def generar_capas_geojson(semilla=SEMILLA):
+    """
+    Respuestas GeoJSON sintéticas (texto) de las capas, como las del servidor
+    """
+    import numpy as np
+    from shapely.geometry import mapping
+
+    rng = np.random.default_rng(semilla)
+    respuestas = {}
+    for clave, (n, radio_min, radio_max, vertices) in CAPAS_SINTETICAS.items():
+        features = [{'type': 'Feature', 'properties': {'nombre': f"{clave}_{i}"}, 'geometry': mapping(p)}
+                    for i, p in enumerate(generar_poligonos(rng, n, radio_min, radio_max, vertices))]
+        respuestas[clave] = json.dumps({'type': 'FeatureCollection', 'features': features})
+    return respuestas
+
+def escribir_zip_puntos(puntos, carpeta):
+    """
+    Guarda los puntos como shapefile comprimido (mismo formato que vss_2024.zip)
+    """
+    import zipfile
+
+    carpeta_shp = os.path.join(carpeta, "shp_sintetico")
+    os.makedirs(carpeta_shp, exist_ok=True)
+    puntos.to_file(os.path.join(carpeta_shp, "vss_sintetico.shp"))
+    ruta_zip = os.path.join(carpeta, "vss_sintetico.zip")
+    with zipfile.ZipFile(ruta_zip, 'w') as z:
+        for nombre in os.listdir(carpeta_shp):
+            z.write(os.path.join(carpeta_shp, nombre), nombre)
+    return ruta_zip
+
+# ====================================================================
+# MEDICIÓN
+# ====================================================================
+
+def rss_pico_mb():
+    """
+    Pico de RSS del proceso en MB (None si la plataforma no lo ofrece)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa en KB y macOS en bytes
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+@contextlib.contextmanager
+def medir(etapas, nombre, silencio=True, memoria_python=False):
+    """
+    Mide tiempo y memoria de una etapa y la añade a la lista de etapas
+    """
+    import tracemalloc
+
+    if memoria_python:
+        tracemalloc.start()
+    salida = io.StringIO() if silencio else sys.stdout
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(salida):
+        yield
+    etapa = {
+        'etapa': nombre,
+        'segundos': round(time.perf_counter() - inicio, 4),
+        'rss_pico_mb': rss_pico_mb()
+    }
+    if memoria_python:
+        etapa['python_pico_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024**2, 1)
+        tracemalloc.stop()
+    etapas.append(etapa)
+    print(f"    {nombre:<22} {etapa['segundos']:>10.3f} s   RSS pico {etapa['rss_pico_mb']} MB", flush=True)
+
+def ejecutar_tamaño(n, memoria_python=False, verboso=False):
+    """
+    Ejecuta todas las etapas del pipeline para n puntos sintéticos
+    (se llama en un proceso nuevo)
+
+    Returns:
+        Diccionario con las etapas medidas y los tamaños resultantes
+    """
+    import Hydro
+
+    silencio = not verboso
+    with tempfile.TemporaryDirectory(prefix="bench_pch_") as carpeta:
+        os.chdir(carpeta)  # cargar_shapefile_puntos extrae en ./temp_shp
+
+        print(f"  Generando {n:,} puntos sintéticos...", flush=True)
+        ruta_zip = escribir_zip_puntos(generar_puntos(n), carpeta)
+        respuestas = generar_capas_geojson()
+
+        etapas = []
+        with medir(etapas, 'carga', silencio, memoria_python):
+            puntos = Hydro.cargar_shapefile_puntos(ruta_zip)
+
+        with medir(etapas, 'ingesta_capas', silencio, memoria_python):
+            capas = {}
+            for clave, texto in respuestas.items():
+                gdf = Hydro.leer_capa_geojson(json.loads(texto))
+                if gdf is not None:
+                    capas[clave] = {'geodataframe': gdf, 'config': Hydro.CAPAS_CONFIG[clave]}
+
+        with medir(etapas, 'filtro_espacial', silencio, memoria_python):
+            puntos_filtrados = Hydro.filtrar_puntos_fuera_de_areas(puntos, capas)
+
+        with medir(etapas, 'preparacion_puntos', silencio, memoria_python):
+            puntos_data = Hydro.preparar_puntos(puntos_filtrados)
+
+        with medir(etapas, 'serializacion_json', silencio, memoria_python):
+            bytes_json = len(json.dumps(puntos_data))
+
+        with medir(etapas, 'construccion_mapa', silencio, memoria_python):
+            mapa = Hydro.crear_mapa_interactivo(puntos_filtrados, capas, len(puntos), puntos_data)
+
+        ruta_html = os.path.join(carpeta, "mapa_bench.html")
+        with medir(etapas, 'guardado_mapa', silencio, memoria_python):
+            mapa.save(ruta_html)
+
+        bytes_html = os.path.getsize(ruta_html)
+        os.chdir(RAIZ_REPO)
+
+    return {
+        'puntos': n,
+        'puntos_filtrados': len(puntos_filtrados),
+        'bytes_json': bytes_json,
+        'bytes_html': bytes_html,
+        'segundos_total': round(sum(e['segundos'] for e in etapas), 4),
+        'etapas': etapas
+    }
+
+def ejecutar_en_proceso(n, memoria_python, verboso):
+    """
+    Ejecuta un tamaño en un proceso nuevo (spawn) y devuelve su resultado
+    """
+    contexto = multiprocessing.get_context('spawn')
+    with contexto.Pool(1) as pool:
+        return pool.apply(ejecutar_tamaño, (n, memoria_python, verboso))
+
+def metadatos():
+    """
+    Datos del entorno para poder comparar ejecuciones
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ_REPO,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'procesador': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count()
+    }
+
+def comparar(actual, anterior):
+    """
+    Muestra la variación de tiempo y RSS por etapa respecto a otra ejecución
+    """
+    print("\n" + "="*70)
+    print(f"COMPARACIÓN CON {anterior['metadatos'].get('commit')} ({anterior['metadatos'].get('fecha')})")
+    print("="*70)
+
+    previos = {r['puntos']: {e['etapa']: e for e in r['etapas']} for r in anterior['resultados']}
+    for resultado in actual['resultados']:
+        if resultado['puntos'] not in previos:
+            continue
+        print(f"  {resultado['puntos']:,} puntos")
+        for etapa in resultado['etapas']:
+            previa = previos[resultado['puntos']].get(etapa['etapa'])
+            if previa is None or previa['segundos'] <= 0:
+                continue
+            cambio = (etapa['segundos'] / previa['segundos'] - 1) * 100
+            aviso = "  ⚠️" if cambio > 10 else ""
+            print(f"    {etapa['etapa']:<22} {previa['segundos']:>10.3f} s → {etapa['segundos']:>10.3f} s "
+                  f"({cambio:+.1f}%){aviso}")
+
+# ====================================================================
+# PROGRAMA PRINCIPAL
+# ====================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de extremo a extremo de Hydro.py")
+    parser.add_argument('--tamaños', type=int, nargs='+', default=TAMAÑOS_POR_DEFECTO,
+                        help="Número de puntos sintéticos de cada ejecución")
+    parser.add_argument('--salida', default=None, help="Archivo JSON de resultados")
+    parser.add_argument('--comparar', default=None, help="Resultados anteriores con los que comparar")
+    parser.add_argument('--memoria-python', action='store_true',
+                        help="Medir también el pico de memoria Python con tracemalloc (más lento)")
+    parser.add_argument('--verboso', action='store_true', help="Mostrar la salida de Hydro.py")
+    args = parser.parse_args()
+
+    print("\n" + "="*70)
+    print("BENCHMARK DEL PIPELINE")
+    print("="*70)
+
+    resultados = {'metadatos': metadatos(), 'resultados': []}
+    for n in args.tamaños:
+        print(f"\n📊 {n:,} puntos")
+        resultado = ejecutar_en_proceso(n, args.memoria_python, args.verboso)
+        resultados['resultados'].append(resultado)
+        print(f"  ✓ Total {resultado['segundos_total']:.2f} s | HTML {resultado['bytes_html'] / 1024**2:.1f} MB")
+
+    ruta = args.salida
+    if ruta is None:
+        os.makedirs(CARPETA_RESULTADOS, exist_ok=True)
+        ruta = os.path.join(CARPETA_RESULTADOS, f"pipeline_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"\n✓ Resultados guardados en {ruta}")
+
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            comparar(resultados, json.load(f))